@@ -24,4 +24,15 @@ class CustomUserAdmin(BaseUserAdmin):
 
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Account)
-admin.site.register(Transaction)
+# Ledger append-only: transacoes so podem ser consultadas pelo admin
+class TransactionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'account', 'type', 'value', 'balance_after', 'created_at')
+    list_filter = ('type',)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+admin.site.register(Transaction, TransactionAdmin)
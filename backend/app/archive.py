@@ -0,0 +1,235 @@
+import json
+import zlib
+from datetime import date, datetime, time
+from decimal import Decimal
+from itertools import groupby
+
+from django.conf import settings
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .ledger import (
+    signed_value, ledger_values, ID, ACCOUNT, TYPE, VALUE, BALANCE_AFTER, CREATED_AT, DESCRIPTION,
+    ORIGIN, DESTINATION, RELATED, RELATED_ACCOUNT
+)
+from .models import Account, Transaction, TransactionArchive
+
+
+# Arquivo morto do ledger. Meses encerrados ha mais de TRANSACTION_HOT_MONTHS saem
+# da tabela Transaction e viram um TransactionArchive por conta e mes, com as linhas
+# compactadas. Particionamento nativo do PostgreSQL nao serve aqui: toda chave unica
+# de uma tabela particionada precisa incluir a chave de particao, e related_transaction
+# referencia Transaction.id sozinho.
+#
+# Invariante: por conta, tudo que esta arquivado e anterior a tudo que continua na
+# tabela quente. Leitores juntam as duas fontes concatenando: primeiro o arquivo,
+# depois a tabela quente. Linhas arquivadas ainda referenciadas por transacoes
+# quentes ficam na tabela marcadas com archived (fora de Transaction.objects).
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_of(created_at):
+    return month_start(timezone.localdate(created_at))
+
+
+def month_bound(month):
+    return timezone.make_aware(datetime.combine(month, time.min))
+
+
+# Primeiro mes que continua na tabela quente
+def archive_horizon():
+    return add_months(month_start(timezone.localdate()), -settings.TRANSACTION_HOT_MONTHS)
+
+
+def _encode(rows):
+    return zlib.compress(json.dumps([
+        [
+            row[ID], row[TYPE], str(row[VALUE]), str(row[BALANCE_AFTER]), row[CREATED_AT].isoformat(),
+            row[DESCRIPTION], row[ORIGIN], row[DESTINATION], row[RELATED], row[RELATED_ACCOUNT]
+        ]
+        for row in rows
+    ], ensure_ascii=False, separators=(',', ':')).encode())
+
+
+# Linhas de um segmento no formato de ledger_values(), na ordem (created_at, id)
+def segment_rows(segment):
+    for (
+        transaction_id, transaction_type, value, balance_after, created_at,
+        description, origin, destination, related, related_account
+    ) in json.loads(zlib.decompress(segment.payload)):
+        yield (
+            transaction_id, segment.account_id, transaction_type, Decimal(value), Decimal(balance_after),
+            datetime.fromisoformat(created_at), description, origin, destination, related, related_account
+        )
+
+
+def archived_rows(segments):
+    for segment in segments.order_by('account_id', 'month').iterator(chunk_size=100):
+        yield from segment_rows(segment)
+
+
+def build_segment(account_id, month, rows):
+    return TransactionArchive(
+        account_id=account_id,
+        month=month,
+        entry_count=len(rows),
+        first_transaction_id=min(row[ID] for row in rows),
+        last_transaction_id=max(row[ID] for row in rows),
+        last_created_at=rows[-1][CREATED_AT],
+        net=sum((signed_value(row[TYPE], row[VALUE], account_id, row[RELATED_ACCOUNT]) for row in rows), Decimal("0.00")),
+        closing_balance=rows[-1][BALANCE_AFTER],
+        payload=_encode(rows),
+    )
+
+
+# Move para o arquivo os meses anteriores a end das contas com id em [first_id,
+# last_id]. Roda dentro da transacao de archive_transactions: as FKs de
+# related_transaction sao conferidas no commit, com todas as faixas ja movidas.
+def archive_range(first_id, last_id, end, batch_size=None):
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    end_at = month_bound(end)
+    rows = ledger_values(Transaction.objects.filter(
+        account_id__gte=first_id, account_id__lte=last_id, created_at__lt=end_at
+    ).order_by('account_id', 'created_at', 'id')).iterator(chunk_size=settings.LEDGER_VERIFY_CHUNK_SIZE)
+
+    totals = {'segments': 0, 'entries': 0, 'bytes': 0, 'retained': 0}
+    pending = []
+
+    for (account_id, month), month_rows in groupby(rows, key=lambda row: (row[ACCOUNT], month_of(row[CREATED_AT]))):
+        segment = build_segment(account_id, month, list(month_rows))
+        pending.append(segment)
+        totals['segments'] += 1
+        totals['entries'] += segment.entry_count
+        totals['bytes'] += len(segment.payload)
+
+        if len(pending) >= batch_size:
+            TransactionArchive.objects.bulk_create(pending)
+            pending = []
+
+    TransactionArchive.objects.bulk_create(pending)
+
+    # Envios anteriores ao corte estornados depois dele continuam como alvo do FK:
+    # ficam marcados. O resto (inclusive marcados de execucoes anteriores que ja nao
+    # tem referencias quentes) sai com um DELETE por faixa, sem carregar as linhas:
+    # related_transaction e DO_NOTHING e Transaction nao tem signals.
+    referenced = Transaction.all_objects.filter(
+        created_at__gte=end_at, related_transaction__isnull=False
+    ).values('related_transaction_id')
+    archived = Transaction.all_objects.filter(account_id__gte=first_id, account_id__lte=last_id, created_at__lt=end_at)
+
+    totals['retained'] = archived.filter(id__in=referenced, archived=False).update(archived=True)
+    archived.exclude(id__in=referenced).delete()
+
+    return totals
+
+
+# Linhas arquivadas de uma conta nos meses que cruzam [start, end), filtradas como
+# o extrato e agrupadas por segmento. after e a posicao (created_at, id) do cursor,
+# na direcao da ordenacao.
+def _archived_segments(account_id, start, end, transaction_type, descending, after, using=None):
+    segments = TransactionArchive.objects.using(using).filter(account_id=account_id)
+
+    if start is not None:
+        segments = segments.filter(month__gte=month_of(start))
+    if end is not None:
+        segments = segments.filter(month__lte=month_of(end))
+    if after is not None:
+        segments = segments.filter(**{'month__lte' if descending else 'month__gte': month_of(after[0])})
+
+    for segment in segments.order_by('-month' if descending else 'month').iterator(chunk_size=10):
+        rows = [
+            row for row in segment_rows(segment)
+            if (start is None or row[CREATED_AT] >= start)
+            and (end is None or row[CREATED_AT] < end)
+            and (not transaction_type or row[TYPE] == transaction_type)
+            and (after is None or ((row[CREATED_AT], row[ID]) < after if descending else (row[CREATED_AT], row[ID]) > after))
+        ]
+        if descending:
+            rows.reverse()
+        yield rows
+
+
+# Linhas arquivadas do extrato como instancias de Transaction (nao salvas), com as
+# mesmas anotacoes de statements.statement_queryset. using fixa o banco das leituras
+# (o stream e consumido depois que a view devolve a resposta).
+def archived_transactions(account_id, start=None, end=None, transaction_type=None, descending=False, after=None, using=None):
+    names = {}
+
+    for rows in _archived_segments(account_id, start, end, transaction_type, descending, after, using):
+        missing = {row[ORIGIN] for row in rows} | {row[DESTINATION] for row in rows}
+        missing -= names.keys() | {None}
+        if missing:
+            names.update(Account.objects.using(using).filter(id__in=missing).values_list('id', 'user__full_name'))
+
+        for row in rows:
+            entry = Transaction(
+                id=row[ID], account_id=row[ACCOUNT], type=row[TYPE], value=row[VALUE], balance_after=row[BALANCE_AFTER],
+                created_at=row[CREATED_AT], description=row[DESCRIPTION], origin_account_id=row[ORIGIN],
+                destination_account_id=row[DESTINATION], related_transaction_id=row[RELATED]
+            )
+            entry.origin_name = names.get(row[ORIGIN])
+            entry.destination_name = names.get(row[DESTINATION])
+            entry.related_account_id = row[RELATED_ACCOUNT]
+            yield entry
+
+
+# Totais por (bucket, tipo) das linhas arquivadas, no formato das linhas do GROUP BY
+# de statements.statement_summary.
+def archived_summary(account_id, start, end, bucket_start):
+    groups = {}
+
+    for rows in _archived_segments(account_id, start, end, None, False, None):
+        for row in rows:
+            key = (bucket_start(timezone.localdate(row[CREATED_AT])), row[TYPE])
+            group = groups.setdefault(key, {
+                'bucket': key[0], 'type': key[1], 'count': 0, 'total': Decimal("0.00"),
+                'credits': Decimal("0.00"), 'debits': Decimal("0.00")
+            })
+            amount = signed_value(row[TYPE], row[VALUE], account_id, row[RELATED_ACCOUNT])
+            group['count'] += 1
+            group['total'] += row[VALUE]
+            if amount > 0:
+                group['credits'] += amount
+            else:
+                group['debits'] -= amount
+
+    return list(groups.values())
+
+
+# Soma arquivada por conta (centavos), ponto de partida do reconcile_balances
+def archived_net(first_id, last_id):
+    return {
+        account_id: int(round(net * 100))
+        for account_id, net in TransactionArchive.objects.filter(
+            account_id__gte=first_id, account_id__lte=last_id
+        ).values('account_id').annotate(total=Sum('net')).values_list('account_id', 'total')
+    }
+
+
+def is_archived(transaction_id):
+    segments = TransactionArchive.objects.filter(
+        first_transaction_id__lte=transaction_id, last_transaction_id__gte=transaction_id
+    )
+    return any(row[ID] == transaction_id for segment in segments for row in segment_rows(segment))
+
+
+# Segmentos que a verificacao incremental precisa reler: os das contas ainda sem
+# checkpoint e os posteriores ao menor horizonte selado.
+def segments_since(first_id, last_id, since=None, unsealed=()):
+    segments = TransactionArchive.objects.filter(account_id__gte=first_id, account_id__lte=last_id)
+
+    if since is not None:
+        condition = Q(last_created_at__gte=since)
+        if unsealed:
+            condition |= Q(account_id__in=unsealed)
+        segments = segments.filter(condition)
+
+    return segments
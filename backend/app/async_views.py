@@ -0,0 +1,167 @@
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated, PermissionDenied, ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .authentication import AccountJWTAuthentication
+from .balance_cache import acached_account, aremember_account, etag_for, etag_matches
+from .instrumentation import serializer_timer
+from .models import Account
+from .pagination import TransactionKeysetPagination
+from .routing import areplica_for, read_from
+from .serializers import AccountSerializer, TransactionStatementSerializer
+from .statements import statement_queryset, archived_statement
+from .streaming import astream_queryset, arows, aserialized_chunks
+
+
+def json_response(data, status_code=status.HTTP_200_OK, headers=None):
+    return HttpResponse(
+        JSONRenderer().render(data), status=status_code, headers=headers, content_type='application/json'
+    )
+
+
+# Views somente leitura para deploy ASGI. O APIView do DRF e sincrono, entao aqui
+# a autenticacao, a permissao e o tratamento de erro sao feitos a mao, com o mesmo
+# formato de resposta das views em app/views.py.
+class AsyncAccountView(View):
+    http_method_names = ['get']
+    admin_only = False
+    # Como ReplicaReadMixin nas views sincronas
+    replica_reads = False
+    authenticator = AccountJWTAuthentication()
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            result = await self.authenticator.aauthenticate(request)
+            if result is None:
+                raise NotAuthenticated()
+            user = result[0]
+
+            if self.admin_only and user.role != 'admin':
+                raise PermissionDenied()
+
+            # Request do DRF apenas pelo query_params usado por paginacao e filtros;
+            # sem autenticadores, o usuario precisa ser atribuido explicitamente.
+            drf_request = Request(request)
+            drf_request.user = user
+
+            alias = await areplica_for(user.account.id) if self.replica_reads else None
+            with read_from(alias):
+                return await super().dispatch(drf_request, *args, **kwargs)
+        except APIException as exc:
+            headers = None
+            if isinstance(exc, NotAuthenticated) or exc.status_code == status.HTTP_401_UNAUTHORIZED:
+                headers = {'WWW-Authenticate': self.authenticator.authenticate_header(request)}
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            return json_response(data, exc.status_code, headers)
+
+
+# Mesma composicao de app/views.statement_response. As linhas arquivadas sao lidas
+# pelo ORM sincrono: no stream e na resposta completa, aos poucos (um sync_to_async
+# por chunk); na paginacao, so as da pagina.
+async def astatement_response(request, account, transactions, descending=False):
+    def archived_rows(after=None):
+        return archived_statement(account, request.query_params, descending, after, using=transactions.db)
+
+    stream_format = request.query_params.get('stream')
+    if stream_format:
+        return astream_queryset(
+            transactions, TransactionStatementSerializer, stream_format, archived=archived_rows(), descending=descending
+        )
+
+    paginator = TransactionKeysetPagination(descending=descending)
+    if paginator.is_requested(request):
+        archived = sync_to_async(lambda after, limit: list(islice(archived_rows(after), limit)))
+        page = paginator.get_page_queryset(transactions, request)
+        position = paginator.decode_cursor(request)
+        limit = paginator.page_size_value + 1
+
+        if descending:
+            rows = [row async for row in page]
+            if len(rows) < limit:
+                rows += await archived(position, limit - len(rows))
+        else:
+            rows = await archived(position, limit)
+            if len(rows) < limit:
+                rows += [row async for row in page[:limit - len(rows)]]
+
+        page = paginator.set_page(rows)
+        with serializer_timer():
+            data = TransactionStatementSerializer(page, many=True).data
+        return json_response(paginator.get_paginated_response(data).data)
+
+    data = []
+    rows = arows(transactions, archived_rows(), descending)
+    async for chunk in aserialized_chunks(rows, TransactionStatementSerializer):
+        data.extend(chunk)
+
+    return json_response(data)
+
+
+class AsyncBalanceView(AsyncAccountView):
+
+    async def get(self, request):
+        account_id = request.user.account.id
+        data, version = await acached_account(request.user.pk, account_id)
+
+        if data is None:
+            try:
+                account = await Account.objects.with_balance().select_related('user').aget(pk=account_id)
+            except Account.DoesNotExist:
+                return json_response({"detail": "Conta não encontrada."}, status.HTTP_404_NOT_FOUND)
+
+            with serializer_timer():
+                data = AccountSerializer(account).data
+            await aremember_account(request.user.pk, account_id, version, data)
+
+        etag = etag_for(data)
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+
+        if etag_matches(request, etag):
+            return HttpResponse(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        return json_response(data, headers=headers)
+
+
+class AsyncStatementView(AsyncAccountView):
+    replica_reads = True
+
+    async def get(self, request):
+        transactions = statement_queryset(request.user.account, request.query_params)
+
+        return await astatement_response(request, request.user.account, transactions)
+
+
+class AsyncAdminUsersView(AsyncAccountView):
+    admin_only = True
+    replica_reads = True
+
+    async def get(self, request):
+        accounts = [
+            account async for account in
+            Account.objects.filter(user__role='user').select_related('user').with_balance()
+        ]
+        with serializer_timer():
+            data = AccountSerializer(accounts, many=True).data
+
+        return json_response(data)
+
+
+class AsyncAdminStatementView(AsyncAccountView):
+    admin_only = True
+    replica_reads = True
+
+    async def get(self, request, id):
+        account = await Account.objects.filter(user__id=id).afirst()
+
+        if not account:
+            raise ValidationError("Usuário não encontrado.")
+
+        transactions = statement_queryset(account, request.query_params, descending=True)
+
+        return await astatement_response(request, account, transactions, descending=True)
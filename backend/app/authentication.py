@@ -0,0 +1,157 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils.functional import cached_property
+from drf_spectacular.contrib.rest_framework_simplejwt import (
+    SimpleJWTScheme, TokenObtainPairSerializerExtension, TokenRefreshSerializerExtension
+)
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+
+from .models import User, Account
+
+
+def _version_key(user_id):
+    return f'auth:token-version:{user_id}'
+
+
+# Versao atual dos tokens do usuario: cache primeiro, banco no miss. Com um cache
+# compartilhado (Redis/Memcached) a revogacao vale para todos os processos na hora;
+# com o LocMemCache padrao, no maximo AUTH_TOKEN_VERSION_CACHE_TTL depois.
+def token_version(user_id):
+    version = cache.get(_version_key(user_id))
+
+    if version is None:
+        version = User.objects.filter(pk=user_id).values_list('token_version', flat=True).first()
+        if version is None:
+            return None
+        cache.set(_version_key(user_id), version, settings.AUTH_TOKEN_VERSION_CACHE_TTL)
+
+    return version
+
+
+async def atoken_version(user_id):
+    version = await cache.aget(_version_key(user_id))
+
+    if version is None:
+        version = await User.objects.filter(pk=user_id).values_list('token_version', flat=True).afirst()
+        if version is None:
+            return None
+        await cache.aset(_version_key(user_id), version, settings.AUTH_TOKEN_VERSION_CACHE_TTL)
+
+    return version
+
+
+def revoke_tokens(user_id):
+    User.objects.filter(pk=user_id).update(token_version=F('token_version') + 1)
+    # Apagar so depois do commit: antes disso outra requisicao poderia reler a
+    # versao antiga do banco e coloca-la de volta no cache.
+    transaction.on_commit(lambda: cache.delete(_version_key(user_id)))
+
+
+class AccountTokenObtainPairSerializer(TokenObtainPairSerializer):
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        # A versao vem do banco: ela pode ter sido incrementada depois que a
+        # instancia em memoria foi carregada.
+        account = Account.objects.filter(user=user).values(
+            'id', 'status', 'shard_count', 'user__token_version'
+        ).first()
+
+        token['role'] = user.role
+        token['ver'] = account['user__token_version'] if account else user.token_version
+        if account:
+            token['account_id'] = account['id']
+            token['account_status'] = account['status']
+            token['account_shards'] = account['shard_count']
+
+        return token
+
+
+class AccountTokenRefreshSerializer(TokenRefreshSerializer):
+
+    # O access token herda as claims do refresh; um refresh de versao antiga
+    # reemitiria role e status desatualizados.
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        if 'ver' in refresh and refresh['ver'] != token_version(refresh['user_id']):
+            raise InvalidToken('Token revogado. Faça login novamente.')
+
+        return super().validate(attrs)
+
+
+class AccountUser(TokenUser):
+
+    @cached_property
+    def account(self):
+        return Account(
+            id=self.token['account_id'],
+            user_id=self.pk,
+            status=self.token['account_status'],
+            shard_count=self.token.get('account_shards', 0),
+        )
+
+
+# Autentica pelas claims do token, sem buscar User nem Account: request.user e um
+# AccountUser com pk, role e account montados a partir do token. A unica checagem
+# por requisicao e a versao do token (em cache). Tokens sem as claims (emitidos
+# antes desta autenticacao) seguem pelo caminho padrao, que busca o User.
+class AccountJWTAuthentication(JWTAuthentication):
+
+    def get_user(self, validated_token):
+        if 'account_id' not in validated_token or 'ver' not in validated_token:
+            return super().get_user(validated_token)
+
+        if validated_token['ver'] != token_version(validated_token['user_id']):
+            raise InvalidToken('Token revogado. Faça login novamente.')
+
+        return AccountUser(validated_token)
+
+    # Caminho das views async (app/async_views.py): validar o JWT nao toca o banco,
+    # e a checagem de versao usa a API async do cache/ORM.
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        if 'account_id' not in validated_token or 'ver' not in validated_token:
+            # Tokens antigos: busca o User ja com a conta, que as views acessam.
+            try:
+                user = await User.objects.select_related('account').aget(pk=validated_token['user_id'])
+            except User.DoesNotExist:
+                raise AuthenticationFailed('Usuário não encontrado.', code='user_not_found')
+            if not user.is_active:
+                raise AuthenticationFailed('Usuário inativo.', code='user_inactive')
+            return user
+
+        if validated_token['ver'] != await atoken_version(validated_token['user_id']):
+            raise InvalidToken('Token revogado. Faça login novamente.')
+
+        return AccountUser(validated_token)
+
+
+# Documentacao (drf-spectacular): as extensoes do SimpleJWT valem so para as classes originais.
+class AccountJWTScheme(SimpleJWTScheme):
+    target_class = 'app.authentication.AccountJWTAuthentication'
+
+
+class AccountTokenObtainPairSerializerExtension(TokenObtainPairSerializerExtension):
+    target_class = 'app.authentication.AccountTokenObtainPairSerializer'
+
+
+class AccountTokenRefreshSerializerExtension(TokenRefreshSerializerExtension):
+    target_class = 'app.authentication.AccountTokenRefreshSerializer'
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import secrets
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework.utils.encoders import JSONEncoder
+
+
+# Leituras de saldo (BalanceAPIView) servidas do cache configurado em
+# BALANCE_CACHE_ALIAS, em tres chaves:
+#   profile (por usuario): dados da conta/usuario serializados, sem o saldo (muda
+#            raramente, invalidado pelos signals de User/Account);
+#   balance (por conta): saldo formatado e a versao com que foi lido do banco;
+#   version (por conta): incrementada (incr, atomico) depois de cada commit que
+#            altera o saldo.
+# Uma entrada de saldo so vale com a versao atual: uma leitura do banco anterior a
+# um commit concorrente fica com a versao antiga e vira miss, em vez de servir o
+# saldo velho ate o TTL. Os servicos nao gravam o saldo no cache: em contas com
+# sub-saldos o balance_after nao ve creditos concorrentes, e duas gravacoes apos
+# commits diferentes nao tem ordem garantida. Com varios processos, use um backend
+# compartilhado (Redis/Memcached): o LocMemCache so enxerga o proprio processo.
+def _cache():
+    return caches[settings.BALANCE_CACHE_ALIAS]
+
+
+def _profile_key(user_id):
+    return f'account:profile:{user_id}'
+
+
+def _balance_key(account_id):
+    return f'account:balance:{account_id}'
+
+
+def _version_key(account_id):
+    return f'account:balance-version:{account_id}'
+
+
+# Versao inicial aleatoria: se a chave expirar, a nova sequencia nao coincide com
+# a de entradas gravadas antes
+def _initial_version():
+    return secrets.randbits(48)
+
+
+def _bump_version(cache, account_id):
+    try:
+        cache.incr(_version_key(account_id))
+    except ValueError:
+        if not cache.add(_version_key(account_id), _initial_version(), settings.BALANCE_CACHE_TTL):
+            cache.incr(_version_key(account_id))
+
+
+def _keys(user_id, account_id):
+    return [_profile_key(user_id), _balance_key(account_id), _version_key(account_id)]
+
+
+def _lookup(entries, user_id, account_id, version):
+    profile = entries.get(_profile_key(user_id))
+    balance = entries.get(_balance_key(account_id))
+
+    if profile is None or balance is None or balance['version'] != version:
+        return None
+
+    return {**profile, 'balance': balance['balance']}
+
+
+# Retorna (dados ou None, versao). No miss, a versao lida aqui, antes da consulta
+# ao banco, e a que remember_account grava junto do saldo.
+def cached_account(user_id, account_id):
+    cache = _cache()
+    entries = cache.get_many(_keys(user_id, account_id))
+    version = entries.get(_version_key(account_id))
+
+    if version is None:
+        cache.add(_version_key(account_id), _initial_version(), settings.BALANCE_CACHE_TTL)
+        return None, cache.get(_version_key(account_id))
+
+    return _lookup(entries, user_id, account_id, version), version
+
+
+async def acached_account(user_id, account_id):
+    cache = _cache()
+    entries = await cache.aget_many(_keys(user_id, account_id))
+    version = entries.get(_version_key(account_id))
+
+    if version is None:
+        await cache.aadd(_version_key(account_id), _initial_version(), settings.BALANCE_CACHE_TTL)
+        return None, await cache.aget(_version_key(account_id))
+
+    return _lookup(entries, user_id, account_id, version), version
+
+
+def _entries(user_id, account_id, version, data):
+    # O saldo fica como None para manter a ordem dos campos ao remontar.
+    return {
+        _profile_key(user_id): {**data, 'balance': None},
+        _balance_key(account_id): {'version': version, 'balance': data['balance']},
+    }
+
+
+# Chamado com dados lidos do banco e a versao devolvida por cached_account
+def remember_account(user_id, account_id, version, data):
+    _cache().set_many(_entries(user_id, account_id, version, data), settings.BALANCE_CACHE_TTL)
+
+
+async def aremember_account(user_id, account_id, version, data):
+    await _cache().aset_many(_entries(user_id, account_id, version, data), settings.BALANCE_CACHE_TTL)
+
+
+def etag_for(data):
+    payload = json.dumps(data, cls=JSONEncoder, sort_keys=True).encode()
+    return f'"{hashlib.sha1(payload).hexdigest()}"'
+
+
+# If-None-Match com comparacao fraca (RFC 9110): cada ETag da lista e comparado
+# inteiro, sem o prefixo W/, e "*" casa com qualquer representacao.
+def etag_matches(request, etag):
+    etags = parse_etags(request.headers.get('If-None-Match', ''))
+    if etags == ['*']:
+        return True
+    return etag.removeprefix('W/') in (value.removeprefix('W/') for value in etags)
+
+
+# Recebe as transacoes gravadas e, apos o commit, invalida o saldo em cache de
+# cada conta envolvida
+def invalidate_balances(entries):
+    account_ids = {entry.account_id for entry in entries}
+
+    def invalidate():
+        cache = _cache()
+        for account_id in account_ids:
+            _bump_version(cache, account_id)
+
+    transaction.on_commit(invalidate)
+
+
+def invalidate_account(user_id, account_id=None):
+    cache = _cache()
+    cache.delete(_profile_key(user_id))
+    if account_id is not None:
+        _bump_version(cache, account_id)
@@ -0,0 +1,130 @@
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .authentication import AccountTokenObtainPairSerializer
+from .ledger import ledger_rows, build_daily_snapshots
+from .models import User, Account, Transaction, DailyBalanceSnapshot
+
+
+# Os benchmarks rodam em um banco de teste descartavel (test_<NAME>), criado e
+# destruido pelo proprio comando, para nunca sujar a base de desenvolvimento.
+# Em SQLite, on_disk troca o banco em memoria por um arquivo, necessario quando
+# varias threads escrevem ao mesmo tempo.
+@contextmanager
+def benchmark_database(keepdb=False, on_disk=False):
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict['TEST']
+    old_test_name = test_settings.get('NAME')
+
+    if on_disk and connection.vendor == 'sqlite':
+        test_settings['NAME'] = str(settings.BASE_DIR / 'bench.sqlite3')
+
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        test_settings['NAME'] = old_test_name
+
+
+def create_accounts(count, balance=Decimal("0.00"), prefix='bench', offset=0):
+    users = User.objects.bulk_create([
+        User(
+            email=f'{prefix}-{offset + index}@bench.local',
+            full_name=f'{prefix} {offset + index}',
+            cpf=f'8{offset + index:010d}',
+            role=User.Role.USER,
+            password='!',
+        )
+        for index in range(count)
+    ], batch_size=1000)
+
+    return Account.objects.bulk_create(
+        [Account(user=user, balance=balance) for user in users],
+        batch_size=1000
+    )
+
+
+@contextmanager
+def measure():
+    result = {}
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        yield result
+        result['seconds'] = time.perf_counter() - started
+    result['queries'] = len(queries.captured_queries)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def access_token_for(user):
+    return str(AccountTokenObtainPairSerializer.get_token(user).access_token)
+
+
+# Gera um historico coerente (deposito inicial por conta e pares envio/recebimento
+# com balance_after corretos) direto com bulk_create. Retorna os ids dos envios.
+def seed_ledger(accounts, transactions, rng, initial=Decimal("1000.00"), batch_size=2000):
+    balances = {account.id: account.balance for account in accounts}
+    pending = []
+    sent_ids = []
+
+    def flush():
+        sent = Transaction.objects.bulk_create([row for row, _ in pending if row.type == Transaction.Type.ENVIO])
+        sent_ids.extend(row.id for row in sent)
+        for row, related in pending:
+            if related is not None:
+                row.related_transaction = related
+        Transaction.objects.bulk_create([row for row, _ in pending if row.type != Transaction.Type.ENVIO])
+        pending.clear()
+
+    for account in accounts:
+        balances[account.id] += initial
+        pending.append((Transaction(
+            account=account, value=initial, balance_after=balances[account.id], type=Transaction.Type.DEPÓSITO
+        ), None))
+
+    created = len(accounts)
+    while created < transactions:
+        origin, destination = rng.sample(accounts, 2)
+        value = Decimal(rng.randint(1, 50))
+        if balances[origin.id] < value:
+            continue
+
+        balances[origin.id] -= value
+        balances[destination.id] += value
+        sent = Transaction(
+            account=origin, origin_account=origin, destination_account=destination, value=value,
+            balance_after=balances[origin.id], type=Transaction.Type.ENVIO, description='bench'
+        )
+        pending.append((sent, None))
+        pending.append((Transaction(
+            account=destination, origin_account=origin, destination_account=destination, value=value,
+            balance_after=balances[destination.id], type=Transaction.Type.RECEBIMENTO, description='bench'
+        ), sent))
+        created += 2
+
+        if len(pending) >= batch_size:
+            flush()
+
+    flush()
+
+    for account in accounts:
+        account.balance = balances[account.id]
+    Account.objects.bulk_update(accounts, ['balance'], batch_size=batch_size)
+    DailyBalanceSnapshot.objects.bulk_create(
+        build_daily_snapshots(ledger_rows(Transaction.objects.all()).iterator()),
+        batch_size=batch_size
+    )
+
+    return sent_ids
@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# Cache em memoria do processo, limitado por quantidade (LRU) e por idade (TTL).
+# As entradas podem ser marcadas com tags para invalidar de uma vez tudo que
+# depende de um mesmo registro (ex.: todas as chaves de um usuario).
+class LRUCache:
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.tags = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None or (entry[1] is not None and entry[1] < time.monotonic()):
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return default
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, tags=()):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+            self.entries[key] = (value, expires, tuple(tags))
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+
+            while len(self.entries) > self.maxsize:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, key):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+    def invalidate_tag(self, tag):
+        with self.lock:
+            for key in self.tags.pop(tag, ()):
+                if key in self.entries:
+                    self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+
+    def _remove(self, key):
+        _value, _expires, tags = self.entries.pop(key)
+        for tag in tags:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+    def __len__(self):
+        return len(self.entries)
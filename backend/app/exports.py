@@ -0,0 +1,256 @@
+import csv
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import chain
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+import django
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Min, Max
+from django.utils import timezone
+
+from .ledger import signed_value
+from .models import StatementExport, Transaction
+from .statements import statement_queryset, archived_statement
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+logger = logging.getLogger('app.exports')
+
+EXPORT_FIELDS = (
+    'id', 'type', 'value', 'description', 'created_at', 'balance_after',
+    'origin_name', 'destination_name', 'related_account_id'
+)
+
+EXPORT_CONTENT_TYPES = {
+    StatementExport.Format.CSV: 'text/csv; charset=utf-8',
+    StatementExport.Format.OFX: 'application/x-ofx',
+    StatementExport.Format.PARQUET: 'application/vnd.apache.parquet',
+}
+
+
+def parquet_available():
+    return pyarrow is not None
+
+
+def export_path(export):
+    return Path(settings.EXPORT_ROOT) / f'statement-{export.pk}.{export.format}'
+
+
+def export_filename(export):
+    return f'extrato-{export.account_id}-{export.pk}.{export.format}'
+
+
+# Linhas como tuplas (values_list) lidas em chunks: sem instanciar Transaction nem
+# serializer por linha, e com cursor do lado do servidor no PostgreSQL.
+def export_queryset(export):
+    return statement_queryset(export.account, export.filters).annotate(
+        related_account_id=F('related_transaction__account_id')
+    )
+
+
+# Meses arquivados da conta (app/archive.py) que cruzam o periodo vem antes das
+# linhas da tabela quente, no mesmo formato de tupla.
+def export_rows(export, queryset):
+    archived = (
+        (
+            entry.id, entry.type, entry.value, entry.description, entry.created_at, entry.balance_after,
+            entry.origin_name, entry.destination_name, entry.related_account_id
+        )
+        for entry in archived_statement(export.account, export.filters)
+    )
+    return chain(archived, queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE))
+
+
+def write_csv(handle, export, queryset):
+    writer = csv.writer(handle)
+    writer.writerow(EXPORT_FIELDS[:-1])
+    count = 0
+
+    for row in export_rows(export, queryset):
+        writer.writerow([
+            row[0], row[1], row[2], row[3], row[4].isoformat(), row[5], row[6] or '', row[7] or ''
+        ])
+        count += 1
+
+    return count
+
+
+def _ofx_date(value):
+    return timezone.localtime(value).strftime('%Y%m%d%H%M%S')
+
+
+def _ofx_type(transaction_type, amount):
+    if transaction_type in (Transaction.Type.ENVIO, Transaction.Type.RECEBIMENTO):
+        return 'XFER'
+    return 'CREDIT' if amount > 0 else 'DEBIT'
+
+
+# OFX 2.2 (XML). O intervalo do BANKTRANLIST vem antes das transacoes, entao e
+# lido primeiro com um aggregate sobre o indice (conta, created_at). Linhas
+# arquivadas sao anteriores as quentes: o inicio pode estar no arquivo, e o fim so
+# esta nele quando a tabela quente nao tem nada no periodo.
+def write_ofx(handle, export, queryset):
+    bounds = queryset.order_by().aggregate(first=Min('created_at'), last=Max('created_at'))
+    oldest = next(archived_statement(export.account, export.filters), None)
+    newest = None if bounds['last'] else next(archived_statement(export.account, export.filters, descending=True), None)
+    now = timezone.now()
+    first = (oldest.created_at if oldest else bounds['first']) or now
+    last = (newest.created_at if newest else bounds['last']) or now
+
+    handle.write(
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<?OFX OFXHEADER="200" VERSION="220" SECURITY="NONE" OLDFILEUID="NONE" NEWFILEUID="NONE"?>\n'
+        '<OFX><SIGNONMSGSRSV1><SONRS><STATUS><CODE>0</CODE><SEVERITY>INFO</SEVERITY></STATUS>'
+        f'<DTSERVER>{_ofx_date(now)}</DTSERVER><LANGUAGE>POR</LANGUAGE></SONRS></SIGNONMSGSRSV1>\n'
+        f'<BANKMSGSRSV1><STMTTRNRS><TRNUID>{export.pk}</TRNUID>'
+        '<STATUS><CODE>0</CODE><SEVERITY>INFO</SEVERITY></STATUS>\n'
+        '<STMTRS><CURDEF>BRL</CURDEF>'
+        f'<BANKACCTFROM><BANKID>0000</BANKID><ACCTID>{export.account_id}</ACCTID><ACCTTYPE>CHECKING</ACCTTYPE></BANKACCTFROM>\n'
+        f'<BANKTRANLIST><DTSTART>{_ofx_date(first)}</DTSTART><DTEND>{_ofx_date(last)}</DTEND>\n'
+    )
+
+    count = 0
+    balance = None
+    for row in export_rows(export, queryset):
+        amount = signed_value(row[1], row[2], export.account_id, row[8])
+        counterpart = row[7] if amount < 0 else row[6]
+        handle.write(
+            f'<STMTTRN><TRNTYPE>{_ofx_type(row[1], amount)}</TRNTYPE><DTPOSTED>{_ofx_date(row[4])}</DTPOSTED>'
+            f'<TRNAMT>{amount}</TRNAMT><FITID>{row[0]}</FITID>'
+            + (f'<NAME>{escape(counterpart[:32])}</NAME>' if counterpart else '')
+            + f'<MEMO>{escape(row[3] or row[1])}</MEMO></STMTTRN>\n'
+        )
+        balance = row[5]
+        count += 1
+
+    handle.write('</BANKTRANLIST>')
+    if balance is not None:
+        handle.write(f'<LEDGERBAL><BALAMT>{balance}</BALAMT><DTASOF>{_ofx_date(last)}</DTASOF></LEDGERBAL>')
+    handle.write('</STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n')
+
+    return count
+
+
+# Um row group por chunk: o arquivo cresce em disco sem acumular o extrato em memoria.
+def write_parquet(path, export, queryset):
+    schema = pyarrow.schema([
+        ('id', pyarrow.int64()),
+        ('type', pyarrow.string()),
+        ('value', pyarrow.decimal128(12, 2)),
+        ('description', pyarrow.string()),
+        ('created_at', pyarrow.timestamp('us', tz='UTC')),
+        ('balance_after', pyarrow.decimal128(12, 2)),
+        ('origin_name', pyarrow.string()),
+        ('destination_name', pyarrow.string()),
+    ])
+    count = 0
+    chunk = []
+
+    with pyarrow.parquet.ParquetWriter(path, schema, compression='zstd') as writer:
+        def flush():
+            columns = list(zip(*chunk))
+            writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+            ))
+            chunk.clear()
+
+        for row in export_rows(export, queryset):
+            chunk.append(row[:-1])
+            count += 1
+            if len(chunk) >= settings.EXPORT_CHUNK_SIZE:
+                flush()
+
+        if chunk:
+            flush()
+
+    return count
+
+
+def write_export(export, path):
+    queryset = export_queryset(export)
+
+    if export.format == StatementExport.Format.PARQUET:
+        return write_parquet(path, export, queryset)
+
+    writer = write_csv if export.format == StatementExport.Format.CSV else write_ofx
+    with open(path, 'w', encoding='utf-8', newline='') as handle:
+        return writer(handle, export, queryset)
+
+
+# Executado no processo do pool (ou pelo comando run_exports). O UPDATE condicional
+# garante que so um worker processa cada exportacao.
+def run_export(export_id):
+    claimed = StatementExport.objects.filter(
+        pk=export_id, status=StatementExport.Status.PENDENTE
+    ).update(status=StatementExport.Status.PROCESSANDO, started_at=timezone.now())
+
+    if not claimed:
+        return False
+
+    export = StatementExport.objects.select_related('account').get(pk=export_id)
+    path = export_path(export)
+    partial = path.with_name(path.name + '.part')
+
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        count = write_export(export, partial)
+        os.replace(partial, path)
+    except Exception as exc:
+        logger.exception("Falha na exportacao de extrato %s", export_id)
+        partial.unlink(missing_ok=True)
+        StatementExport.objects.filter(pk=export_id).update(
+            status=StatementExport.Status.FALHOU, error=str(exc)[:1000], finished_at=timezone.now()
+        )
+        return False
+
+    StatementExport.objects.filter(pk=export_id).update(
+        status=StatementExport.Status.CONCLUIDO, file_path=str(path), file_size=path.stat().st_size,
+        row_count=count, finished_at=timezone.now()
+    )
+    return True
+
+
+# Pool de processos local, criado sob demanda. spawn em vez de fork: o processo
+# filho nao herda as conexoes de banco abertas do servidor.
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor(reset=False):
+    global _pool
+    with _pool_lock:
+        if reset and _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.EXPORT_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup
+            )
+        return _pool
+
+
+def _submit(export_id):
+    try:
+        _executor().submit(run_export, export_id)
+    except BrokenProcessPool:
+        _executor(reset=True).submit(run_export, export_id)
+
+
+# Com EXPORT_WORKERS = 0 as exportacoes ficam pendentes para o comando run_exports.
+def enqueue_export(export):
+    if settings.EXPORT_WORKERS:
+        transaction.on_commit(lambda: _submit(export.pk))
@@ -0,0 +1,101 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+# Hashers com os parametros de core/settings.py. Hashes gravados com outros
+# parametros continuam validos; must_update() os aponta e User.check_password
+# refaz o hash no proximo login.
+class TunedScryptPasswordHasher(hashers.ScryptPasswordHasher):
+
+    def __init__(self):
+        self.work_factor = settings.SCRYPT_WORK_FACTOR
+        self.block_size = settings.SCRYPT_BLOCK_SIZE
+        self.parallelism = settings.SCRYPT_PARALLELISM
+        # Com maxmem = 0 o OpenSSL limita o scrypt a 32 MiB (work factor 2**15)
+        self.maxmem = 2 * 128 * self.work_factor * self.block_size * self.parallelism
+
+
+class TunedArgon2PasswordHasher(hashers.Argon2PasswordHasher):
+
+    def __init__(self):
+        self.time_cost = settings.ARGON2_TIME_COST
+        self.memory_cost = settings.ARGON2_MEMORY_COST
+        self.parallelism = settings.ARGON2_PARALLELISM
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Servidor ocupado. Tente novamente em instantes.'
+    default_code = 'hashing_unavailable'
+
+
+# Pool de threads limitado para hash e verificacao de senhas: hashlib (PBKDF2,
+# scrypt) e argon2-cffi liberam o GIL durante o calculo, entao as threads usam
+# nucleos de verdade. Rajadas de cadastro e login ocupam no maximo
+# PASSWORD_HASHING_WORKERS nucleos; ate PASSWORD_HASHING_QUEUE chamadas esperam
+# por uma vaga e as demais recebem 503 depois de PASSWORD_HASHING_TIMEOUT segundos.
+# So o calculo vai para o pool: gravar o hash refeito fica na thread da
+# requisicao, com a conexao e a transacao dela.
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+# Marca as threads do pool: uma chamada feita de dentro delas (hasher que chama
+# outro hash) roda ali mesmo, sem esperar por uma vaga que ela propria ocupa.
+_worker = threading.local()
+
+
+def _executor():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASHING_WORKERS, thread_name_prefix='password-hashing'
+            )
+            _slots = threading.BoundedSemaphore(settings.PASSWORD_HASHING_WORKERS + settings.PASSWORD_HASHING_QUEUE)
+        return _pool, _slots
+
+
+def _in_worker(function, *args):
+    _worker.active = True
+    try:
+        return function(*args)
+    finally:
+        _worker.active = False
+
+
+def _run(function, *args):
+    if not settings.PASSWORD_HASHING_WORKERS or getattr(_worker, 'active', False):
+        return function(*args)
+
+    pool, slots = _executor()
+    if not slots.acquire(timeout=settings.PASSWORD_HASHING_TIMEOUT):
+        raise HashingUnavailable()
+    try:
+        return pool.submit(_in_worker, function, *args).result()
+    finally:
+        slots.release()
+
+
+def hash_password(raw_password):
+    return _run(hashers.make_password, raw_password)
+
+
+# Cadastro em lote: cada hash ocupa uma vaga do pool, como um login, entao logins
+# concorrentes entram na fila intercalados com o lote. None gera um hash inutilizavel.
+def hash_passwords(raw_passwords):
+    if getattr(_worker, 'active', False):
+        return [hash_password(raw_password) for raw_password in raw_passwords]
+
+    with ThreadPoolExecutor(max_workers=settings.PASSWORD_HASHING_WORKERS or 1) as feeders:
+        return list(feeders.map(hash_password, raw_passwords))
+
+
+# (senha correta, hash precisa ser refeito): hasher diferente do preferido ou
+# parametros diferentes dos atuais.
+def verify_password(raw_password, encoded):
+    return _run(hashers.verify_password, raw_password, encoded)
@@ -0,0 +1,121 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+IDEMPOTENCY_PARAMETER = OpenApiParameter(
+    name=IDEMPOTENCY_HEADER,
+    location=OpenApiParameter.HEADER,
+    description='Chave unica por operacao. Repeticoes com a mesma chave devolvem a resposta original sem executar a operacao de novo.',
+    required=False,
+    type=str,
+)
+
+
+def _normalize(data):
+    return json.loads(json.dumps(data, cls=JSONEncoder))
+
+
+def _fingerprint(request):
+    payload = json.dumps(
+        [request.method, request.path, request.data],
+        cls=JSONEncoder,
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _replay(record, fingerprint):
+    if record.request_hash != fingerprint:
+        return Response(
+            {"detail": "Idempotency-Key já utilizada com uma requisição diferente."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+
+    if record.status_code is None:
+        return Response(
+            {"detail": "Requisição com esta Idempotency-Key ainda em processamento."},
+            status=status.HTTP_409_CONFLICT
+        )
+
+    return Response(record.response_body, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+def _lookup(user_id, key, now):
+    record = IdempotencyKey.objects.filter(user_id=user_id, key=key).first()
+
+    if record is not None and record.expires_at <= now:
+        record.delete()
+        return None
+
+    return record
+
+
+# Decorator para metodos post de APIView. Com o header Idempotency-Key, a primeira
+# execucao grava a resposta na mesma transacao da operacao; repeticoes custam uma
+# consulta pela chave (user, key) e nunca chegam aos servicos nem aos locks de Account.
+# Respostas de erro nao sao gravadas, entao a operacao pode ser repetida.
+def idempotent(view_method):
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(key) > 255:
+            raise ValidationError({IDEMPOTENCY_HEADER: "A chave deve ter no máximo 255 caracteres."})
+
+        now = timezone.now()
+        fingerprint = _fingerprint(request)
+        record = _lookup(request.user.pk, key, now)
+
+        if record is not None:
+            return _replay(record, fingerprint)
+
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(
+                        user_id=request.user.pk,
+                        key=key,
+                        endpoint=f"{request.method} {request.path}"[:255],
+                        request_hash=fingerprint,
+                        expires_at=now + settings.IDEMPOTENCY_KEY_TTL
+                    )
+            except IntegrityError:
+                # Outra requisicao com a mesma chave terminou primeiro.
+                record = IdempotencyKey.objects.filter(user_id=request.user.pk, key=key).first()
+                if record is None:
+                    return Response(
+                        {"detail": "Requisição com esta Idempotency-Key ainda em processamento."},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                return _replay(record, fingerprint)
+
+            response = view_method(self, request, *args, **kwargs)
+
+            if status.is_success(response.status_code):
+                record.status_code = response.status_code
+                record.response_body = _normalize(response.data)
+                record.save(update_fields=['status_code', 'response_body'])
+            else:
+                record.delete()
+
+            return response
+
+    return wrapper
@@ -0,0 +1,187 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .models import Account, AccountBalanceShard
+
+
+# Comandos que tomam lock de linha de saldo: SELECT ... FOR UPDATE e os UPDATEs
+# condicionais de Account/AccountBalanceShard. O tempo gasto neles e a melhor
+# aproximacao disponivel para espera por lock sem acesso as views do banco.
+LOCKING_SQL = re.compile(
+    r'FOR UPDATE|^UPDATE\s+["`]?(%s|%s)["`]?\s' % (Account._meta.db_table, AccountBalanceShard._meta.db_table),
+    re.IGNORECASE
+)
+
+
+class QueryTimer:
+
+    def __init__(self, capture_sql=False):
+        self.count = 0
+        self.seconds = 0.0
+        self.lock_seconds = 0.0
+        self.statements = [] if capture_sql else None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if LOCKING_SQL.search(sql):
+                self.lock_seconds += elapsed
+            if self.statements is not None:
+                self.statements.append((sql, elapsed))
+
+    def snapshot(self):
+        return self.count, self.seconds, self.lock_seconds
+
+
+# Metricas da requisicao corrente. O contexto e copiado para as threads do
+# sync_to_async, entao consultas de views async tambem sao contadas.
+_request_metrics = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+
+    def __init__(self, capture_sql=False):
+        self.queries = QueryTimer(capture_sql=capture_sql)
+        self.serializer_seconds = 0.0
+
+
+@contextmanager
+def request_metrics(capture_sql=False):
+    metrics = RequestMetrics(capture_sql=capture_sql)
+    token = _request_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _request_metrics.reset(token)
+
+
+def _route_query(execute, sql, params, many, context):
+    metrics = _request_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.queries(execute, sql, params, many, context)
+
+
+# Conexoes sao locais a cada thread, e as views async consultam o banco em threads
+# do sync_to_async; por isso o wrapper fica fixo em toda conexao criada (signal
+# connection_created) e encaminha para as metricas do contexto atual.
+def install_query_router(sender, connection, **kwargs):
+    if _route_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_route_query)
+
+
+# As views envolvem is_valid() e .data com serializer_timer(); fora de uma
+# requisicao instrumentada nao faz nada.
+@contextmanager
+def serializer_timer():
+    metrics = _request_metrics.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.serializer_seconds += time.perf_counter() - started
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield bound, cumulative
+
+
+def _labels(labels, **extra):
+    pairs = {**dict(labels), **extra}
+    return ','.join(f'{key}="{value}"' for key, value in pairs.items())
+
+
+# Metricas em memoria do processo: com varios workers (gunicorn/uvicorn) cada um
+# expoe as proprias series e o Prometheus agrega por instancia.
+class MetricsRegistry:
+
+    HISTOGRAMS = {
+        'app_request_duration_seconds': ('Latencia total da requisicao', LATENCY_BUCKETS),
+        'app_request_sql_seconds': ('Tempo gasto em SQL por requisicao', LATENCY_BUCKETS),
+        'app_request_sql_queries': ('Consultas SQL por requisicao', QUERY_BUCKETS),
+        'app_request_lock_seconds': ('Tempo em SELECT FOR UPDATE e UPDATEs de saldo por requisicao', LATENCY_BUCKETS),
+        'app_request_serializer_seconds': ('Tempo de serializacao por requisicao', LATENCY_BUCKETS),
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {name: {} for name in self.HISTOGRAMS}
+        self.requests = Counter()
+
+    def observe(self, view, method, status_code, latency, metrics):
+        labels = (('view', view), ('method', method))
+        values = {
+            'app_request_duration_seconds': latency,
+            'app_request_sql_seconds': metrics.queries.seconds,
+            'app_request_sql_queries': metrics.queries.count,
+            'app_request_lock_seconds': metrics.queries.lock_seconds,
+            'app_request_serializer_seconds': metrics.serializer_seconds,
+        }
+
+        with self.lock:
+            self.requests[labels + (('status', status_code),)] += 1
+            for name, value in values.items():
+                series = self.histograms[name]
+                if labels not in series:
+                    series[labels] = Histogram(self.HISTOGRAMS[name][1])
+                series[labels].observe(value)
+
+    def render(self):
+        lines = ['# HELP app_requests_total Requisicoes por view, metodo e status', '# TYPE app_requests_total counter']
+
+        with self.lock:
+            for labels, count in sorted(self.requests.items()):
+                lines.append(f'app_requests_total{{{_labels(labels)}}} {count}')
+
+            for name, series in self.histograms.items():
+                lines.append(f'# HELP {name} {self.HISTOGRAMS[name][0]}')
+                lines.append(f'# TYPE {name} histogram')
+                for labels, histogram in sorted(series.items()):
+                    for bound, cumulative in histogram.samples():
+                        lines.append(f'{name}_bucket{{{_labels(labels, le=bound)}}} {cumulative}')
+                    lines.append(f'{name}_sum{{{_labels(labels)}}} {histogram.sum:.6f}')
+                    lines.append(f'{name}_count{{{_labels(labels)}}} {histogram.count}')
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+# Gauges calculados na hora da coleta: (nome, descricao, valor)
+def render_gauges(gauges):
+    lines = []
+    for name, description, value in gauges:
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} gauge', f'{name} {value:g}']
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,265 @@
+import hashlib
+import heapq
+from decimal import Decimal
+from itertools import groupby
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q, Max
+
+from .archive import archived_rows, segments_since
+from .ledger import signed_value, ledger_values, ID, ACCOUNT, TYPE, VALUE, BALANCE_AFTER, CREATED_AT, RELATED_ACCOUNT
+from .models import Account, Transaction, LedgerCheckpoint
+
+
+# Todos os campos gravados (ledger.LEDGER_FIELDS) entram no hash de cada transacao.
+# A cadeia de uma conta segue a ordem (created_at, id), a mesma do indice
+# transaction_account_created.
+
+GENESIS = bytes(32)
+# Acima disso, contas ainda sem checkpoint fazem a faixa ser lida inteira
+MAX_UNSEALED_FILTER = 1000
+
+
+# str() de cada campo (None vira 'None'): deterministico para os tipos que o ORM
+# devolve (int, str, Decimal com 2 casas, datetime em UTC) e feito todo em C.
+def chain(previous, row):
+    payload = '|'.join(map(str, row[:RELATED_ACCOUNT]))
+    return hashlib.sha256(previous + payload.encode()).digest()
+
+
+class ChainState:
+    __slots__ = ('digest', 'count', 'balance', 'position')
+
+    def __init__(self, digest=GENESIS, count=0, balance=Decimal("0.00"), position=None):
+        self.digest = digest
+        self.count = count
+        self.balance = balance
+        self.position = position
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint):
+        position = None
+        if checkpoint.last_transaction_id:
+            position = (checkpoint.last_created_at, checkpoint.last_transaction_id)
+        return cls(bytes.fromhex(checkpoint.chain_hash), checkpoint.entry_count, checkpoint.balance, position)
+
+    def copy(self):
+        return ChainState(self.digest, self.count, self.balance, self.position)
+
+    def matches(self, checkpoint):
+        return (
+            self.digest.hex() == checkpoint.chain_hash
+            and self.count == checkpoint.entry_count
+            and self.balance == checkpoint.balance
+        )
+
+    def to_checkpoint(self, account_id, sealed_until):
+        return LedgerCheckpoint(
+            account_id=account_id,
+            last_transaction_id=self.position[1] if self.position else 0,
+            last_created_at=self.position[0] if self.position else None,
+            sealed_until=sealed_until,
+            entry_count=self.count,
+            balance=self.balance,
+            chain_hash=self.digest.hex()
+        )
+
+
+# Faixas [primeiro, ultimo] de ids de conta com ate `size` contas cada: a unidade
+# de trabalho dos comandos que percorrem o ledger em paralelo.
+def account_ranges(size):
+    ids = Account.objects.order_by('id').values_list('id', flat=True)
+    current = []
+    for account_id in ids.iterator(chunk_size=10000):
+        current.append(account_id)
+        if len(current) >= size:
+            yield current[0], current[-1]
+            current = []
+    if current:
+        yield current[0], current[-1]
+
+
+def _ledger_rows(first_id, last_id, since=None, unsealed=()):
+    transactions = Transaction.objects.filter(account_id__gte=first_id, account_id__lte=last_id)
+
+    if since is not None:
+        condition = Q(created_at__gte=since)
+        if unsealed:
+            condition |= Q(account_id__in=unsealed)
+        transactions = transactions.filter(condition)
+
+    hot = ledger_values(transactions.order_by('account_id', 'created_at', 'id')).iterator(
+        chunk_size=settings.LEDGER_VERIFY_CHUNK_SIZE
+    )
+    # Meses arquivados (app/archive.py) sao anteriores as linhas quentes da mesma
+    # conta: o merge por conta, estavel, os coloca antes delas.
+    archived = archived_rows(segments_since(first_id, last_id, since, unsealed))
+    return heapq.merge(archived, hot, key=lambda row: row[ACCOUNT])
+
+
+def _checkpoints(first_id, last_id, full):
+    checkpoints = LedgerCheckpoint.objects.filter(account_id__gte=first_id, account_id__lte=last_id)
+
+    if not full:
+        latest = checkpoints.values('account_id').annotate(latest=Max('id')).values('latest')
+        checkpoints = LedgerCheckpoint.objects.filter(id__in=latest)
+
+    grouped = {}
+    for checkpoint in checkpoints.order_by('account_id', 'entry_count', 'id'):
+        grouped.setdefault(checkpoint.account_id, []).append(checkpoint)
+    return grouped
+
+
+# Reexecuta o ledger de uma conta: encadeia os hashes, soma os valores com sinal
+# (ledger.signed_value), confere balance_after linha a linha e, na auditoria
+# completa, cada checkpoint gravado no caminho.
+class AccountAudit:
+
+    def __init__(self, account_id, actual_balance, check_balance_after, checkpoints, full, cutoff):
+        self.account_id = account_id
+        self.actual_balance = actual_balance
+        self.check_balance_after = check_balance_after
+        self.cutoff = cutoff
+        self.issues = []
+        self.last_checkpoint = checkpoints[-1] if checkpoints else None
+
+        if full or not checkpoints:
+            self.state = ChainState()
+            self.pending = list(checkpoints) if full else []
+            self._match_pending(None)
+        else:
+            self.state = ChainState.from_checkpoint(self.last_checkpoint)
+            self.pending = []
+
+        self.sealable = self.state.copy()
+
+    def issue(self, kind, **details):
+        self.issues.append({'account_id': self.account_id, 'issue': kind, **details})
+
+    def _match_pending(self, transaction_id):
+        while self.pending and (self.pending[0].last_transaction_id or None) == transaction_id:
+            checkpoint = self.pending.pop(0)
+            if not self.state.matches(checkpoint):
+                self.issue('checkpoint', checkpoint_id=checkpoint.id, transaction_id=transaction_id)
+
+    # Checkpoint cuja ultima transacao ficou para tras sem aparecer: foi removida
+    # ou teve created_at alterado.
+    def _skip_missing(self, position):
+        while self.pending and self.pending[0].last_transaction_id and (
+            (self.pending[0].last_created_at, self.pending[0].last_transaction_id) < position
+        ):
+            checkpoint = self.pending.pop(0)
+            self.issue('checkpoint', checkpoint_id=checkpoint.id, transaction_id=checkpoint.last_transaction_id,
+                       detail='transacao selada ausente')
+
+    def feed(self, row):
+        state = self.state
+        position = (row[CREATED_AT], row[ID])
+
+        # Incremental: a faixa e lida a partir do menor horizonte selado; o que ja
+        # esta na cadeia desta conta e pulado.
+        if state.position is not None and position <= state.position:
+            return
+
+        if self.pending:
+            self._skip_missing(position)
+
+        state.digest = chain(state.digest, row)
+        state.count += 1
+        state.balance += signed_value(row[TYPE], row[VALUE], row[ACCOUNT], row[RELATED_ACCOUNT])
+        state.position = position
+
+        if self.check_balance_after and row[BALANCE_AFTER] != state.balance:
+            if not any(issue['issue'] == 'balance_after' for issue in self.issues):
+                self.issue(
+                    'balance_after', transaction_id=row[ID],
+                    expected=str(state.balance), recorded=str(row[BALANCE_AFTER])
+                )
+
+        if self.pending:
+            self._match_pending(row[ID])
+
+        if row[CREATED_AT] < self.cutoff:
+            self.sealable = state.copy()
+
+    def finish(self):
+        for checkpoint in self.pending:
+            self.issue('checkpoint', checkpoint_id=checkpoint.id, transaction_id=checkpoint.last_transaction_id,
+                       detail='transacao selada ausente')
+
+        if self.actual_balance != self.state.balance:
+            self.issue(
+                'drift', balance=str(self.actual_balance), ledger=str(self.state.balance),
+                drift=str(self.actual_balance - self.state.balance)
+            )
+
+    # Novo checkpoint quando ha transacoes novas antes do corte; sem novidades, so
+    # o horizonte do ultimo avanca (para a proxima leitura incremental comecar dali).
+    def seal(self, sealed, advanced):
+        if self.issues:
+            return
+        last = self.last_checkpoint
+        if last is None or last.entry_count != self.sealable.count:
+            sealed.append(self.sealable.to_checkpoint(self.account_id, self.cutoff))
+        elif last.sealed_until < self.cutoff:
+            advanced.append(last.pk)
+
+
+# Verifica as contas com id em [first_id, last_id]. Roda em um processo do pool
+# de verify_ledger (ou direto, com um worker). A leitura acontece em uma unica
+# transacao para que saldos e transacoes venham do mesmo instante; os checkpoints
+# novos sao gravados depois.
+def verify_range(first_id, last_id, cutoff, full=False, seal=False):
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+
+        checkpoints = _checkpoints(first_id, last_id, full)
+        audits = {}
+        accounts = Account.objects.filter(id__gte=first_id, id__lte=last_id).with_balance().values_list(
+            'id', 'balance', 'sharded_balance', 'shard_count'
+        )
+        for account_id, balance, sharded, shard_count in accounts:
+            # Em contas com sub-saldos o balance_after e o total lido apos a escrita e
+            # pode incluir creditos concorrentes: so o saldo final e comparado.
+            audits[account_id] = AccountAudit(
+                account_id, balance + sharded, not shard_count, checkpoints.get(account_id, []), full, cutoff
+            )
+
+        since = None
+        unsealed = []
+        if not full:
+            unsealed = [account_id for account_id, audit in audits.items() if audit.last_checkpoint is None]
+            horizons = [audit.last_checkpoint.sealed_until for audit in audits.values() if audit.last_checkpoint]
+            if horizons and len(unsealed) <= MAX_UNSEALED_FILTER:
+                since = min(horizons)
+
+        entries = 0
+        for account_id, rows in groupby(_ledger_rows(first_id, last_id, since, unsealed), key=lambda row: row[ACCOUNT]):
+            audit = audits.get(account_id)
+            if audit is None:
+                continue
+            for row in rows:
+                audit.feed(row)
+                entries += 1
+
+        issues = []
+        sealed = []
+        advanced = []
+        for audit in audits.values():
+            audit.finish()
+            issues.extend(audit.issues)
+            if seal:
+                audit.seal(sealed, advanced)
+
+    LedgerCheckpoint.objects.bulk_create(sealed, ignore_conflicts=True)
+    LedgerCheckpoint.objects.filter(pk__in=advanced).update(sealed_until=cutoff)
+
+    return {
+        'accounts': len(audits),
+        'entries': entries,
+        'sealed': len(sealed),
+        'issues': issues,
+    }
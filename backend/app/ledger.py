@@ -0,0 +1,88 @@
+from decimal import Decimal
+
+from django.db.models import F, Q, Case, When, DecimalField
+from django.utils import timezone
+
+from .models import Transaction, DailyBalanceSnapshot
+
+
+CREDIT_TYPES = {Transaction.Type.DEPÓSITO, Transaction.Type.RECEBIMENTO}
+
+# Linha completa do ledger, lida por ledger_values(): os campos gravados da
+# transacao mais a conta da transacao relacionada (que define o sinal dos
+# estornos). E a linha encadeada por app/integrity.py e guardada por app/archive.py.
+LEDGER_FIELDS = (
+    'id', 'account_id', 'type', 'value', 'balance_after', 'created_at', 'description',
+    'origin_account_id', 'destination_account_id', 'related_transaction_id'
+)
+ID, ACCOUNT, TYPE, VALUE, BALANCE_AFTER, CREATED_AT, DESCRIPTION, ORIGIN, DESTINATION, RELATED = range(len(LEDGER_FIELDS))
+RELATED_ACCOUNT = len(LEDGER_FIELDS)
+
+
+# Estornos tem o mesmo tipo nas duas pontas: e credito para a conta que fez o
+# envio original (related_transaction.account) e debito para quem recebeu.
+def signed_value(transaction_type, value, account_id, related_account_id=None):
+    if transaction_type in CREDIT_TYPES:
+        return value
+
+    if transaction_type == Transaction.Type.ENVIO:
+        return -value
+
+    return value if account_id == related_account_id else -value
+
+
+# signed_value em SQL, para somar ou ler o valor com sinal direto do banco
+def credit_condition():
+    return Q(type__in=CREDIT_TYPES) | Q(
+        type=Transaction.Type.ESTORNO, related_transaction__account_id=F('account_id')
+    )
+
+
+def signed_value_expression():
+    return Case(
+        When(credit_condition(), then=F('value')),
+        default=-F('value'),
+        output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
+
+
+def ledger_values(transactions):
+    return transactions.values_list(*LEDGER_FIELDS, 'related_transaction__account_id')
+
+
+def ledger_rows(transactions):
+    return transactions.order_by('account_id', 'created_at', 'id').values(
+        'account_id', 'type', 'value', 'balance_after', 'created_at'
+    ).annotate(related_account_id=F('related_transaction__account_id'))
+
+
+# Recebe linhas de ledger_rows() e produz um snapshot por conta/dia, em ordem.
+def build_daily_snapshots(rows):
+    current = None
+
+    for row in rows:
+        delta = signed_value(row['type'], row['value'], row['account_id'], row['related_account_id'])
+        day = timezone.localdate(row['created_at'])
+
+        if current is None or current.account_id != row['account_id'] or current.date != day:
+            if current is not None:
+                yield current
+            current = DailyBalanceSnapshot(
+                account_id=row['account_id'],
+                date=day,
+                opening_balance=row['balance_after'] - delta,
+                closing_balance=row['balance_after'],
+                credits=Decimal("0.00"),
+                debits=Decimal("0.00"),
+                transaction_count=0
+            )
+
+        current.closing_balance = row['balance_after']
+        current.transaction_count += 1
+        if delta > 0:
+            current.credits += delta
+        else:
+            current.debits -= delta
+
+    if current is not None:
+        yield current
@@ -0,0 +1,53 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Min
+from app.archive import archive_horizon, archive_range, add_months, month_of
+from app.integrity import account_ranges
+from app.models import Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        'Move para o arquivo morto (TransactionArchive) os meses encerrados ha mais de '
+        'TRANSACTION_HOT_MONTHS: um segmento compactado por conta e mes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, help='Limite de meses arquivados por execucao, a partir do mais antigo')
+        parser.add_argument('--accounts-per-task', type=int, default=1000)
+        parser.add_argument('--batch-size', type=int, help='Segmentos por bulk_create (padrao: ARCHIVE_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        end = archive_horizon()
+        oldest = Transaction.objects.aggregate(oldest=Min('created_at'))['oldest']
+
+        if oldest is None or month_of(oldest) >= end:
+            self.stdout.write(f"Nada a arquivar antes de {end:%m/%Y} (TRANSACTION_HOT_MONTHS={settings.TRANSACTION_HOT_MONTHS})")
+            return
+
+        if options['months']:
+            end = min(end, add_months(month_of(oldest), options['months']))
+
+        totals = {'segments': 0, 'entries': 0, 'bytes': 0, 'retained': 0}
+        started = time.perf_counter()
+
+        # Uma transacao so: uma linha removida de uma faixa pode ser referenciada por
+        # outra de uma faixa seguinte (a FK e conferida no commit).
+        with transaction.atomic():
+            for first_id, last_id in account_ranges(options['accounts_per_task']):
+                result = archive_range(first_id, last_id, end, options['batch_size'])
+                for key in totals:
+                    totals[key] += result[key]
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{totals['entries']} transacao(oes) de {month_of(oldest):%m/%Y} ate {add_months(end, -1):%m/%Y} em "
+            f"{totals['segments']} segmento(s), {totals['bytes'] / 1024:.0f} KiB compactados, em {elapsed:.1f}s"
+        )
+        if totals['retained']:
+            self.stdout.write(f"{totals['retained']} transacao(oes) arquivada(s) mantida(s) na tabela por referencias de transacoes recentes")
+
+        self.stdout.write(self.style.SUCCESS("✓ Arquivamento concluido"))
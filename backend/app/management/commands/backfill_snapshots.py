@@ -0,0 +1,58 @@
+import heapq
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from app.archive import archived_rows
+from app.models import Transaction, TransactionArchive, DailyBalanceSnapshot
+from app.ledger import ledger_rows, build_daily_snapshots, ACCOUNT, TYPE, VALUE, BALANCE_AFTER, CREATED_AT, RELATED_ACCOUNT
+
+
+class Command(BaseCommand):
+    help = 'Reconstroi os snapshots diarios de saldo a partir do historico de transacoes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', type=int, help='Reconstroi apenas a conta informada')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        transactions = Transaction.objects.all()
+        archives = TransactionArchive.objects.all()
+        snapshots = DailyBalanceSnapshot.objects.all()
+
+        if kwargs['account']:
+            transactions = transactions.filter(account_id=kwargs['account'])
+            archives = archives.filter(account_id=kwargs['account'])
+            snapshots = snapshots.filter(account_id=kwargs['account'])
+
+        started = time.monotonic()
+        total = 0
+
+        with transaction.atomic():
+            snapshots.delete()
+
+            rows = ledger_rows(transactions).iterator(chunk_size=batch_size)
+            # Meses arquivados da conta vem antes das linhas da tabela quente
+            archived = (
+                {
+                    'account_id': row[ACCOUNT], 'type': row[TYPE], 'value': row[VALUE],
+                    'balance_after': row[BALANCE_AFTER], 'created_at': row[CREATED_AT],
+                    'related_account_id': row[RELATED_ACCOUNT],
+                }
+                for row in archived_rows(archives)
+            )
+            rows = heapq.merge(archived, rows, key=lambda row: row['account_id'])
+            pending = build_daily_snapshots(rows)
+
+            while True:
+                batch = list(islice(pending, batch_size))
+                if not batch:
+                    break
+                DailyBalanceSnapshot.objects.bulk_create(batch, batch_size=batch_size)
+                total += len(batch)
+                self.stdout.write(f"  {total} snapshots gravados")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"--- {total} snapshots reconstruidos em {elapsed:.1f}s ---"))
@@ -0,0 +1,203 @@
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from app.bench import benchmark_database, create_accounts, seed_ledger, access_token_for, percentile
+from app.models import User
+
+
+ENDPOINTS = {
+    'balance': ('/api/account/balance/', '/api/async/account/balance/'),
+    'statement': ('/api/account/statement/?page_size=50', '/api/async/account/statement/?page_size=50'),
+    'admin_users': ('/api/admin/users/', '/api/async/admin/users/'),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f"Servidor encerrou ao iniciar (codigo {process.returncode})")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f"Servidor nao respondeu na porta {port}")
+
+
+async def fetch(port, path, token):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write((
+            f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+            f"Authorization: Bearer {token}\r\nConnection: close\r\n\r\n"
+        ).encode())
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+
+    status_line = response.split(b'\r\n', 1)[0].split()
+    return int(status_line[1]) if len(status_line) > 1 else None
+
+
+# Cada "conexao" e uma corrotina que repete requisicoes ate o total ser atingido;
+# a concorrencia e o numero de conexoes abertas ao mesmo tempo contra o servidor.
+async def load(port, path, tokens, total, concurrency, timeout):
+    samples = []
+    counter = iter(range(total))
+
+    async def connection_loop():
+        for index in counter:
+            started = time.perf_counter()
+            try:
+                status_code = await asyncio.wait_for(fetch(port, path, tokens[index % len(tokens)]), timeout)
+            except (OSError, asyncio.TimeoutError):
+                status_code = None
+            samples.append((time.perf_counter() - started, status_code is not None and status_code < 400))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(connection_loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, _ in samples]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, ok in samples if not ok),
+        'throughput_rps': round(len(samples) / elapsed, 2),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99': round(percentile(latencies, 0.99) * 1000, 3),
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compara capacidade de conexoes concorrentes: WSGI (views sync) contra uvicorn/ASGI (views sync e async)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--transactions', type=int, default=20000, help='Transacoes pre-existentes no ledger')
+        parser.add_argument('--requests', type=int, default=1000, help='Requisicoes por rota e nivel de concorrencia')
+        parser.add_argument('--concurrency', default='10,50,200', help='Niveis de conexoes simultaneas')
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+        parser.add_argument('--threads', type=int, default=8, help='Threads do gunicorn no modo WSGI')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Timeout por requisicao (segundos)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Arquivo JSON com os resultados')
+
+    def server_command(self, mode, port, threads):
+        if mode == 'asgi':
+            return [
+                sys.executable, '-m', 'uvicorn', 'core.asgi:application',
+                '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning', '--no-access-log'
+            ]
+        # gunicorn quando instalado; senao o runserver (WSGI com uma thread por requisicao).
+        if importlib.util.find_spec('gunicorn'):
+            return [
+                sys.executable, '-m', 'gunicorn', 'core.wsgi:application', '--bind', f'127.0.0.1:{port}',
+                '--workers', '1', '--threads', str(threads), '--log-level', 'warning'
+            ]
+        return [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload']
+
+    def server_env(self):
+        env = dict(os.environ)
+        # O servidor e um processo separado: aponta-o para o banco de benchmark criado aqui.
+        if connection.vendor == 'sqlite':
+            env['SQLITE_PATH'] = str(connection.settings_dict['NAME'])
+        else:
+            env['POSTGRES_DB'] = connection.settings_dict['NAME']
+        return env
+
+    def run_target(self, mode, path, tokens, options, levels):
+        port = free_port()
+        process = subprocess.Popen(
+            self.server_command(mode, port, options['threads']), cwd=settings.BASE_DIR, env=self.server_env(),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_for_port(port, process)
+            asyncio.run(load(port, path, tokens, 20, 4, options['timeout']))  # aquecimento
+            return {
+                str(level): asyncio.run(load(port, path, tokens, options['requests'], level, options['timeout']))
+                for level in levels
+            }
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def handle(self, *args, **options):
+        if not importlib.util.find_spec('uvicorn'):
+            raise CommandError("uvicorn nao esta instalado (pip install uvicorn)")
+
+        endpoints = options['endpoints'].split(',')
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Rotas desconhecidas: {', '.join(sorted(unknown))}")
+        levels = [int(level) for level in options['concurrency'].split(',')]
+
+        results = {
+            'meta': {
+                'database': connection.vendor,
+                'users': options['users'],
+                'transactions': options['transactions'],
+                'requests': options['requests'],
+                'wsgi_server': 'gunicorn' if importlib.util.find_spec('gunicorn') else 'runserver',
+            },
+            'endpoints': {},
+        }
+
+        with benchmark_database(on_disk=True):
+            self.stdout.write("Populando banco de benchmark...")
+            accounts = create_accounts(options['users'], prefix='bench')
+            admin = create_accounts(1, prefix='admin', offset=options['users'])[0].user
+            User.objects.filter(pk=admin.pk).update(role=User.Role.ADMIN)
+            admin.role = User.Role.ADMIN
+            seed_ledger(accounts, options['transactions'], random.Random(options['seed']))
+
+            user_tokens = [access_token_for(account.user) for account in accounts]
+            admin_tokens = [access_token_for(admin)]
+
+            for name in endpoints:
+                sync_path, async_path = ENDPOINTS[name]
+                tokens = admin_tokens if name.startswith('admin') else user_tokens
+                targets = [('wsgi', 'sync', sync_path), ('asgi', 'sync', sync_path), ('asgi', 'async', async_path)]
+                results['endpoints'][name] = {}
+
+                for mode, kind, path in targets:
+                    label = f'{mode}+{kind}'
+                    self.stdout.write(f"{name} / {label}...")
+                    runs = self.run_target(mode, path, tokens, options, levels)
+                    results['endpoints'][name][label] = runs
+
+                    for level, result in runs.items():
+                        self.stdout.write(
+                            f"  {level:>4} conexoes {result['throughput_rps']:>8.1f} req/s  "
+                            f"p50 {result['latency_ms']['p50']:>8.2f}ms  p95 {result['latency_ms']['p95']:>8.2f}ms  "
+                            f"p99 {result['latency_ms']['p99']:>8.2f}ms  erros {result['errors']}"
+                        )
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados gravados em {options['output']}"))
@@ -0,0 +1,40 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from app.bench import benchmark_database, create_accounts, measure
+from app.services import TransferService
+
+
+class Command(BaseCommand):
+    help = 'Compara N chamadas de TransferService.execute_transfer com um unico execute_batch de N itens'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1000, help='Quantidade de transferencias (uma por destinatario)')
+
+    def handle(self, *args, **kwargs):
+        size = kwargs['size']
+        value = Decimal("1.00")
+
+        with benchmark_database():
+            single_origin, batch_origin = create_accounts(2, balance=Decimal(size) * 2, prefix='origem')
+            destinations = create_accounts(size, prefix='destino', offset=2)
+
+            with measure() as single:
+                for destination in destinations:
+                    TransferService.execute_transfer(single_origin, destination, value, 'bench')
+
+            items = [
+                {'destination_account': destination, 'value': value, 'description': 'bench'}
+                for destination in destinations
+            ]
+            with measure() as batch:
+                TransferService.execute_batch(batch_origin, items)
+
+        for label, result in (('Chamadas individuais', single), ('Lote unico', batch)):
+            self.stdout.write(
+                f"{label}: {result['seconds']:.3f}s, "
+                f"{size / result['seconds']:.0f} transferencias/s, "
+                f"{result['queries']} consultas"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Ganho do lote: {single['seconds'] / batch['seconds']:.1f}x"))
@@ -0,0 +1,100 @@
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import resolve
+from django.utils.module_loading import import_string
+from rest_framework.test import APIRequestFactory
+from app.bench import benchmark_database, create_accounts
+from app.models import User
+
+PASSWORD = 'bench-senha-forte'
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede o custo de cada hasher de senha: milissegundos por hash e logins/s (total e por nucleo) '
+        'pelo endpoint de login, com o pool de hashing configurado. Confere o rehash de senhas antigas no login'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hashers', default='pbkdf2_sha256,scrypt,argon2', help='Algoritmos a comparar')
+        parser.add_argument('--threads', type=int, default=os.cpu_count() * 2, help='Requisicoes de login concorrentes')
+        parser.add_argument('--logins', type=int, default=40, help='Logins por hasher')
+        parser.add_argument('--samples', type=int, default=5, help='Hashes medidos por hasher')
+
+    def hasher_path(self, algorithm):
+        for path in settings.PASSWORD_HASHERS:
+            if import_string(path).algorithm == algorithm:
+                return path
+        raise CommandError(f"Hasher {algorithm} nao esta em PASSWORD_HASHERS.")
+
+    def login(self, view, email):
+        request = APIRequestFactory().post('/api/auth/login/', {'email': email, 'password': PASSWORD}, format='json')
+        try:
+            return view(request).status_code
+        finally:
+            connection.close()
+
+    def run(self, algorithm, threads, logins, samples):
+        path = self.hasher_path(algorithm)
+        hashers = [path, *[other for other in settings.PASSWORD_HASHERS if other != path]]
+
+        with override_settings(PASSWORD_HASHERS=hashers):
+            hasher = get_hasher()
+            timings = []
+            for _ in range(samples):
+                started = time.perf_counter()
+                hasher.encode(PASSWORD, hasher.salt())
+                timings.append(time.perf_counter() - started)
+
+            with benchmark_database(on_disk=True):
+                accounts = create_accounts(logins, prefix=algorithm)
+                users = User.objects.filter(account__in=accounts)
+                users.update(password=make_password(PASSWORD))
+                emails = list(users.values_list('email', flat=True))
+                view = resolve('/api/auth/login/').func
+
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=threads) as pool:
+                    statuses = list(pool.map(lambda email: self.login(view, email), emails))
+                elapsed = time.perf_counter() - started
+
+                # Senhas de outro hasher: o primeiro login refaz o hash sem revogar tokens
+                legacy = next(other for other in hashers if other != path)
+                users.update(password=make_password(PASSWORD, hasher=import_string(legacy).algorithm))
+                rehash_status = self.login(view, emails[0])
+                rehashed = User.objects.filter(email=emails[0]).values_list('password', 'token_version').get()
+
+        failed = sum(1 for code in statuses if code != 200)
+        if failed or rehash_status != 200:
+            raise CommandError(f"{algorithm}: {failed} login(s) falharam (status {sorted(set(statuses))}).")
+        if not rehashed[0].startswith(f'{algorithm}$') or rehashed[1] != 0:
+            raise CommandError(f"{algorithm}: senha antiga nao foi refeita no login ({rehashed[0][:20]}...).")
+
+        cores = min(threads, os.cpu_count(), settings.PASSWORD_HASHING_WORKERS or threads)
+        rate = logins / elapsed
+        self.stdout.write(
+            f"{algorithm:>14}: {statistics.median(timings) * 1000:6.1f} ms/hash, "
+            f"{rate:6.1f} logins/s com {threads} thread(s) ({rate / cores:.1f} por nucleo, {cores} nucleo(s)), "
+            f"rehash de {import_string(legacy).algorithm} no login ok"
+        )
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write(
+            f"Pool de hashing: {settings.PASSWORD_HASHING_WORKERS or 'desligado'} worker(s), "
+            f"fila {settings.PASSWORD_HASHING_QUEUE}, {os.cpu_count()} nucleo(s)"
+        )
+
+        for algorithm in kwargs['hashers'].split(','):
+            try:
+                self.run(algorithm, kwargs['threads'], kwargs['logins'], kwargs['samples'])
+            except ValueError as exc:
+                # argon2 sem o argon2-cffi instalado
+                self.stdout.write(self.style.WARNING(f"{algorithm:>14}: ignorado ({exc})"))
@@ -0,0 +1,71 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, OperationalError
+from app.bench import benchmark_database, create_accounts
+from app.models import Account
+from app.services import TransferService
+
+
+class Command(BaseCommand):
+    help = 'Mede transferencias/s de muitos remetentes para uma unica conta, variando a quantidade de sub-saldos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shards', default='0,4,16', help='Quantidades de sub-saldos a comparar')
+        parser.add_argument('--senders', type=int, default=8, help='Remetentes concorrentes (uma thread cada)')
+        parser.add_argument('--transfers', type=int, default=100, help='Transferencias por remetente')
+
+    def send(self, origin, receiver, transfers):
+        retries = 0
+        try:
+            for _ in range(transfers):
+                while True:
+                    try:
+                        TransferService.execute_transfer(origin, receiver, Decimal("1.00"), 'bench')
+                        break
+                    except OperationalError:
+                        retries += 1
+                        time.sleep(0.001)
+        finally:
+            connection.close()
+        return retries
+
+    def run(self, shards, senders, transfers):
+        with benchmark_database(on_disk=True):
+            receiver = create_accounts(1, prefix='recebedor')[0]
+            origins = create_accounts(senders, balance=Decimal(transfers), prefix='remetente', offset=1)
+            call_command('shard_account', receiver.id, shards=shards, stdout=StringIO())
+            receiver.refresh_from_db()
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=senders) as pool:
+                retries = sum(pool.map(lambda origin: self.send(origin, receiver, transfers), origins))
+            elapsed = time.perf_counter() - started
+
+            total = Account.objects.with_balance().get(pk=receiver.pk).total_balance
+
+        expected = Decimal(senders * transfers)
+        if total != expected:
+            raise CommandError(f"Saldo final {total} diferente do esperado {expected}.")
+
+        return elapsed, retries
+
+    def handle(self, *args, **kwargs):
+        senders = kwargs['senders']
+        transfers = kwargs['transfers']
+
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                "SQLite serializa todas as escritas no arquivo; a escala com sub-saldos so aparece no PostgreSQL."
+            ))
+
+        for shards in [int(value) for value in kwargs['shards'].split(',')]:
+            elapsed, retries = self.run(shards, senders, transfers)
+            self.stdout.write(
+                f"{shards:>3} sub-saldo(s): {senders * transfers / elapsed:.0f} transferencias/s "
+                f"({elapsed:.2f}s, {retries} retentativas)"
+            )
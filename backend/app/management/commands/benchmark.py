@@ -0,0 +1,196 @@
+import json
+import platform
+import queue
+import random
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from app.bench import benchmark_database, create_accounts, seed_ledger, access_token_for, percentile
+from app.instrumentation import QueryTimer
+from app.models import User
+
+
+SCENARIOS = ['deposit', 'transfer', 'statement', 'admin_users', 'reverse']
+
+
+def client_for(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {access_token_for(user)}')
+    return client
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Benchmark das rotas financeiras: latencia p50/p95/p99, vazao, consultas e tempo em lock, com saida JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--transactions', type=int, default=20000, help='Transacoes pre-existentes no ledger')
+        parser.add_argument('--requests', type=int, default=300, help='Requisicoes por cenario')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Arquivo JSON com os resultados')
+        parser.add_argument('--compare', help='JSON de uma execucao anterior para comparar')
+
+    def build_scenarios(self, users, admin, sent_ids, rng):
+        clients = {user.id: client_for(user) for user in users}
+        admin_client = client_for(admin)
+        reversible = queue.SimpleQueue()
+        for transfer_id in rng.sample(sent_ids, len(sent_ids)):
+            reversible.put(transfer_id)
+
+        def deposit(index):
+            user = users[index % len(users)]
+            return clients[user.id].post('/api/account/deposit/', {'value': '10.00'}, format='json')
+
+        def transfer(index):
+            origin = users[index % len(users)]
+            destination = users[(index * 7 + 1) % len(users)]
+            if destination.id == origin.id:
+                destination = users[(index + 1) % len(users)]
+            return clients[origin.id].post(
+                '/api/account/transfer/', {'identifier': destination.email, 'value': '1.00'}, format='json'
+            )
+
+        def statement(index):
+            user = users[index % len(users)]
+            return clients[user.id].get('/api/account/statement/', {'page_size': 100})
+
+        def admin_users(index):
+            return admin_client.get('/api/admin/users/')
+
+        def reverse(index):
+            return admin_client.post(f'/api/admin/reverse/{reversible.get_nowait()}')
+
+        return {
+            'deposit': deposit,
+            'transfer': transfer,
+            'statement': statement,
+            'admin_users': admin_users,
+            'reverse': reverse,
+        }
+
+    def worker(self, request, worker_id, total, concurrency):
+        samples = []
+        timer = QueryTimer()
+
+        try:
+            with connection.execute_wrapper(timer):
+                for index in range(worker_id, total, concurrency):
+                    count, seconds, lock_seconds = timer.snapshot()
+                    started = time.perf_counter()
+                    try:
+                        status_code = request(index).status_code
+                    except queue.Empty:
+                        status_code = None
+                    samples.append({
+                        'latency': time.perf_counter() - started,
+                        'ok': status_code is not None and status_code < 400,
+                        'queries': timer.count - count,
+                        'sql': timer.seconds - seconds,
+                        'lock': timer.lock_seconds - lock_seconds,
+                    })
+        finally:
+            connection.close()
+
+        return samples
+
+    def run_scenario(self, request, total, concurrency):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(self.worker, request, worker_id, total, concurrency) for worker_id in range(concurrency)]
+            samples = [sample for future in futures for sample in future.result()]
+        elapsed = time.perf_counter() - started
+
+        latencies = [sample['latency'] for sample in samples]
+        count = len(samples) or 1
+
+        return {
+            'requests': len(samples),
+            'errors': sum(1 for sample in samples if not sample['ok']),
+            'throughput_rps': round(len(samples) / elapsed, 2),
+            'latency_ms': {
+                'p50': round(percentile(latencies, 0.50) * 1000, 3),
+                'p95': round(percentile(latencies, 0.95) * 1000, 3),
+                'p99': round(percentile(latencies, 0.99) * 1000, 3),
+            },
+            'queries_per_request': round(sum(sample['queries'] for sample in samples) / count, 2),
+            'sql_ms_per_request': round(sum(sample['sql'] for sample in samples) / count * 1000, 3),
+            'lock_ms_per_request': round(sum(sample['lock'] for sample in samples) / count * 1000, 3),
+        }
+
+    def report(self, results, previous):
+        for name, result in results['scenarios'].items():
+            line = (
+                f"{name:<12} {result['throughput_rps']:>8.1f} req/s  "
+                f"p50 {result['latency_ms']['p50']:>7.2f}ms  p95 {result['latency_ms']['p95']:>7.2f}ms  "
+                f"p99 {result['latency_ms']['p99']:>7.2f}ms  {result['queries_per_request']:>5.1f} consultas  "
+                f"lock {result['lock_ms_per_request']:.2f}ms  erros {result['errors']}"
+            )
+            before = (previous or {}).get('scenarios', {}).get(name)
+            if before:
+                change = (result['latency_ms']['p95'] - before['latency_ms']['p95']) / (before['latency_ms']['p95'] or 1) * 100
+                line += f"  (p95 {change:+.1f}% vs {previous['meta'].get('commit') or 'anterior'})"
+            self.stdout.write(line)
+
+    def handle(self, *args, **options):
+        scenarios = options['scenarios'].split(',')
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Cenarios desconhecidos: {', '.join(sorted(unknown))}")
+
+        previous = None
+        if options['compare']:
+            with open(options['compare']) as handle:
+                previous = json.load(handle)
+
+        rng = random.Random(options['seed'])
+        results = {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'users': options['users'],
+                'transactions': options['transactions'],
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+            },
+            'scenarios': {},
+        }
+
+        with benchmark_database(on_disk=True), override_settings(ALLOWED_HOSTS=['*']):
+            self.stdout.write("Populando banco de benchmark...")
+            accounts = create_accounts(options['users'], prefix='bench')
+            admin = create_accounts(1, prefix='admin', offset=options['users'])[0].user
+            User.objects.filter(pk=admin.pk).update(role=User.Role.ADMIN)
+            admin.role = User.Role.ADMIN
+            sent_ids = seed_ledger(accounts, options['transactions'], rng)
+
+            requests = self.build_scenarios([account.user for account in accounts], admin, sent_ids, rng)
+            for name in scenarios:
+                results['scenarios'][name] = self.run_scenario(requests[name], options['requests'], options['concurrency'])
+
+        self.report(results, previous)
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados gravados em {options['output']}"))
@@ -0,0 +1,98 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from app.integrity import account_ranges
+from app.reconciliation import reconcile_range
+from app.services import ReconciliationService
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula o saldo de todas as contas a partir das transacoes e compara com Account.balance '
+        'e com a sequencia de balance_after. Com --fix, corrige os saldos divergentes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processos em paralelo (1 roda no proprio processo)')
+        parser.add_argument('--accounts-per-task', type=int, default=5000)
+        parser.add_argument('--chunk-size', type=int, help='Linhas por chunk (padrao: RECONCILE_CHUNK_SIZE)')
+        parser.add_argument('--no-numpy', action='store_true', help='Usa a soma acumulada em Python puro')
+        parser.add_argument('--fix', action='store_true', help='Ajusta Account.balance para a soma das transacoes')
+        parser.add_argument('--output', help='Arquivo JSON com as divergencias')
+        parser.add_argument('--show', type=int, default=20, help='Quantidade de divergencias exibidas')
+
+    def handle(self, *args, **options):
+        ranges = list(account_ranges(options['accounts_per_task']))
+        task = partial(reconcile_range, chunk_size=options['chunk_size'], use_numpy=not options['no_numpy'])
+        totals = {'accounts': 0, 'entries': 0}
+        discrepancies = []
+        engine = None
+        started = time.perf_counter()
+
+        # SQLite em memoria (banco de teste) nao e visivel para outros processos.
+        if options['workers'] <= 1 or len(ranges) <= 1 or (
+            connection.vendor == 'sqlite' and connection.is_in_memory_db()
+        ):
+            results = (task(first_id, last_id) for first_id, last_id in ranges)
+            pool = None
+        else:
+            connection.close()
+            pool = ProcessPoolExecutor(
+                max_workers=options['workers'],
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup
+            )
+            results = (future.result() for future in as_completed(
+                [pool.submit(task, first_id, last_id) for first_id, last_id in ranges]
+            ))
+
+        try:
+            for result in results:
+                totals['accounts'] += result['accounts']
+                totals['entries'] += result['entries']
+                engine = result['engine']
+                discrepancies.extend(result['discrepancies'])
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        elapsed = time.perf_counter() - started
+        drifted = [item for item in discrepancies if item['drift'] != '0.00']
+        self.stdout.write(
+            f"{totals['accounts']} conta(s), {totals['entries']} transacao(oes) em {elapsed:.1f}s "
+            f"({totals['entries'] / (elapsed or 1):.0f}/s, {engine or '-'}): "
+            f"{len(drifted)} saldo(s) divergente(s), "
+            f"{sum(item['balance_after_mismatches'] for item in discrepancies)} balance_after divergente(s)"
+        )
+
+        for item in sorted(discrepancies, key=lambda item: item['account_id'])[:options['show']]:
+            self.stdout.write(self.style.ERROR(
+                f"  conta {item['account_id']}: saldo {item['balance']}, ledger {item['ledger']}, "
+                f"diferenca {item['drift']}, balance_after divergentes {item['balance_after_mismatches']}"
+                + (f" (a partir da transacao {item['first_mismatch_transaction_id']})" if item['balance_after_mismatches'] else '')
+            ))
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump({**totals, 'seconds': round(elapsed, 3), 'discrepancies': discrepancies}, handle, indent=2)
+            self.stdout.write(f"Relatorio gravado em {options['output']}")
+
+        if options['fix'] and drifted:
+            # balance_after fica como esta: o ledger e append-only.
+            for item in drifted:
+                previous, corrected = ReconciliationService.correct_balance(item['account_id'])
+                self.stdout.write(f"  conta {item['account_id']}: {previous} -> {corrected}")
+            self.stdout.write(self.style.SUCCESS(f"✓ {len(drifted)} saldo(s) corrigido(s)"))
+            return
+
+        if discrepancies:
+            raise CommandError(f"{len(discrepancies)} conta(s) com divergencia")
+
+        self.stdout.write(self.style.SUCCESS("✓ Saldos conferem com o ledger"))
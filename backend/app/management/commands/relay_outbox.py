@@ -0,0 +1,64 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from app.outbox import get_sink, relay_batch, purge_published
+
+
+class Command(BaseCommand):
+    help = (
+        'Publica os eventos do outbox transacional no OUTBOX_SINK, em ordem e em lotes, ate ser interrompido '
+        '(ou ate esvaziar a fila, com --once)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Publica os eventos pendentes e termina')
+        parser.add_argument('--batch-size', type=int, help='Eventos por lote (padrao: OUTBOX_BATCH_SIZE)')
+        parser.add_argument('--purge', action='store_true', help='Remove antes os eventos publicados ha mais de OUTBOX_RETENTION')
+        parser.add_argument('--report-every', type=int, default=60, help='Intervalo do relatorio, em segundos')
+
+    def report(self, published, lag, elapsed):
+        rate = published / elapsed * 60 if elapsed else 0.0
+        self.stdout.write(
+            f"{published} evento(s) publicado(s) em {elapsed:.1f}s ({rate:.0f}/min); "
+            f"atraso maximo entre o commit e a publicacao: {lag:.1f}s"
+        )
+
+    def handle(self, *args, **kwargs):
+        if kwargs['purge']:
+            self.stdout.write(f"{purge_published()} evento(s) expirado(s) removido(s)")
+
+        sink = get_sink()
+        batch_size = kwargs['batch_size'] or settings.OUTBOX_BATCH_SIZE
+        published = 0
+        lag = 0.0
+        started = time.perf_counter()
+
+        try:
+            while True:
+                try:
+                    events = relay_batch(sink, batch_size)
+                except Exception as exc:
+                    # Sink fora do ar, banco ocupado: nada foi marcado como publicado e o
+                    # lote volta na proxima rodada
+                    self.stderr.write(f"Lote desfeito: {exc}")
+                    events = []
+
+                if events:
+                    published += len(events)
+                    lag = max(lag, (events[-1].published_at - events[0].created_at).total_seconds())
+
+                if len(events) < batch_size:
+                    if kwargs['once']:
+                        break
+                    time.sleep(settings.OUTBOX_POLL_INTERVAL)
+
+                elapsed = time.perf_counter() - started
+                if elapsed >= kwargs['report_every']:
+                    self.report(published, lag, elapsed)
+                    published, lag, started = 0, 0.0, time.perf_counter()
+        except KeyboardInterrupt:
+            pass
+
+        self.report(published, lag, time.perf_counter() - started)
+        self.stdout.write(self.style.SUCCESS("✓ Relay encerrado"))
@@ -0,0 +1,44 @@
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from app.exports import run_export
+from app.models import StatementExport
+
+
+class Command(BaseCommand):
+    help = 'Processa exportacoes de extrato pendentes, reenfileira as travadas e remove as expiradas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-minutes', type=int, default=60,
+            help='Exportacoes em processamento ha mais tempo que isso voltam para pendente'
+        )
+        parser.add_argument('--purge', action='store_true', help='Remove arquivos e registros mais antigos que EXPORT_TTL')
+
+    def handle(self, *args, **kwargs):
+        now = timezone.now()
+
+        # Worker interrompido (deploy, OOM) deixa a exportacao em processamento para sempre.
+        stale = StatementExport.objects.filter(
+            status=StatementExport.Status.PROCESSANDO,
+            started_at__lt=now - timedelta(minutes=kwargs['stale_minutes'])
+        ).update(status=StatementExport.Status.PENDENTE, started_at=None)
+        if stale:
+            self.stdout.write(f"{stale} exportacao(oes) travada(s) reenfileirada(s)")
+
+        pending = list(
+            StatementExport.objects.filter(status=StatementExport.Status.PENDENTE)
+            .order_by('created_at').values_list('id', flat=True)
+        )
+        done = sum(1 for export_id in pending if run_export(export_id))
+        self.stdout.write(self.style.SUCCESS(f"✓ {done} de {len(pending)} exportacao(oes) concluida(s)"))
+
+        if kwargs['purge']:
+            expired = StatementExport.objects.filter(finished_at__lt=now - settings.EXPORT_TTL)
+            for file_path in expired.exclude(file_path='').values_list('file_path', flat=True):
+                Path(file_path).unlink(missing_ok=True)
+            total = expired.delete()[0]
+            self.stdout.write(self.style.SUCCESS(f"✓ {total} exportacao(oes) expirada(s) removida(s)"))
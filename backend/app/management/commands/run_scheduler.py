@@ -0,0 +1,64 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError
+from app.bench import percentile
+from app.scheduler import run_due, SchedulerRun
+
+
+class Command(BaseCommand):
+    help = (
+        'Executa as transferencias agendadas vencidas em lotes de SCHEDULER_BATCH_SIZE ate ser interrompido '
+        '(ou ate esvaziar a fila, com --once), reportando vazao e atraso periodicamente'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Processa os agendamentos vencidos e termina')
+        parser.add_argument('--batch-size', type=int, help='Agendamentos por transacao (padrao: SCHEDULER_BATCH_SIZE)')
+        parser.add_argument('--report-every', type=int, default=60, help='Intervalo do relatorio de metricas, em segundos')
+
+    def report(self, window, elapsed):
+        rate = window.executed / elapsed * 60 if elapsed else 0.0
+        self.stdout.write(
+            f"{window.executed} executada(s), {window.retried} reagendada(s) para nova tentativa, "
+            f"{window.failed} abandonada(s) em {elapsed:.1f}s ({rate:.0f}/min); atraso "
+            f"p50 {percentile(window.lag, 0.5):.1f}s, p95 {percentile(window.lag, 0.95):.1f}s, "
+            f"max {max(window.lag, default=0.0):.1f}s"
+        )
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size'] or settings.SCHEDULER_BATCH_SIZE
+        window = SchedulerRun()
+        started = time.perf_counter()
+
+        try:
+            while True:
+                try:
+                    run = run_due(batch_size)
+                except OperationalError as exc:
+                    # SQLite ocupado por outro escritor (ou deadlock no PostgreSQL): o lote
+                    # inteiro foi desfeito e volta no proximo ciclo
+                    self.stderr.write(f"Lote desfeito: {exc}")
+                    run = SchedulerRun()
+
+                window.executed += run.executed
+                window.retried += run.retried
+                window.failed += run.failed
+                window.lag.extend(run.lag)
+
+                if run.claimed < batch_size:
+                    if kwargs['once']:
+                        break
+                    time.sleep(settings.SCHEDULER_POLL_INTERVAL)
+
+                elapsed = time.perf_counter() - started
+                if elapsed >= kwargs['report_every']:
+                    self.report(window, elapsed)
+                    window = SchedulerRun()
+                    started = time.perf_counter()
+        except KeyboardInterrupt:
+            pass
+
+        self.report(window, time.perf_counter() - started)
+        self.stdout.write(self.style.SUCCESS("✓ Scheduler encerrado"))
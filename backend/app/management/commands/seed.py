@@ -1,14 +1,61 @@
+import time
+from datetime import date
+
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from decimal import Decimal
 from django.core.exceptions import ValidationError
 from app.models import User, Account
+from app.seeding import LedgerGenerator, hash_password_pool
 from app.services import DepositService 
 
 class Command(BaseCommand):
-    help = 'Popula o banco de dados com usuários iniciais e saldos via DepositService'
+    help = 'Popula o banco de dados com usuários iniciais e saldos via DepositService, ou gera um volume sintético com --users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, help='Modo gerador: quantidade de usuarios sinteticos')
+        parser.add_argument('--transactions', type=int, default=100000, help='Linhas de transacao a gerar')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--start', type=date.fromisoformat, default=date(2026, 1, 1), help='Primeiro dia do historico (AAAA-MM-DD)')
+        parser.add_argument('--days', type=int, default=90)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--password-pool', type=int, default=32, help='Hashes distintos da senha user123 reaproveitados entre usuarios')
+        parser.add_argument('--workers', type=int, help='Processos para gerar os hashes de senha')
+
+    def generate(self, options):
+        started = time.monotonic()
+        phases = {}
+
+        # Cada fase chama progress(label, 0) ao comecar; a vazao e medida por fase.
+        def progress(label, count):
+            if not count:
+                phases[label] = time.monotonic()
+                return
+            elapsed = time.monotonic() - phases[label]
+            self.stdout.write(f"  {count} {label} ({count / elapsed:,.0f} linhas/s)")
+
+        self.stdout.write(self.style.HTTP_INFO('--- Gerando dados sinteticos ---'))
+        hashes = hash_password_pool('user123', options['password_pool'], options['seed'], options['workers'])
+        self.stdout.write(f"  {len(hashes)} hashes de senha em {time.monotonic() - started:.1f}s")
+        generator = LedgerGenerator(
+            options['seed'], options['users'], options['transactions'], options['start'], options['days'],
+            hashes, batch_size=options['batch_size']
+        )
+
+        with transaction.atomic():
+            accounts = generator.create_accounts(progress)
+            total = generator.create_ledger(accounts, progress)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"--- {len(accounts)} usuarios e {total} transacoes gerados em {elapsed:.1f}s "
+            f"({(len(accounts) * 2 + total) / elapsed:,.0f} linhas/s) ---"
+        ))
 
     def handle(self, *args, **kwargs):
+        if kwargs['users']:
+            return self.generate(kwargs)
+
         self.stdout.write(self.style.HTTP_INFO('--- Iniciando Seed de Dados ---'))
 
         data_seed = [
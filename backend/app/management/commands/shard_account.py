@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from app.models import Account, AccountBalanceShard
+
+
+class Command(BaseCommand):
+    help = 'Ativa, altera ou desativa (--shards 0) os sub-saldos de uma conta com alta contencao'
+
+    def add_arguments(self, parser):
+        parser.add_argument('account_id', type=int)
+        parser.add_argument('--shards', type=int, required=True, help='Quantidade de sub-saldos (0 desativa)')
+
+    def handle(self, *args, **kwargs):
+        shards = kwargs['shards']
+
+        if shards < 0 or shards > 256:
+            raise CommandError("A quantidade de sub-saldos deve estar entre 0 e 256.")
+
+        with transaction.atomic():
+            try:
+                account = Account.objects.select_for_update().get(pk=kwargs['account_id'])
+            except Account.DoesNotExist:
+                raise CommandError("Conta não encontrada.")
+
+            # Varre tudo para a base com os sub-saldos bloqueados; creditos que chegarem
+            # a um sub-saldo removido caem na linha base (ver AccountManager).
+            swept = Account.objects.sweep_shards(account)
+            AccountBalanceShard.objects.filter(account=account).delete()
+            AccountBalanceShard.objects.bulk_create([
+                AccountBalanceShard(account=account, index=index) for index in range(shards)
+            ])
+            # save() e nao update(): shard_count vai nas claims do JWT e no cache de
+            # destinatarios, e os signals revogam os tokens e invalidam os caches.
+            account.shard_count = shards
+            account.save(update_fields=['shard_count'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Conta {account.pk} com {shards} sub-saldo(s); R$ {swept} consolidados na linha base."
+        ))
@@ -0,0 +1,152 @@
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction, OperationalError
+from django.db.models import Sum
+from rest_framework.exceptions import ValidationError
+from app.bench import benchmark_database, create_accounts
+from app.models import Account, Transaction
+from app.services import DepositService, TransferService
+
+
+# Implementacoes anteriores (SELECT FOR UPDATE + save() e deposito sem lock),
+# mantidas aqui apenas como linha de base do comparativo.
+def legacy_transfer(origin_account, destination_account, value):
+    with transaction.atomic():
+        ids = sorted([origin_account.id, destination_account.id])
+        accounts_queryset = Account.objects.select_for_update().filter(id__in=ids)
+
+        origin = accounts_queryset.get(id=origin_account.id)
+        destination = accounts_queryset.get(id=destination_account.id)
+
+        if origin.balance < value:
+            raise ValidationError("Saldo insuficiente.")
+
+        origin.balance -= value
+        destination.balance += value
+        origin.save()
+        destination.save()
+
+        sent = Transaction.objects.create(
+            account=origin, origin_account=origin, destination_account=destination,
+            value=value, balance_after=origin.balance, type=Transaction.Type.ENVIO
+        )
+        Transaction.objects.create(
+            account=destination, origin_account=origin, destination_account=destination,
+            value=value, balance_after=destination.balance, type=Transaction.Type.RECEBIMENTO,
+            related_transaction=sent
+        )
+
+
+def legacy_deposit(account_id, value):
+    account = Account.objects.get(id=account_id)
+    with transaction.atomic():
+        account.balance += value
+        account.save()
+        Transaction.objects.create(
+            account=account, value=value, balance_after=account.balance, type=Transaction.Type.DEPÓSITO
+        )
+
+
+class Command(BaseCommand):
+    help = 'Dispara depositos e transferencias concorrentes e verifica que nenhum saldo foi perdido'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--accounts', type=int, default=10)
+        parser.add_argument('--operations', type=int, default=200, help='Operacoes por thread')
+        parser.add_argument('--legacy', action='store_true', help='Usa a implementacao anterior (read-modify-write)')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def worker(self, worker_id, account_ids, options, stats, lock):
+        rng = random.Random(options['seed'] + worker_id)
+        local = Counter()
+        deposited = Decimal("0.00")
+
+        try:
+            for _ in range(options['operations']):
+                is_deposit = rng.random() < 0.3
+                value = Decimal(rng.randint(1, 100))
+                origin_id, destination_id = rng.sample(account_ids, 2)
+
+                for _attempt in range(20):
+                    try:
+                        if is_deposit and options['legacy']:
+                            legacy_deposit(origin_id, value)
+                        elif is_deposit:
+                            DepositService.execute_deposit(Account.objects.get(id=origin_id), value)
+                        elif options['legacy']:
+                            legacy_transfer(Account(id=origin_id), Account(id=destination_id), value)
+                        else:
+                            TransferService.execute_transfer(
+                                Account(id=origin_id, status=Account.Status.ATIVO),
+                                Account(id=destination_id, status=Account.Status.ATIVO),
+                                value, 'stress'
+                            )
+                        local['deposito' if is_deposit else 'transferencia'] += 1
+                        if is_deposit:
+                            deposited += value
+                        break
+                    except ValidationError:
+                        local['saldo insuficiente'] += 1
+                        break
+                    except OperationalError:
+                        # SQLite: "database is locked" quando dois escritores colidem.
+                        local['retentativas'] += 1
+                        time.sleep(0.001)
+                else:
+                    local['desistencias'] += 1
+        finally:
+            connection.close()
+
+        with lock:
+            stats.update(local)
+            stats['valor depositado'] += deposited
+
+    def handle(self, *args, **options):
+        initial = Decimal("1000.00")
+
+        with benchmark_database(on_disk=True):
+            accounts = create_accounts(options['accounts'], balance=initial, prefix='stress')
+            account_ids = [account.id for account in accounts]
+            stats = Counter({'valor depositado': Decimal("0.00")})
+            lock = threading.Lock()
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                futures = [
+                    pool.submit(self.worker, worker_id, account_ids, options, stats, lock)
+                    for worker_id in range(options['threads'])
+                ]
+                for future in futures:
+                    future.result()
+            elapsed = time.perf_counter() - started
+
+            expected_total = initial * len(account_ids) + stats['valor depositado']
+            actual_total = Account.objects.filter(id__in=account_ids).aggregate(total=Sum('balance'))['total']
+
+            mismatched = []
+            for account in Account.objects.filter(id__in=account_ids):
+                last = Transaction.objects.filter(account=account).order_by('-created_at', '-id').first()
+                if last and last.balance_after != account.balance:
+                    mismatched.append(account.id)
+
+        completed = stats['deposito'] + stats['transferencia']
+        self.stdout.write(f"Modo: {'legado' if options['legacy'] else 'UPDATE condicional'}")
+        for key in ('deposito', 'transferencia', 'saldo insuficiente', 'retentativas', 'desistencias'):
+            self.stdout.write(f"  {key}: {stats[key]}")
+        self.stdout.write(f"  {completed / elapsed:.0f} operacoes/s em {elapsed:.2f}s")
+        self.stdout.write(f"  saldo total esperado {expected_total}, encontrado {actual_total}")
+
+        if actual_total != expected_total or mismatched:
+            raise CommandError(
+                f"Atualizacoes perdidas: diferenca de {expected_total - actual_total}, "
+                f"{len(mismatched)} conta(s) com balance_after divergente."
+            )
+
+        self.stdout.write(self.style.SUCCESS("Nenhuma atualizacao perdida."))
@@ -0,0 +1,67 @@
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .instrumentation import request_metrics, registry
+
+
+logger = logging.getLogger('app.metrics')
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        # O SQL so e capturado nas requisicoes sorteadas para o log de lentidao;
+        # nas demais o custo e um contador por consulta.
+        sampled = random.random() < settings.METRICS_SLOW_SAMPLE_RATE
+        started = time.perf_counter()
+
+        with request_metrics(capture_sql=sampled) as metrics:
+            response = self.get_response(request)
+
+        return self.finish(request, response, sampled, started, metrics)
+
+    async def __acall__(self, request):
+        sampled = random.random() < settings.METRICS_SLOW_SAMPLE_RATE
+        started = time.perf_counter()
+
+        with request_metrics(capture_sql=sampled) as metrics:
+            response = await self.get_response(request)
+
+        return self.finish(request, response, sampled, started, metrics)
+
+    def finish(self, request, response, sampled, started, metrics):
+        latency = time.perf_counter() - started
+        match = request.resolver_match
+        # Rotas nao resolvidas (404) ficam agrupadas para nao explodir a cardinalidade.
+        view = match.view_name if match else 'unmatched'
+        registry.observe(view, request.method, response.status_code, latency, metrics)
+
+        if sampled and latency * 1000 >= settings.METRICS_SLOW_REQUEST_MS:
+            self.log_slow_request(request, view, response, latency, metrics)
+
+        return response
+
+    def log_slow_request(self, request, view, response, latency, metrics):
+        statements = '\n'.join(
+            f'  {elapsed * 1000:.2f}ms {sql}' for sql, elapsed in metrics.queries.statements
+        )
+        logger.warning(
+            "Requisicao lenta %s %s (%s) status=%s %.1fms, %d consultas, sql=%.1fms, lock=%.1fms, serializer=%.1fms\n%s",
+            request.method, request.path, view, response.status_code, latency * 1000,
+            metrics.queries.count, metrics.queries.seconds * 1000, metrics.queries.lock_seconds * 1000,
+            metrics.serializer_seconds * 1000, statements
+        )
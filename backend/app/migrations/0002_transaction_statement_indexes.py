@@ -0,0 +1,25 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['account', 'created_at', 'id'], name='transaction_account_created'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['account', 'type', 'created_at', 'id'], name='transaction_account_type'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['related_transaction', 'type'], name='transaction_related_type'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_transaction_statement_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('opening_balance', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('closing_balance', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('credits', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('debits', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='daily_snapshots', to='app.account')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('account', 'date'), name='unique_account_snapshot_date')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_daily_balance_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='shard_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='AccountBalanceShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField()),
+                ('balance', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='balance_shards', to='app.account')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('account', 'index'), name='unique_account_shard_index'), models.CheckConstraint(condition=models.Q(('balance__gte', 0)), name='shard_balance_non_negative')],
+            },
+        ),
+    ]
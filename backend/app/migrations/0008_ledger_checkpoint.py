@@ -0,0 +1,31 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_statement_export'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_transaction_id', models.PositiveBigIntegerField(default=0)),
+                ('last_created_at', models.DateTimeField(blank=True, null=True)),
+                ('sealed_until', models.DateTimeField()),
+                ('entry_count', models.PositiveBigIntegerField(default=0)),
+                ('balance', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('chain_hash', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ledger_checkpoints', to='app.account')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('account', 'last_transaction_id'), name='unique_account_checkpoint')],
+            },
+        ),
+    ]
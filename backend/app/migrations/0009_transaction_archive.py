@@ -0,0 +1,43 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_ledger_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='archived',
+            field=models.BooleanField(db_default=False, default=False),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='related_transaction',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='app.transaction'),
+        ),
+        migrations.CreateModel(
+            name='TransactionArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('entry_count', models.PositiveIntegerField()),
+                ('first_transaction_id', models.PositiveBigIntegerField()),
+                ('last_transaction_id', models.PositiveBigIntegerField()),
+                ('last_created_at', models.DateTimeField()),
+                ('net', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('closing_balance', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('payload', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='transaction_archives', to='app.account')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('account', 'month'), name='unique_account_archive_month')],
+            },
+        ),
+    ]
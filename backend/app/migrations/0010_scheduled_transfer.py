@@ -0,0 +1,38 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_transaction_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledTransfer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('description', models.CharField(blank=True, max_length=254)),
+                ('frequency', models.CharField(choices=[('unica', 'Única'), ('diaria', 'Diária'), ('semanal', 'Semanal'), ('mensal', 'Mensal')], default='unica', max_length=10)),
+                ('start_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('ativo', 'Ativo'), ('concluido', 'Concluído'), ('cancelado', 'Cancelado'), ('falhou', 'Falhou')], default='ativo', max_length=20)),
+                ('next_run_at', models.DateTimeField()),
+                ('runs', models.PositiveIntegerField(default=0)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.CharField(blank=True, max_length=254)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('last_transfer_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('destination_account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='incoming_scheduled_transfers', to='app.account')),
+                ('origin_account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='scheduled_transfers', to='app.account')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_run_at'], name='scheduled_transfer_due')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-18 16:40
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_scheduled_transfer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('topic', models.CharField(choices=[('transacao', 'Transação')], max_length=30)),
+                ('account_id', models.PositiveBigIntegerField()),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('position', models.PositiveBigIntegerField(blank=True, null=True, unique=True)),
+                ('published_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('position__isnull', True)), fields=['id'], name='outbox_unpublished')],
+            },
+        ),
+    ]
@@ -1,6 +1,14 @@
-from django.db import models
+import random
+from decimal import Decimal
+
+from django.db import models, connections, router
+from django.db.models.sql import UpdateQuery
 from django.contrib.auth.models import AbstractUser, BaseUserManager
-from django.db.models import Q
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .hashers import hash_password, verify_password
 
 
 class CustomUserManager(BaseUserManager):
@@ -33,11 +41,179 @@ class User(AbstractUser):
 	full_name = models.CharField(max_length=60)
 	cpf = models.CharField(max_length=11, unique=True)
 	role = models.CharField(max_length=20, choices=Role.choices)
+	# Incrementado quando role, status da conta, senha ou is_active mudam; tokens
+	# emitidos com uma versao anterior deixam de ser aceitos.
+	token_version = models.PositiveIntegerField(default=0)
 
 	USERNAME_FIELD = 'email'
 	REQUIRED_FIELDS = []
 	objects = CustomUserManager()
 
+	# Hash e verificacao rodam no pool limitado de app/hashers.py. Um hash de outro
+	# hasher (ou com outros parametros) e refeito no login sem derrubar as sessoes
+	# abertas: a senha continua a mesma (ver signals.track_token_fields).
+	def set_password(self, raw_password):
+		self.password = hash_password(raw_password)
+		self._password = raw_password
+
+	def check_password(self, raw_password):
+		correct, must_update = verify_password(raw_password, self.password)
+
+		if correct and must_update:
+			self.set_password(raw_password)
+			self._password = None
+			self._rehashed = True
+			try:
+				self.save(update_fields=['password'])
+			finally:
+				self._rehashed = False
+
+		return correct
+
+
+
+def update_rows(model, objects, field_names):
+	# bulk_update() monta um CASE WHEN por campo e linha, e o custo de compilar a
+	# expressao cresce com o lote. Aqui e um UPDATE ... WHERE pk = %s com os valores
+	# de cada objeto, enviado em um unico executemany.
+	if not objects:
+		return
+
+	using = router.db_for_write(model)
+	connection = connections[using]
+	quote = connection.ops.quote_name
+	fields = [model._meta.get_field(name) for name in field_names]
+	pk = model._meta.pk
+
+	assignments = ', '.join(f'{quote(field.column)} = %s' for field in fields)
+	statement = f'UPDATE {quote(model._meta.db_table)} SET {assignments} WHERE {quote(pk.column)} = %s'
+	params = [
+		[field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields] + [obj.pk]
+		for obj in objects
+	]
+
+	with connection.cursor() as cursor:
+		cursor.executemany(statement, params)
+
+
+def update_returning(queryset, field_name, expression):
+	# UPDATE ... SET field = expression ... RETURNING field em um unico comando
+	# (PostgreSQL e SQLite >= 3.35). Nos demais bancos, UPDATE seguido de leitura.
+	# Retorna o novo valor, ou None se nenhuma linha atendeu ao filtro.
+	using = queryset.db
+	connection = connections[using]
+	field = queryset.model._meta.get_field(field_name)
+
+	supports_returning = connection.vendor == 'postgresql' or (
+		connection.vendor == 'sqlite' and connection.features.can_return_columns_from_insert
+	)
+
+	if not supports_returning:
+		pks = list(queryset.values_list('pk', flat=True)[:1])
+		if not pks or not queryset.filter(pk=pks[0]).update(**{field_name: expression}):
+			return None
+		return queryset.model._base_manager.using(using).filter(pk=pks[0]).values_list(field_name, flat=True).get()
+
+	query = queryset.query.chain(UpdateQuery)
+	query.add_update_values({field_name: expression})
+	statement, params = query.get_compiler(using).as_sql()
+
+	with connection.cursor() as cursor:
+		cursor.execute(f'{statement} RETURNING {connection.ops.quote_name(field.column)}', params)
+		row = cursor.fetchone()
+
+	if row is None:
+		return None
+
+	return Decimal(str(row[0])).quantize(Decimal("0.01"))
+
+
+class AccountQuerySet(models.QuerySet):
+
+	def with_balance(self):
+		shard_total = AccountBalanceShard.objects.filter(
+			account=models.OuterRef('pk')
+		).values('account').annotate(total=models.Sum('balance')).values('total')
+
+		return self.annotate(sharded_balance=Coalesce(
+			models.Subquery(shard_total, output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+			models.Value(Decimal("0.00"), output_field=models.DecimalField(max_digits=12, decimal_places=2))
+		))
+
+
+class AccountManager(models.Manager.from_queryset(AccountQuerySet)):
+
+	# UPDATE ... SET balance = balance + delta [WHERE balance >= -delta] em um unico
+	# comando. O proprio UPDATE toma o lock da linha, entao nao ha SELECT FOR UPDATE
+	# previo. Retorna o novo saldo ou None quando o saldo nao cobre o debito.
+	def adjust_balance(self, account, delta, require_funds=False):
+		if account.shard_count:
+			return self._adjust_sharded_balance(account, delta, require_funds)
+
+		balance = self._adjust_base_balance(account, delta, require_funds)
+		if balance is None and self._refresh_shard_count(account):
+			# Instancia montada com um shard_count antigo (claims do token, cache de
+			# destinatarios) de uma conta que passou a ter sub-saldos: o debito precisa
+			# varre-los antes de faltar saldo.
+			return self._adjust_sharded_balance(account, delta, require_funds)
+		if balance is not None:
+			account.balance = balance
+		return balance
+
+	def _refresh_shard_count(self, account):
+		using = router.db_for_write(self.model, instance=account)
+		account.shard_count = self.using(using).filter(pk=account.pk).values_list('shard_count', flat=True).first() or 0
+		return account.shard_count
+
+	def _adjust_base_balance(self, account, delta, require_funds):
+		using = router.db_for_write(self.model, instance=account)
+		queryset = self.using(using).filter(pk=account.pk)
+
+		if require_funds:
+			queryset = queryset.filter(balance__gte=-delta)
+
+		return update_returning(queryset, 'balance', F('balance') + delta)
+
+	# Contas quentes: creditos caem em um sub-saldo sorteado, sem tocar a linha de
+	# Account; debitos saem da linha base e, se ela nao cobrir o valor, os
+	# sub-saldos sao varridos para a base antes de tentar de novo. O retorno e o
+	# saldo total (base + sub-saldos) lido logo apos a escrita.
+	def _adjust_sharded_balance(self, account, delta, require_funds):
+		using = router.db_for_write(self.model, instance=account)
+
+		if delta >= 0:
+			shard = AccountBalanceShard.objects.using(using).filter(
+				account_id=account.pk,
+				index=random.randrange(account.shard_count)
+			)
+			if update_returning(shard, 'balance', F('balance') + delta) is None:
+				# Sub-saldo inexistente (quantidade alterada em paralelo): credita na base.
+				self._adjust_base_balance(account, delta, require_funds=False)
+		else:
+			if self._adjust_base_balance(account, delta, require_funds) is None:
+				self.sweep_shards(account)
+				if self._adjust_base_balance(account, delta, require_funds) is None:
+					return None
+
+		base, sharded = self.using(using).with_balance().filter(pk=account.pk).values_list(
+			'balance', 'sharded_balance'
+		).get()
+		return base + sharded
+
+	# Move todos os sub-saldos para a linha base. Deve rodar dentro de transaction.atomic().
+	def sweep_shards(self, account):
+		using = router.db_for_write(self.model, instance=account)
+		shards = list(
+			AccountBalanceShard.objects.using(using).select_for_update()
+			.filter(account_id=account.pk).order_by('index')
+		)
+		total = sum((shard.balance for shard in shards), Decimal("0.00"))
+
+		if total:
+			AccountBalanceShard.objects.using(using).filter(pk__in=[shard.pk for shard in shards if shard.balance]).update(balance=0)
+			account.balance = self._adjust_base_balance(account, total, require_funds=False)
+
+		return total
 
 
 class Account(models.Model):
@@ -50,6 +226,20 @@ class Account(models.Model):
 	balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
 	status = models.CharField(max_length=20, choices=Status.choices, default=Status.ATIVO)
 	created_at = models.DateTimeField(auto_now_add=True)
+	shard_count = models.PositiveSmallIntegerField(default=0)
+
+	objects = AccountManager()
+
+	@property
+	def total_balance(self):
+		if not self.shard_count:
+			return self.balance
+
+		sharded = getattr(self, 'sharded_balance', None)
+		if sharded is None:
+			sharded = self.balance_shards.aggregate(total=models.Sum('balance'))['total'] or Decimal("0.00")
+
+		return self.balance + sharded
 
 	class Meta:
 		constraints = [
@@ -60,6 +250,31 @@ class Account(models.Model):
 		]
 
 
+class AccountBalanceShard(models.Model):
+	account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='balance_shards')
+	index = models.PositiveSmallIntegerField()
+	balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['account', 'index'], name='unique_account_shard_index'),
+			models.CheckConstraint(
+				condition=models.Q(balance__gte=0),
+				name='shard_balance_non_negative'
+			)
+		]
+
+
+# Linhas marcadas como arquivadas ja estao em um TransactionArchive e so continuam na
+# tabela porque transacoes quentes as referenciam (ex.: envio antigo estornado depois
+# do corte). Ficam fora de todas as leituras do ledger; o FK related_transaction ainda
+# as alcanca pelo _base_manager.
+class TransactionManager(models.Manager):
+
+	def get_queryset(self):
+		return super().get_queryset().filter(archived=False)
+
+
 class Transaction(models.Model):
 	class Type(models.TextChoices):
 		DEPÓSITO = 'depósito', 'Depósito'
@@ -75,4 +290,201 @@ class Transaction(models.Model):
 	type = models.CharField(max_length=20, choices=Type.choices)
 	description = models.CharField(max_length=254, blank=True)
 	created_at = models.DateTimeField(auto_now_add=True)
-	related_transaction = models.ForeignKey('Transaction', on_delete=models.PROTECT, null=True, blank=True)
+	# DO_NOTHING: o arquivamento (app/archive.py) remove meses inteiros com um DELETE
+	# por faixa; a FK do banco (adiada ate o commit) continua impedindo referencias soltas.
+	related_transaction = models.ForeignKey('Transaction', on_delete=models.DO_NOTHING, null=True, blank=True)
+	archived = models.BooleanField(default=False, db_default=False)
+
+	objects = TransactionManager()
+	all_objects = models.Manager()
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['account', 'created_at', 'id'], name='transaction_account_created'),
+			models.Index(fields=['account', 'type', 'created_at', 'id'], name='transaction_account_type'),
+			models.Index(fields=['related_transaction', 'type'], name='transaction_related_type'),
+		]
+
+	# Ledger append-only: estornos e correcoes entram como transacoes novas. A cadeia
+	# de hashes verificada por app/integrity.py depende de linhas imutaveis. A unica
+	# remocao (ou marcacao, em archived) e a do arquivamento, que move as linhas para
+	# TransactionArchive.
+	def save(self, *args, **kwargs):
+		if not self._state.adding:
+			raise ValueError("Transações gravadas não podem ser alteradas.")
+		super().save(*args, **kwargs)
+
+	def delete(self, *args, **kwargs):
+		raise ValueError("Transações gravadas não podem ser removidas.")
+
+
+class DailyBalanceSnapshot(models.Model):
+	account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='daily_snapshots')
+	date = models.DateField()
+	opening_balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+	closing_balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+	credits = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+	debits = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+	transaction_count = models.PositiveIntegerField(default=0)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['account', 'date'], name='unique_account_snapshot_date')
+		]
+
+
+class IdempotencyKey(models.Model):
+	user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+	key = models.CharField(max_length=255)
+	endpoint = models.CharField(max_length=255)
+	request_hash = models.CharField(max_length=64)
+	status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+	response_body = models.JSONField(null=True, blank=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+	expires_at = models.DateTimeField(db_index=True)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['user', 'key'], name='unique_user_idempotency_key')
+		]
+
+
+class StatementExport(models.Model):
+	class Format(models.TextChoices):
+		CSV = 'csv', 'CSV'
+		OFX = 'ofx', 'OFX'
+		PARQUET = 'parquet', 'Parquet'
+
+	class Status(models.TextChoices):
+	    PENDENTE = 'pendente', 'Pendente'
+	    PROCESSANDO = 'processando', 'Processando'
+	    CONCLUIDO = 'concluido', 'Concluído'
+	    FALHOU = 'falhou', 'Falhou'
+
+	requested_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='statement_exports')
+	account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='statement_exports')
+	format = models.CharField(max_length=10, choices=Format.choices)
+	# Mesmos filtros do extrato (date_start, date_end, type), como strings
+	filters = models.JSONField(default=dict, blank=True)
+	status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDENTE)
+	file_path = models.CharField(max_length=500, blank=True)
+	file_size = models.PositiveBigIntegerField(null=True, blank=True)
+	row_count = models.PositiveIntegerField(null=True, blank=True)
+	error = models.TextField(blank=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+	started_at = models.DateTimeField(null=True, blank=True)
+	finished_at = models.DateTimeField(null=True, blank=True)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['status', 'created_at'], name='statement_export_status'),
+		]
+
+
+# Estado acumulado do ledger de uma conta ate last_transaction_id (na ordem
+# created_at, id): quantidade, soma dos valores com sinal e hash encadeado.
+class LedgerCheckpoint(models.Model):
+	account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='ledger_checkpoints')
+	# 0 = conta sem transacoes no momento do selo
+	last_transaction_id = models.PositiveBigIntegerField(default=0)
+	last_created_at = models.DateTimeField(null=True, blank=True)
+	# Horizonte do selo: todas as transacoes da conta anteriores a isso estao na cadeia
+	sealed_until = models.DateTimeField()
+	entry_count = models.PositiveBigIntegerField(default=0)
+	balance = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+	chain_hash = models.CharField(max_length=64)
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['account', 'last_transaction_id'], name='unique_account_checkpoint')
+		]
+
+
+# Mes de transacoes de uma conta movido para fora da tabela quente por
+# archive_transactions: as linhas (mesmos campos lidos pela verificacao do ledger)
+# ficam em payload, JSON compactado com zlib. Por conta, tudo que esta arquivado e
+# anterior a tudo que continua em Transaction.
+class TransactionArchive(models.Model):
+	account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='transaction_archives')
+	# Primeiro dia do mes
+	month = models.DateField()
+	entry_count = models.PositiveIntegerField()
+	first_transaction_id = models.PositiveBigIntegerField()
+	last_transaction_id = models.PositiveBigIntegerField()
+	last_created_at = models.DateTimeField()
+	# Soma dos valores com sinal e balance_after da ultima transacao do mes
+	net = models.DecimalField(max_digits=14, decimal_places=2)
+	closing_balance = models.DecimalField(max_digits=10, decimal_places=2)
+	payload = models.BinaryField()
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['account', 'month'], name='unique_account_archive_month')
+		]
+
+
+# Transferencia agendada (unica ou recorrente), executada pelo comando
+# run_scheduler. A ocorrencia n (a partir de 0) vence em start_at + n periodos;
+# runs conta as ocorrencias ja consumidas (executadas ou abandonadas apos as
+# tentativas).
+class ScheduledTransfer(models.Model):
+	class Frequency(models.TextChoices):
+		UNICA = 'unica', 'Única'
+		DIARIA = 'diaria', 'Diária'
+		SEMANAL = 'semanal', 'Semanal'
+		MENSAL = 'mensal', 'Mensal'
+
+	class Status(models.TextChoices):
+	    ATIVO = 'ativo', 'Ativo'
+	    CONCLUIDO = 'concluido', 'Concluído'
+	    CANCELADO = 'cancelado', 'Cancelado'
+	    FALHOU = 'falhou', 'Falhou'
+
+	origin_account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='scheduled_transfers')
+	destination_account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='incoming_scheduled_transfers')
+	value = models.DecimalField(max_digits=10, decimal_places=2)
+	description = models.CharField(max_length=254, blank=True)
+	frequency = models.CharField(max_length=10, choices=Frequency.choices, default=Frequency.UNICA)
+	start_at = models.DateTimeField()
+	# Ocorrencias depois disso nao sao executadas
+	ends_at = models.DateTimeField(null=True, blank=True)
+	status = models.CharField(max_length=20, choices=Status.choices, default=Status.ATIVO)
+	next_run_at = models.DateTimeField()
+	runs = models.PositiveIntegerField(default=0)
+	# Tentativas falhas da ocorrencia atual
+	attempts = models.PositiveSmallIntegerField(default=0)
+	last_error = models.CharField(max_length=254, blank=True)
+	last_run_at = models.DateTimeField(null=True, blank=True)
+	# Envio da ultima execucao (sem FK: o arquivamento remove transacoes antigas)
+	last_transfer_id = models.PositiveBigIntegerField(null=True, blank=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['status', 'next_run_at'], name='scheduled_transfer_due'),
+		]
+
+
+# Outbox transacional (app/outbox.py): um evento por transacao gravada, no mesmo
+# transaction.atomic() dos servicos. O relay_outbox publica os eventos em ordem e
+# atribui position, o cursor dos consumidores (/api/events/): sequencial e sem
+# buracos, na ordem de publicacao.
+class OutboxEvent(models.Model):
+	class Topic(models.TextChoices):
+		TRANSACAO = 'transacao', 'Transação'
+
+	id = models.BigAutoField(primary_key=True)
+	topic = models.CharField(max_length=30, choices=Topic.choices)
+	account_id = models.PositiveBigIntegerField()
+	payload = models.JSONField(encoder=DjangoJSONEncoder)
+	created_at = models.DateTimeField(auto_now_add=True)
+	position = models.PositiveBigIntegerField(null=True, blank=True, unique=True)
+	published_at = models.DateTimeField(null=True, blank=True)
+
+	class Meta:
+		indexes = [
+			# Fila do relay: so os eventos ainda nao publicados
+			models.Index(fields=['id'], condition=Q(position__isnull=True), name='outbox_unpublished'),
+		]
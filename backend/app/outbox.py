@@ -0,0 +1,181 @@
+import json
+import os
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboxEvent, update_rows
+
+
+def _money(value):
+    return Decimal(str(value)).quantize(Decimal("0.01"))
+
+
+def _transaction_payload(entry):
+    return {
+        'id': entry.id,
+        'account_id': entry.account_id,
+        'type': entry.type,
+        'value': _money(entry.value),
+        'balance_after': _money(entry.balance_after),
+        'description': entry.description,
+        'origin_account_id': entry.origin_account_id,
+        'destination_account_id': entry.destination_account_id,
+        'related_transaction_id': entry.related_transaction_id,
+        'created_at': entry.created_at,
+    }
+
+
+# Chamado pelos servicos dentro do transaction.atomic() que grava as transacoes:
+# o evento existe se e somente se a transacao foi confirmada.
+def record_events(entries):
+    OutboxEvent.objects.bulk_create([
+        OutboxEvent(topic=OutboxEvent.Topic.TRANSACAO, account_id=entry.account_id, payload=_transaction_payload(entry))
+        for entry in entries
+    ])
+
+
+def event_data(event):
+    return {
+        'position': event.position,
+        'id': event.id,
+        'topic': event.topic,
+        'account_id': event.account_id,
+        'created_at': event.created_at,
+        'payload': event.payload,
+    }
+
+
+def encode(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+# Destino da publicacao (OUTBOX_SINK): qualquer classe com publish(events), que
+# recebe a lista de event_data() na ordem de position e levanta excecao se falhar.
+# A entrega e pelo menos uma vez: consumidores descartam ids repetidos.
+class FileSink:
+
+    def __init__(self):
+        self.path = Path(settings.OUTBOX_FILE)
+
+    # NDJSON com fsync: no retorno, o lote esta gravado no disco
+    def publish(self, events):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as handle:
+            handle.write(''.join(encode(event) + '\n' for event in events))
+            handle.flush()
+            os.fsync(handle.fileno())
+
+
+def get_sink():
+    return import_string(settings.OUTBOX_SINK)()
+
+
+# Publica um lote de eventos pendentes na ordem de id. FOR UPDATE sem SKIP LOCKED:
+# um segundo relay espera o primeiro, e as posicoes saem sequenciais, na ordem de
+# commit. A posicao e gravada na mesma transacao, depois que o sink confirmou; se
+# o commit falhar, o lote e publicado de novo na proxima rodada.
+def relay_batch(sink, batch_size=None):
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update().filter(position__isnull=True).order_by('id')[:batch_size]
+        )
+        if not events:
+            return []
+
+        last = OutboxEvent.objects.aggregate(last=Max('position'))['last'] or 0
+        now = timezone.now()
+        for position, event in enumerate(events, start=last + 1):
+            event.position = position
+            event.published_at = now
+
+        sink.publish([event_data(event) for event in events])
+        update_rows(OutboxEvent, events, ['position', 'published_at'])
+
+    return events
+
+
+class CursorExpired(Exception):
+    pass
+
+
+# Eventos publicados depois do cursor (position). Como as posicoes sao
+# sequenciais, um primeiro evento alem de cursor + 1 significa que o trecho
+# seguinte ao cursor ja foi removido pela retencao (OUTBOX_RETENTION).
+def events_after(cursor, limit):
+    events = list(OutboxEvent.objects.filter(position__gt=cursor).order_by('position')[:limit])
+
+    if cursor and events and events[0].position != cursor + 1:
+        raise CursorExpired()
+
+    return events
+
+
+# Long-poll: consulta a cada OUTBOX_POLL_INTERVAL ate chegar algum evento ou o
+# timeout acabar. Cada consulta e uma leitura pelo indice unico de position.
+def wait_for_events(cursor, limit, timeout):
+    deadline = time.monotonic() + timeout
+
+    while True:
+        events = events_after(cursor, limit)
+        if events or time.monotonic() >= deadline:
+            return events
+        time.sleep(min(settings.OUTBOX_POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+
+
+# Eventos do Server-Sent Events: id e o cursor para o Last-Event-ID da reconexao.
+# A conexao e encerrada depois de OUTBOX_STREAM_MAX_SECONDS para liberar o worker;
+# o cliente reconecta de onde parou.
+def sse_stream(cursor, limit):
+    deadline = time.monotonic() + settings.OUTBOX_STREAM_MAX_SECONDS
+    heartbeat = time.monotonic()
+    yield f'retry: {int(settings.OUTBOX_POLL_INTERVAL * 1000)}\n\n'
+
+    while time.monotonic() < deadline:
+        try:
+            events = events_after(cursor, limit)
+        except CursorExpired:
+            yield f'event: erro\ndata: {encode({"detail": "Cursor expirado. Reinicie a leitura sem cursor."})}\n\n'
+            return
+
+        for event in events:
+            yield f'id: {event.position}\nevent: {event.topic}\ndata: {encode(event_data(event))}\n\n'
+            cursor = event.position
+
+        if events:
+            heartbeat = time.monotonic()
+            continue
+
+        if time.monotonic() - heartbeat >= 15:
+            heartbeat = time.monotonic()
+            yield ': keepalive\n\n'
+        time.sleep(settings.OUTBOX_POLL_INTERVAL)
+
+
+# Eventos aguardando o relay e ha quanto tempo o mais antigo espera
+def pending(now=None):
+    now = now or timezone.now()
+    waiting = OutboxEvent.objects.filter(position__isnull=True).aggregate(count=Count('id'), oldest=Min('created_at'))
+    lag = (now - waiting['oldest']).total_seconds() if waiting['oldest'] else 0.0
+    return waiting['count'], lag
+
+
+# O evento publicado mais recente nunca e removido: relay_batch numera a partir do
+# maior position da tabela, e sem ele as posicoes recomecariam em 1, abaixo dos
+# cursores dos consumidores.
+def purge_published(now=None):
+    now = now or timezone.now()
+    last = OutboxEvent.objects.aggregate(last=Max('position'))['last']
+    if last is None:
+        return 0
+    expired = OutboxEvent.objects.filter(published_at__lt=now - settings.OUTBOX_RETENTION).exclude(position=last)
+    return expired.delete()[0]
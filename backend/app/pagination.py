@@ -0,0 +1,128 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from itertools import islice
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class TransactionKeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 500
+
+    def __init__(self, descending=False):
+        self.descending = descending
+        self.next_cursor = None
+
+    def is_requested(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+
+    def get_page_size(self, request):
+        raw = request.query_params.get(self.page_size_query_param)
+        if raw is None:
+            return self.page_size
+
+        try:
+            size = int(raw)
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: 'Tamanho de página inválido.'})
+
+        if size < 1:
+            raise ValidationError({self.page_size_query_param: 'Tamanho de página inválido.'})
+
+        return min(size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        raw = request.query_params.get(self.cursor_query_param)
+        if not raw:
+            return None
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(raw.encode()).decode())
+            return datetime.fromisoformat(payload['c']), int(payload['i'])
+        except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+            raise ValidationError({self.cursor_query_param: 'Cursor inválido.'})
+
+    def encode_cursor(self, instance):
+        payload = json.dumps({'c': instance.created_at.isoformat(), 'i': instance.id})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    # A busca parte sempre do par (created_at, id) do ultimo item entregue, entao
+    # paginas profundas custam o mesmo que a primeira: nao ha OFFSET.
+    def get_page_queryset(self, queryset, request):
+        self.page_size_value = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        if self.descending:
+            queryset = queryset.order_by('-created_at', '-id')
+            if position:
+                created_at, pk = position
+                queryset = queryset.filter(
+                    Q(created_at__lte=created_at) & ~Q(created_at=created_at, id__gte=pk)
+                )
+        else:
+            queryset = queryset.order_by('created_at', 'id')
+            if position:
+                created_at, pk = position
+                queryset = queryset.filter(
+                    Q(created_at__gte=created_at) & ~Q(created_at=created_at, id__lte=pk)
+                )
+
+        return queryset[:self.page_size_value + 1]
+
+    def set_page(self, rows):
+        rows = list(rows)
+
+        if len(rows) > self.page_size_value:
+            rows = rows[:self.page_size_value]
+            self.next_cursor = self.encode_cursor(rows[-1])
+        else:
+            self.next_cursor = None
+
+        return rows
+
+    # Extrato com meses arquivados (app/archive.py): por conta, as linhas arquivadas
+    # sao todas anteriores as da tabela quente, entao a pagina comeca em uma fonte e
+    # so consulta a outra se faltarem linhas. archived(posicao) devolve as linhas
+    # arquivadas depois da posicao do cursor, na mesma ordenacao.
+    def get_page_rows(self, queryset, archived, request):
+        page = self.get_page_queryset(queryset, request)
+        older = archived(self.decode_cursor(request))
+        limit = self.page_size_value + 1
+        rows = []
+
+        for source in ((page, older) if self.descending else (older, page)):
+            rows.extend(islice(source, limit - len(rows)))
+            if len(rows) >= limit:
+                break
+
+        return rows
+
+    def paginate_queryset(self, queryset, request, view=None, archived=None):
+        if archived is not None:
+            return self.set_page(self.get_page_rows(queryset, archived, request))
+        return self.set_page(self.get_page_queryset(queryset, request))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next_cursor': self.next_cursor,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next_cursor': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
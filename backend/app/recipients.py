@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.db.models import Q
+
+from .cache import LRUCache
+from .models import Account
+
+
+RECIPIENT_FIELDS = ('id', 'user_id', 'status', 'shard_count')
+
+# Chave: (campo, identificador normalizado). Valor: campos da conta usados pelos
+# servicos. Invalidado pelos signals de User/Account; o TTL cobre alteracoes
+# feitas por outros processos ou por update() em lote.
+recipient_cache = LRUCache(settings.RECIPIENT_CACHE_SIZE, settings.RECIPIENT_CACHE_TTL)
+
+
+def classify_identifier(identifier):
+    identifier = identifier.strip()
+
+    if '@' in identifier:
+        local, _, domain = identifier.rpartition('@')
+        return 'email', f'{local}@{domain.lower()}'
+
+    # CPF pode vir formatado (000.000.000-00); o banco guarda so os digitos.
+    digits = identifier.replace('.', '').replace('-', '')
+    return 'cpf', digits if digits.isdigit() else identifier
+
+
+# Cada acerto gera uma instancia nova: os servicos alteram account.balance.
+def _account(values):
+    return Account(**dict(zip(RECIPIENT_FIELDS, values)))
+
+
+def _remember(field, value, values):
+    recipient_cache.set((field, value), values, tags=[values[1]])
+
+
+def resolve_recipient(identifier):
+    field, value = classify_identifier(identifier)
+    values = recipient_cache.get((field, value))
+
+    if values is None:
+        values = Account.objects.filter(**{f'user__{field}': value}).values_list(*RECIPIENT_FIELDS).first()
+        if values is None:
+            return None
+        _remember(field, value, values)
+
+    return _account(values)
+
+
+# Resolve varios identificadores com no maximo uma consulta para os que nao
+# estao em cache. Retorna {identificador original: Account ou None}.
+def resolve_recipients(identifiers):
+    keys = {identifier: classify_identifier(identifier) for identifier in identifiers}
+    found = {key: recipient_cache.get(key) for key in set(keys.values())}
+    missing = [key for key, values in found.items() if values is None]
+
+    if missing:
+        emails = [value for field, value in missing if field == 'email']
+        cpfs = [value for field, value in missing if field == 'cpf']
+        rows = Account.objects.filter(
+            Q(user__email__in=emails) | Q(user__cpf__in=cpfs)
+        ).values_list(*RECIPIENT_FIELDS, 'user__email', 'user__cpf')
+
+        for row in rows:
+            values, email, cpf = row[:len(RECIPIENT_FIELDS)], row[-2], row[-1]
+            for key in (('email', email), ('cpf', cpf)):
+                if key in found:
+                    found[key] = values
+                    _remember(*key, values)
+
+    return {
+        identifier: _account(found[key]) if found[key] is not None else None
+        for identifier, key in keys.items()
+    }
+
+
+def invalidate_recipient(user_id):
+    recipient_cache.invalidate_tag(user_id)
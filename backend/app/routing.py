@@ -0,0 +1,87 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+# Alias de leitura da requisicao corrente. So as views que optam por replica
+# (ReplicaReadMixin, AsyncAccountView.replica_reads) o definem; fora delas tudo vai
+# para o primario. Como em instrumentation.py, o contexto e copiado para as threads
+# do sync_to_async.
+_read_alias = ContextVar('read_alias', default=None)
+
+
+@contextmanager
+def read_from(alias):
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        # Dentro de uma transacao no primario (servicos com select_for_update e
+        # UPDATEs condicionais) a leitura fica na mesma conexao.
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    # Replicas tem os mesmos dados do primario: objetos lidos de uma podem ser
+    # relacionados a objetos do outro.
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+def _cache():
+    return caches[settings.REPLICA_STICKY_CACHE_ALIAS]
+
+
+def _pin_key(account_id):
+    return f'replica:pinned:{account_id}'
+
+
+# Chamado pelos servicos que movimentam saldo, dentro da transacao: por
+# REPLICA_STICKY_SECONDS apos o commit as leituras dessas contas ficam no primario,
+# que ja tem a escrita que a replica pode ainda nao ter recebido.
+def pin_primary(account_ids):
+    if not settings.DATABASE_REPLICAS:
+        return
+
+    keys = {_pin_key(account_id): True for account_id in account_ids}
+    transaction.on_commit(lambda: _cache().set_many(keys, settings.REPLICA_STICKY_SECONDS))
+
+
+def replica_for(account_id):
+    if not settings.DATABASE_REPLICAS or _cache().get(_pin_key(account_id)):
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+async def areplica_for(account_id):
+    if not settings.DATABASE_REPLICAS or await _cache().aget(_pin_key(account_id)):
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+# Opt-in das views somente leitura. Autenticacao e permissoes rodam no primario;
+# depois delas, as consultas da view (e da serializacao) vao para uma replica,
+# a menos que a conta do usuario tenha escrito ha pouco.
+class ReplicaReadMixin:
+
+    def dispatch(self, request, *args, **kwargs):
+        with read_from(None):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        _read_alias.set(replica_for(request.user.account.id))
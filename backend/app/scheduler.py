@@ -0,0 +1,121 @@
+import calendar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import Account, ScheduledTransfer, update_rows
+from .services import TransferService
+
+
+def _add_months(moment, months):
+    index = moment.year * 12 + moment.month - 1 + months
+    year, month = index // 12, index % 12 + 1
+    return moment.replace(year=year, month=month, day=min(moment.day, calendar.monthrange(year, month)[1]))
+
+
+# Vencimento da ocorrencia `number` (0 = start_at). Mensal segue o dia de start_at,
+# limitado ao ultimo dia do mes (31/01 -> 28/02 -> 31/03).
+def occurrence(schedule, number):
+    if schedule.frequency == ScheduledTransfer.Frequency.DIARIA:
+        return schedule.start_at + timedelta(days=number)
+    if schedule.frequency == ScheduledTransfer.Frequency.SEMANAL:
+        return schedule.start_at + timedelta(weeks=number)
+    if schedule.frequency == ScheduledTransfer.Frequency.MENSAL:
+        return _add_months(schedule.start_at, number)
+    return schedule.start_at if number == 0 else None
+
+
+# Consome a ocorrencia atual e aponta next_run_at para a seguinte, ou encerra o agendamento
+def _advance(schedule, final_status):
+    schedule.runs += 1
+    schedule.attempts = 0
+    next_run = occurrence(schedule, schedule.runs)
+
+    if next_run is None or (schedule.ends_at and next_run > schedule.ends_at):
+        schedule.status = final_status
+    else:
+        schedule.next_run_at = next_run
+
+
+class SchedulerRun:
+
+    def __init__(self):
+        self.claimed = 0
+        self.executed = 0
+        self.retried = 0
+        self.failed = 0
+        self.lag = []
+
+
+# Executa um lote de agendamentos vencidos em uma transacao: as linhas sao
+# reivindicadas com SELECT ... FOR UPDATE SKIP LOCKED (varios schedulers dividem a
+# fila sem esperar um pelo outro) e liquidadas juntas por TransferService.execute_many.
+# Transferencias e avanco dos agendamentos sao gravados na mesma transacao: uma
+# ocorrencia nunca e paga duas vezes.
+def run_due(batch_size=None, now=None):
+    batch_size = batch_size or settings.SCHEDULER_BATCH_SIZE
+    now = now or timezone.now()
+    run = SchedulerRun()
+
+    with transaction.atomic():
+        schedules = list(
+            ScheduledTransfer.objects.select_for_update(skip_locked=True)
+            .filter(status=ScheduledTransfer.Status.ATIVO, next_run_at__lte=now)
+            .order_by('next_run_at', 'id')[:batch_size]
+        )
+        if not schedules:
+            return run
+        run.claimed = len(schedules)
+
+        # Na ordem de vencimento: com saldo para parte dos agendamentos de uma conta,
+        # os mais antigos sao pagos primeiro
+        results = TransferService.execute_many([
+            {
+                'origin_account': Account(id=schedule.origin_account_id),
+                'destination_account': Account(id=schedule.destination_account_id),
+                'value': schedule.value,
+                'description': schedule.description,
+            }
+            for schedule in schedules
+        ])
+
+        for schedule, result in zip(schedules, results):
+            if result['status'] == 'ok':
+                run.executed += 1
+                run.lag.append((now - schedule.next_run_at).total_seconds())
+                schedule.last_run_at = now
+                schedule.last_transfer_id = result['transfer_id']
+                schedule.last_error = ''
+                _advance(schedule, ScheduledTransfer.Status.CONCLUIDO)
+                continue
+
+            # Saldo insuficiente, conta inativa: nova tentativa com espera dobrando;
+            # esgotadas, a ocorrencia e abandonada (o agendamento unico falha)
+            schedule.attempts += 1
+            schedule.last_error = result['detail'][:254]
+            if schedule.attempts < settings.SCHEDULER_MAX_ATTEMPTS:
+                run.retried += 1
+                schedule.next_run_at = now + settings.SCHEDULER_RETRY_DELAY * 2 ** (schedule.attempts - 1)
+            else:
+                run.failed += 1
+                once = schedule.frequency == ScheduledTransfer.Frequency.UNICA
+                _advance(schedule, ScheduledTransfer.Status.FALHOU if once else ScheduledTransfer.Status.CONCLUIDO)
+
+        update_rows(ScheduledTransfer, schedules, [
+            'status', 'next_run_at', 'runs', 'attempts', 'last_error', 'last_run_at', 'last_transfer_id'
+        ])
+
+    return run
+
+
+# Fila pendente para /api/metrics/: agendamentos vencidos e o atraso do mais antigo
+def backlog(now=None):
+    now = now or timezone.now()
+    due = ScheduledTransfer.objects.filter(status=ScheduledTransfer.Status.ATIVO, next_run_at__lte=now).aggregate(
+        count=Count('id'), oldest=Min('next_run_at')
+    )
+    lag = (now - due['oldest']).total_seconds() if due['oldest'] else 0.0
+    return due['count'], lag
@@ -0,0 +1,256 @@
+import hashlib
+import random
+from bisect import bisect
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import accumulate, islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connections, router
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import User, Account, Transaction, DailyBalanceSnapshot
+
+
+FIRST_NAMES = [
+    'Ana', 'Bruno', 'Carla', 'Daniel', 'Eduarda', 'Felipe', 'Gabriela', 'Heitor', 'Isabela', 'João',
+    'Larissa', 'Lucas', 'Mariana', 'Mateus', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Thiago',
+]
+
+LAST_NAMES = [
+    'Almeida', 'Barbosa', 'Cardoso', 'Costa', 'Ferreira', 'Gomes', 'Lima', 'Martins', 'Oliveira', 'Pereira',
+    'Ribeiro', 'Rocha', 'Santos', 'Silva', 'Souza',
+]
+
+# Probabilidades de cada evento do ledger; o restante sao transferencias.
+DEPOSIT_RATE = 0.15
+REVERSE_RATE = 0.02
+
+LEDGER_FIELDS = [
+    'id', 'account', 'origin_account', 'destination_account', 'value', 'balance_after',
+    'type', 'description', 'created_at', 'related_transaction',
+]
+
+SNAPSHOT_FIELDS = [
+    'account', 'date', 'opening_balance', 'closing_balance', 'credits', 'debits', 'transaction_count',
+]
+
+
+def insert_sql(connection, model, fields):
+    columns = [connection.ops.quote_name(model._meta.get_field(name).column) for name in fields]
+    return 'INSERT INTO %s (%s) VALUES (%s)' % (
+        connection.ops.quote_name(model._meta.db_table), ', '.join(columns), ', '.join(['%s'] * len(columns))
+    )
+
+
+def _hash_password(args):
+    password, salt = args
+    return make_password(password, salt=salt)
+
+
+# Gera os hashes em paralelo com salts derivados da seed, para que a saida seja
+# reproduzivel. Um pool pequeno de hashes e reaproveitado entre os usuarios:
+# com o custo padrao do PBKDF2, um hash por usuario inviabiliza milhoes de linhas.
+def hash_password_pool(password, size, seed, workers=None):
+    salts = [hashlib.sha256(f'{seed}:{index}'.encode()).hexdigest()[:22] for index in range(size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        return list(pool.map(_hash_password, [(password, salt) for salt in salts]))
+
+
+class LedgerGenerator:
+
+    def __init__(self, seed, users, transactions, start, days, password_hashes, cpf_prefix='7', batch_size=5000):
+        self.rng = random.Random(seed)
+        self.users = users
+        self.transactions = transactions
+        self.start = timezone.make_aware(datetime.combine(start, time.min))
+        self.span = timedelta(days=days).total_seconds()
+        self.password_hashes = password_hashes
+        self.cpf_prefix = cpf_prefix
+        self.batch_size = batch_size
+
+    def build_users(self, offset, count):
+        rng = self.rng
+        return [
+            User(
+                email=f'user{index}@seed.local',
+                full_name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                cpf=f'{self.cpf_prefix}{index:010d}',
+                role=User.Role.USER,
+                password=self.password_hashes[index % len(self.password_hashes)],
+                date_joined=self.start,
+            )
+            for index in range(offset, offset + count)
+        ]
+
+    # Continua a numeracao de uma execucao anterior, ja que e-mail e CPF sao unicos.
+    # O CPF tem largura fixa, entao o maior como texto e tambem o maior indice.
+    def first_index(self):
+        last = User.objects.filter(
+            cpf__startswith=self.cpf_prefix, email__endswith='@seed.local'
+        ).aggregate(last=Max('cpf'))['last']
+        return int(last[len(self.cpf_prefix):]) + 1 if last else 0
+
+    def create_accounts(self, progress):
+        accounts = []
+        first = self.first_index()
+        progress('usuarios', 0)
+        for offset in range(0, self.users, self.batch_size):
+            # bulk_create nao dispara o post_save que cria a conta; criamos em lote aqui.
+            users = User.objects.bulk_create(self.build_users(first + offset, min(self.batch_size, self.users - offset)))
+            created = Account.objects.bulk_create([Account(user=user, balance=Decimal("0.00")) for user in users])
+            # auto_now_add grava o horario atual no INSERT; a data do inicio do
+            # periodo gerado vem em seguida, so nas contas deste lote.
+            Account.objects.filter(pk__in=[account.id for account in created]).update(created_at=self.start)
+            for account in created:
+                account.created_at = self.start
+            accounts.extend(created)
+            progress('usuarios', len(accounts))
+        return accounts
+
+    def events(self, account_ids, first_id):
+        rng = self.rng
+        # Atividade concentrada em poucas contas (distribuicao de Pareto), como
+        # em producao; a busca binaria nos pesos acumulados deixa cada sorteio em O(log n).
+        weights = list(accumulate(rng.paretovariate(1.2) for _ in account_ids))
+        total_weight = weights[-1]
+        balances = [Decimal("0.00")] * len(account_ids)
+        reversible = deque(maxlen=10000)
+        step = self.span / max(self.transactions, 1)
+        moment = 0.0
+        next_id = first_id
+
+        # Os eventos saem em ordem de tempo, entao os snapshots do dia corrente sao
+        # acumulados aqui e fechados na virada do dia, sem reler o ledger depois.
+        day = day_end = None
+        open_days = {}
+
+        def close_day():
+            for index, (opening, credits, debits, count) in open_days.items():
+                self.snapshots.append((account_ids[index], day, opening, balances[index], credits, debits, count))
+            open_days.clear()
+
+        def record(index, delta):
+            entry = open_days.get(index)
+            if entry is None:
+                entry = open_days[index] = [balances[index] - delta, Decimal("0.00"), Decimal("0.00"), 0]
+            entry[1 if delta > 0 else 2] += abs(delta)
+            entry[3] += 1
+
+        def pick():
+            return bisect(weights, rng.random() * total_weight)
+
+        while next_id - first_id < self.transactions:
+            # Estornos e transferencias geram duas linhas: com uma so restando, a
+            # ultima e um deposito e o total fica exato
+            paired = self.transactions - (next_id - first_id) > 1
+            moment += rng.expovariate(1 / step)
+            created_at = self.start + timedelta(seconds=min(moment, self.span))
+            if day_end is None or created_at >= day_end:
+                close_day()
+                day = timezone.localdate(created_at)
+                day_end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+            roll = rng.random()
+
+            if roll < REVERSE_RATE and reversible and paired:
+                sent_id, origin, destination, value = reversible.popleft()
+                if balances[destination] < value:
+                    continue
+                balances[destination] -= value
+                balances[origin] += value
+                record(origin, value)
+                record(destination, -value)
+                yield (
+                    next_id, account_ids[origin], None, None, value, balances[origin],
+                    Transaction.Type.ESTORNO, f'Estorno recebido: {sent_id}', created_at, sent_id
+                )
+                yield (
+                    next_id + 1, account_ids[destination], None, None, value, balances[destination],
+                    Transaction.Type.ESTORNO, f'Estorno enviado: {sent_id}', created_at, sent_id
+                )
+                next_id += 2
+                continue
+
+            origin = pick()
+            if roll < DEPOSIT_RATE + REVERSE_RATE or balances[origin] < 1 or not paired:
+                value = Decimal(rng.randint(50, 2000))
+                balances[origin] += value
+                record(origin, value)
+                yield (
+                    next_id, account_ids[origin], None, None, value, balances[origin],
+                    Transaction.Type.DEPÓSITO, '', created_at, None
+                )
+                next_id += 1
+                continue
+
+            destination = pick()
+            if destination == origin:
+                destination = (origin + 1) % len(account_ids)
+            value = min(balances[origin], Decimal(rng.randint(100, 50000)) / 100)
+            balances[origin] -= value
+            balances[destination] += value
+            record(origin, -value)
+            record(destination, value)
+            origin_id, destination_id = account_ids[origin], account_ids[destination]
+            yield (
+                next_id, origin_id, origin_id, destination_id, value, balances[origin],
+                Transaction.Type.ENVIO, '', created_at, None
+            )
+            yield (
+                next_id + 1, destination_id, origin_id, destination_id, value, balances[destination],
+                Transaction.Type.RECEBIMENTO, '', created_at, next_id
+            )
+            reversible.append((next_id, origin, destination, value))
+            next_id += 2
+
+        close_day()
+        self.balances = balances
+
+    # Com milhoes de linhas o custo do bulk_create fica na montagem dos objetos e do
+    # SQL pelo ORM; ledger e snapshots vao direto por executemany, com ids de
+    # transacao pre-alocados (o seed roda sem escritas concorrentes) e a sequencia
+    # ajustada no final.
+    def create_ledger(self, accounts, progress):
+        connection = connections[router.db_for_write(Transaction)]
+        adapt = connection.ops.adapt_datetimefield_value
+        insert_transactions = insert_sql(connection, Transaction, LEDGER_FIELDS)
+        insert_snapshots = insert_sql(connection, DailyBalanceSnapshot, SNAPSHOT_FIELDS)
+        first_id = (Transaction.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        self.snapshots = []
+        written = 0
+        progress('transacoes', 0)
+
+        with connection.cursor() as cursor:
+            rows = self.events([account.id for account in accounts], first_id)
+            while True:
+                batch = [row[:8] + (adapt(row[8]), row[9]) for row in islice(rows, self.batch_size)]
+                if batch:
+                    cursor.executemany(insert_transactions, batch)
+                    written += len(batch)
+                    progress('transacoes', written)
+                if self.snapshots and (len(self.snapshots) >= self.batch_size or not batch):
+                    cursor.executemany(insert_snapshots, self.snapshots)
+                    self.snapshots = []
+                if not batch:
+                    break
+
+            cursor.executemany(
+                'UPDATE %s SET %s = %%s WHERE %s = %%s' % (
+                    connection.ops.quote_name(Account._meta.db_table),
+                    connection.ops.quote_name('balance'),
+                    connection.ops.quote_name('id'),
+                ),
+                [(balance, account.id) for account, balance in zip(accounts, self.balances)]
+            )
+
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Transaction]):
+                cursor.execute(sql)
+
+        for account, balance in zip(accounts, self.balances):
+            account.balance = balance
+        return written
@@ -1,33 +1,33 @@
 from rest_framework import serializers
-from .models import User, Account, Transaction
-from django.db import transaction
+from .models import User, Account, Transaction, DailyBalanceSnapshot, StatementExport, ScheduledTransfer
+from django.urls import reverse
+from drf_spectacular.utils import extend_schema_field
+from drf_spectacular.types import OpenApiTypes
+from django.db import transaction, models
+from django.utils import timezone
 from decimal import Decimal
+from datetime import timedelta
 
 class UserSerializer(serializers.ModelSerializer):
 	class Meta:
 		model = User
 		fields = ['id', 'full_name', 'cpf', 'email', 'password', 'role']
 		read_only_fields = ['id']
+		# E-mail e CPF duplicados sao detectados pelas constraints do banco no INSERT
+		# (RegistrationService.register), sem as consultas dos UniqueValidator.
 		extra_kwargs = {
-			'password': {'write_only': True}
+			'password': {'write_only': True},
+			'email': {'validators': []},
+			'cpf': {'validators': []},
 		}
 
-	def validate_email(self, value):
-		if User.objects.filter(email=value).exists():
-			raise serializers.ValidationError('E-mail já cadastrado')
-		return value
-
-	def validate_cpf(self, value):
-		if User.objects.filter(cpf=value).exists():
-			raise serializers.ValidationError('CPF já cadastrado')
-		return value
-
 	def create(self, validated_data):
 		return User.objects.create_user(**validated_data)
 
 
 class AccountSerializer(serializers.ModelSerializer):
 	user = UserSerializer(read_only=True)
+	balance = serializers.DecimalField(source='total_balance', max_digits=12, decimal_places=2, read_only=True)
 
 	class Meta:
 		model = Account
@@ -57,20 +57,185 @@ class TransferSerializer(serializers.Serializer):
 		return value
 
 
-class TransactionStatementSerializer(serializers.ModelSerializer):
-	origin_name = serializers.CharField(source='origin_account.user.full_name', read_only=True)
-	destination_name = serializers.CharField(source='destination_account.user.full_name', read_only=True)
+class TransferBatchSerializer(serializers.Serializer):
+	MAX_ITEMS = 5000
+
+	class Mode(models.TextChoices):
+		ATOMIC = 'atomic', 'Tudo ou nada'
+		BEST_EFFORT = 'best_effort', 'Melhor esforço'
+
+	items = TransferSerializer(many=True, allow_empty=False, max_length=MAX_ITEMS)
+	mode = serializers.ChoiceField(choices=Mode.choices, default=Mode.ATOMIC)
+
 
+# Sem start_at, a primeira ocorrencia vence na hora (executada no proximo ciclo do scheduler)
+class ScheduledTransferRequestSerializer(TransferSerializer):
+	frequency = serializers.ChoiceField(choices=ScheduledTransfer.Frequency.choices, default=ScheduledTransfer.Frequency.UNICA)
+	start_at = serializers.DateTimeField(required=False)
+	ends_at = serializers.DateTimeField(required=False, allow_null=True)
+
+	def validate_start_at(self, value):
+		if value < timezone.now() - timedelta(minutes=5):
+			raise serializers.ValidationError("A data de início não pode estar no passado.")
+		return value
+
+	def validate(self, data):
+		data.setdefault('start_at', timezone.now())
+		if data.get('ends_at') and data['ends_at'] < data['start_at']:
+			raise serializers.ValidationError({'ends_at': 'A data final deve ser posterior à data de início.'})
+		return data
+
+
+class ScheduledTransferSerializer(serializers.ModelSerializer):
 	class Meta:
-		model = Transaction
+		model = ScheduledTransfer
 		fields = [
 			'id',
-			'type',
+			'destination_account',
 			'value',
 			'description',
+			'frequency',
+			'start_at',
+			'ends_at',
+			'status',
+			'next_run_at',
+			'runs',
+			'attempts',
+			'last_error',
+			'last_run_at',
+			'last_transfer_id',
+			'created_at'
+		]
+		read_only_fields = fields
+
+
+# Sem senha, o usuario e criado com senha inutilizavel (definida depois)
+class BulkUserSerializer(UserSerializer):
+	class Meta(UserSerializer.Meta):
+		extra_kwargs = {
+			**UserSerializer.Meta.extra_kwargs,
+			'password': {'write_only': True, 'required': False},
+		}
+
+
+class BulkRegistrationSerializer(serializers.Serializer):
+	MAX_ITEMS = 5000
+
+	class Mode(models.TextChoices):
+		ATOMIC = 'atomic', 'Tudo ou nada'
+		BEST_EFFORT = 'best_effort', 'Melhor esforço'
+
+	users = BulkUserSerializer(many=True, allow_empty=False, max_length=MAX_ITEMS)
+	mode = serializers.ChoiceField(choices=Mode.choices, default=Mode.ATOMIC)
+
+
+# Serializer plano e somente leitura: os nomes de origem/destino chegam anotados
+# pela consulta do extrato (statement_queryset), sem acessar relacoes por linha.
+class TransactionStatementSerializer(serializers.Serializer):
+	id = serializers.IntegerField(read_only=True)
+	type = serializers.CharField(read_only=True)
+	value = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+	description = serializers.CharField(read_only=True)
+	created_at = serializers.DateTimeField(read_only=True)
+	balance_after = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+	origin_name = serializers.CharField(read_only=True)
+	destination_name = serializers.CharField(read_only=True)
+
+
+class DailyBalanceSnapshotSerializer(serializers.ModelSerializer):
+	class Meta:
+		model = DailyBalanceSnapshot
+		fields = [
+			'date',
+			'opening_balance',
+			'closing_balance',
+			'credits',
+			'debits',
+			'transaction_count'
+		]
+		read_only_fields = fields
+
+
+class BalanceAtDateSerializer(serializers.Serializer):
+	date = serializers.DateField(read_only=True)
+	balance = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
+
+class StatementBalancesSerializer(serializers.Serializer):
+	date_start = serializers.DateField(read_only=True)
+	date_end = serializers.DateField(read_only=True)
+	opening_balance = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+	closing_balance = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+	days = DailyBalanceSnapshotSerializer(many=True, read_only=True)
+
+
+class TypeSummarySerializer(serializers.Serializer):
+	type = serializers.CharField(read_only=True)
+	count = serializers.IntegerField(read_only=True)
+	total = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+
+
+class SummaryBucketSerializer(serializers.Serializer):
+	start = serializers.DateField(read_only=True)
+	count = serializers.IntegerField(read_only=True)
+	credits = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+	debits = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+	net = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+	types = TypeSummarySerializer(many=True, read_only=True)
+
+
+class StatementSummarySerializer(serializers.Serializer):
+	date_start = serializers.DateField(read_only=True)
+	date_end = serializers.DateField(read_only=True)
+	bucket = serializers.CharField(read_only=True)
+	opening_balance = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+	closing_balance = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+	count = serializers.IntegerField(read_only=True)
+	credits = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+	debits = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+	net = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+	types = TypeSummarySerializer(many=True, read_only=True)
+	buckets = SummaryBucketSerializer(many=True, read_only=True)
+
+class StatementExportRequestSerializer(serializers.Serializer):
+	format = serializers.ChoiceField(choices=StatementExport.Format.choices)
+	date_start = serializers.DateField(required=False)
+	date_end = serializers.DateField(required=False)
+	type = serializers.ChoiceField(choices=Transaction.Type.choices, required=False)
+
+	def validate(self, data):
+		if 'date_start' in data and 'date_end' in data and data['date_end'] < data['date_start']:
+			raise serializers.ValidationError({'date_end': 'A data final deve ser posterior à data inicial.'})
+		return data
+
+	# Filtros no formato aceito por statement_queryset (strings, como na query string)
+	def filters(self):
+		return {key: str(value) for key, value in self.validated_data.items() if key != 'format'}
+
+
+class StatementExportSerializer(serializers.ModelSerializer):
+	download_url = serializers.SerializerMethodField()
+
+	class Meta:
+		model = StatementExport
+		fields = [
+			'id',
+			'account',
+			'format',
+			'filters',
+			'status',
+			'row_count',
+			'file_size',
+			'error',
 			'created_at',
-			'balance_after',
-			'origin_name',
-			'destination_name'
+			'started_at',
+			'finished_at',
+			'download_url'
 		]
+		read_only_fields = fields
 
+	@extend_schema_field(OpenApiTypes.STR)
+	def get_download_url(self, obj):
+		if obj.status != StatementExport.Status.CONCLUIDO:
+			return None
+		return reverse('admin_statement_export_download', kwargs={'id': obj.pk})
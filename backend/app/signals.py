@@ -1,6 +1,18 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from .models import User, Account
+from .recipients import invalidate_recipient
+from .authentication import revoke_tokens
+from .balance_cache import invalidate_account
+from .instrumentation import install_query_router
+
+# Campos copiados para as claims do JWT (ou que devem derrubar sessoes abertas).
+TOKEN_FIELDS = {
+    User: ('role', 'is_active', 'password'),
+    Account: ('status', 'shard_count'),
+}
 
 @receiver(post_save, sender=User)
 def create_user_account(sender, instance, created, **kwargs):
@@ -10,3 +22,65 @@ def create_user_account(sender, instance, created, **kwargs):
             balance=0.00,
             status='ativo'
         )
+
+
+# Invalidacao so depois do commit: antes dele, outra requisicao ainda le a linha
+# antiga e poderia coloca-la de volta no cache ate o TTL.
+def _invalidate_on_commit(user_id, account_id=None):
+    def invalidate():
+        invalidate_recipient(user_id)
+        invalidate_account(user_id, account_id)
+
+    transaction.on_commit(invalidate)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_caches(sender, instance, **kwargs):
+    _invalidate_on_commit(instance.pk)
+
+
+# save() de Account pode gravar o saldo direto (admin, scripts): descarta os dois.
+@receiver([post_save, post_delete], sender=Account)
+def invalidate_account_caches(sender, instance, **kwargs):
+    _invalidate_on_commit(instance.user_id, instance.pk)
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=Account)
+def track_token_fields(sender, instance, update_fields=None, **kwargs):
+    fields = TOKEN_FIELDS[sender]
+    if update_fields is not None:
+        fields = [field for field in fields if field in update_fields]
+    # Rehash no login (User.check_password): mesmo valor de senha, outro hash
+    if getattr(instance, '_rehashed', False):
+        fields = [field for field in fields if field != 'password']
+
+    if instance._state.adding or not fields:
+        instance._revoke_tokens = False
+        return
+
+    current = sender.objects.filter(pk=instance.pk).values(*fields).first()
+    instance._revoke_tokens = current is not None and any(
+        current[field] != getattr(instance, field) for field in fields
+    )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Account)
+def revoke_changed_tokens(sender, instance, **kwargs):
+    if not getattr(instance, '_revoke_tokens', False):
+        return
+
+    revoke_tokens(instance.pk if sender is User else instance.user_id)
+
+    # O UPDATE incrementou token_version no banco; a instancia em memoria ficaria
+    # com a versao antiga e um save() seguinte a gravaria de volta, desfazendo a
+    # revogacao.
+    if sender is Account:
+        if not Account.user.is_cached(instance):
+            return
+        instance = instance.user
+    instance.refresh_from_db(fields=['token_version'])
+
+
+connection_created.connect(install_query_router)
@@ -0,0 +1,189 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Case, When, Value, Count, Sum, DateField, DecimalField
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .archive import archived_transactions, archived_summary
+from .ledger import credit_condition
+from .models import Transaction
+
+
+def parse_statement_date(value, param):
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+
+    if parsed is None:
+        raise ValidationError({param: 'Data inválida. Use o formato YYYY-MM-DD.'})
+
+    return parsed
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+# Os filtros de data viram intervalos [inicio, fim) sobre created_at em vez de
+# created_at__date, para que o banco use os indices compostos por conta.
+def statement_bounds(params):
+    date_start = params.get('date_start')
+    date_end = params.get('date_end')
+    start = day_start(parse_statement_date(date_start, 'date_start')) if date_start else None
+    end = day_start(parse_statement_date(date_end, 'date_end') + timedelta(days=1)) if date_end else None
+
+    return start, end, params.get('type')
+
+
+def filter_statement(transactions, params):
+    start, end, transaction_type = statement_bounds(params)
+
+    if start:
+        transactions = transactions.filter(created_at__gte=start)
+
+    if end:
+        transactions = transactions.filter(created_at__lt=end)
+
+    if transaction_type:
+        transactions = transactions.filter(type=transaction_type)
+
+    return transactions
+
+
+def statement_queryset(account, params, descending=False):
+    ordering = ('-created_at', '-id') if descending else ('created_at', 'id')
+    transactions = Transaction.objects.filter(account=account).annotate(
+        origin_name=F('origin_account__user__full_name'),
+        destination_name=F('destination_account__user__full_name'),
+    ).order_by(*ordering)
+
+    return filter_statement(transactions, params)
+
+
+# Linhas do extrato que estao no arquivo morto (app/archive.py), com os mesmos
+# filtros. So os meses que cruzam o periodo sao lidos; para periodos dentro da
+# tabela quente a consulta nao encontra nenhum segmento.
+def archived_statement(account, params, descending=False, after=None, using=None):
+    start, end, transaction_type = statement_bounds(params)
+    return archived_transactions(account.id, start, end, transaction_type, descending, after, using)
+
+
+SUMMARY_BUCKETS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+# Inicio do bucket de uma data, como os Trunc acima (usado nas linhas arquivadas)
+BUCKET_STARTS = {
+    'day': lambda day: day,
+    'week': lambda day: day - timedelta(days=day.weekday()),
+    'month': lambda day: day.replace(day=1),
+}
+
+ZERO = Decimal("0.00")
+
+
+def _signed_sum(credit):
+    condition = credit_condition() if credit else ~credit_condition()
+    return Sum(
+        Case(When(condition, then=F('value')), default=Value(ZERO)),
+        output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
+
+
+# Totais por bucket e tipo em uma unica consulta GROUP BY sobre o indice
+# (conta, created_at): nenhuma linha do extrato sai do banco. Meses arquivados do
+# periodo sao somados a parte e juntados por (bucket, tipo).
+def statement_summary(account, date_start, date_end, bucket):
+    trunc = SUMMARY_BUCKETS[bucket]
+    start = day_start(date_start)
+    end = day_start(date_end + timedelta(days=1))
+    rows = Transaction.objects.filter(
+        account=account,
+        created_at__gte=start,
+        created_at__lt=end,
+    ).annotate(
+        bucket=trunc('created_at', output_field=DateField())
+    ).values('bucket', 'type').annotate(
+        count=Count('id'),
+        total=Sum('value'),
+        credits=_signed_sum(credit=True),
+        debits=_signed_sum(credit=False),
+    ).order_by('bucket', 'type')
+
+    archived = archived_summary(account.id, start, end, BUCKET_STARTS[bucket])
+    if archived:
+        rows = _merge_summary_rows(archived, rows)
+
+    totals = {value: {'type': value, 'count': 0, 'total': ZERO} for value in Transaction.Type.values}
+    buckets = {}
+
+    for row in rows:
+        entry = buckets.setdefault(row['bucket'], {
+            'start': row['bucket'], 'count': 0, 'credits': ZERO, 'debits': ZERO, 'types': []
+        })
+        entry['count'] += row['count']
+        entry['credits'] += row['credits']
+        entry['debits'] += row['debits']
+        entry['types'].append({'type': row['type'], 'count': row['count'], 'total': row['total']})
+
+        totals[row['type']]['count'] += row['count']
+        totals[row['type']]['total'] += row['total']
+
+    for entry in buckets.values():
+        entry['net'] = entry['credits'] - entry['debits']
+
+    credits = sum((entry['credits'] for entry in buckets.values()), ZERO)
+    debits = sum((entry['debits'] for entry in buckets.values()), ZERO)
+
+    return {
+        'date_start': date_start,
+        'date_end': date_end,
+        'bucket': bucket,
+        'count': sum(entry['count'] for entry in buckets.values()),
+        'credits': credits,
+        'debits': debits,
+        'net': credits - debits,
+        'types': list(totals.values()),
+        'buckets': list(buckets.values()),
+    }
+
+
+def _merge_summary_rows(*sources):
+    merged = {}
+    for source in sources:
+        for row in source:
+            key = (row['bucket'], row['type'])
+            if key in merged:
+                for field in ('count', 'total', 'credits', 'debits'):
+                    merged[key][field] += row[field]
+            else:
+                merged[key] = dict(row)
+    return [merged[key] for key in sorted(merged)]
+
+
+def is_closed_period(date_end):
+    return date_end < timezone.localdate()
+
+
+# Periodos encerrados nao mudam (estornos geram transacoes novas, na data do
+# estorno), entao o resumo serializado fica em cache por mais tempo.
+def _summary_key(account_id, date_start, date_end, bucket):
+    return f'statement:summary:{account_id}:{date_start}:{date_end}:{bucket}'
+
+
+def cached_statement_summary(account_id, date_start, date_end, bucket):
+    return cache.get(_summary_key(account_id, date_start, date_end, bucket))
+
+
+def remember_statement_summary(account_id, date_start, date_end, bucket, data):
+    cache.set(
+        _summary_key(account_id, date_start, date_end, bucket), data, settings.STATEMENT_SUMMARY_CACHE_TTL
+    )
@@ -0,0 +1,135 @@
+import json
+from itertools import chain, islice
+
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+from .instrumentation import serializer_timer
+
+
+STREAM_CONTENT_TYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+STREAM_CHUNK_SIZE = 2000
+
+
+def _encode(data):
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False)
+
+
+def _serialized_rows(rows, serializer_class, chunk_size):
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        for data in serializer_class(chunk, many=True).data:
+            yield _encode(data)
+
+
+def _json_array(rows):
+    yield '['
+    first = True
+    for row in rows:
+        yield row if first else ',' + row
+        first = False
+    yield ']'
+
+
+def _ndjson(rows):
+    for row in rows:
+        yield row + '\n'
+
+
+# archived: linhas anteriores as do queryset (meses arquivados, app/archive.py),
+# transmitidas antes dele, ou depois na ordem decrescente.
+def stream_queryset(queryset, serializer_class, stream_format, chunk_size=STREAM_CHUNK_SIZE, archived=(), descending=False):
+    if stream_format not in STREAM_CONTENT_TYPES:
+        raise ValidationError({'stream': 'Formato inválido. Use json ou ndjson.'})
+
+    # O conteudo e lido depois que a view retorna, fora do contexto em que o
+    # roteador escolheu o banco (app/routing.py): o alias fica fixado agora.
+    queryset = queryset.using(queryset.db)
+    # iterator() usa cursor do lado do servidor quando o banco suporta (PostgreSQL),
+    # entao a memoria fica limitada ao tamanho do chunk.
+    rows = queryset.iterator(chunk_size=chunk_size)
+    rows = chain(rows, archived) if descending else chain(archived, rows)
+    rows = _serialized_rows(rows, serializer_class, chunk_size)
+    content = _json_array(rows) if stream_format == 'json' else _ndjson(rows)
+
+    return StreamingHttpResponse(content, content_type=STREAM_CONTENT_TYPES[stream_format])
+
+
+# Linhas arquivadas (iterador sincrono, que descompacta um segmento por vez) lidas
+# em chunks, um sync_to_async por chunk: o ORM sincrono nao roda no loop de eventos
+# e so um chunk fica em memoria, como no chain() de stream_queryset.
+async def _aarchived(archived, chunk_size):
+    archived = iter(archived)
+    next_chunk = sync_to_async(lambda: list(islice(archived, chunk_size)))
+
+    while chunk := await next_chunk():
+        for row in chunk:
+            yield row
+
+
+async def arows(queryset, archived, descending, chunk_size=STREAM_CHUNK_SIZE):
+    hot = queryset.aiterator(chunk_size=chunk_size)
+    cold = _aarchived(archived, chunk_size)
+
+    for source in ((hot, cold) if descending else (cold, hot)):
+        async for row in source:
+            yield row
+
+
+# Serializa em chunks: so os dicts de um chunk e as instancias dele ficam em memoria
+async def aserialized_chunks(rows, serializer_class, chunk_size=STREAM_CHUNK_SIZE):
+    chunk = []
+    async for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            with serializer_timer():
+                data = serializer_class(chunk, many=True).data
+            yield data
+            chunk = []
+
+    if chunk:
+        with serializer_timer():
+            data = serializer_class(chunk, many=True).data
+        yield data
+
+
+async def _aserialized_rows(rows, serializer_class, chunk_size):
+    async for data in aserialized_chunks(rows, serializer_class, chunk_size):
+        for item in data:
+            yield _encode(item)
+
+
+async def _ajson_array(rows):
+    yield '['
+    first = True
+    async for row in rows:
+        yield row if first else ',' + row
+        first = False
+    yield ']'
+
+
+async def _andjson(rows):
+    async for row in rows:
+        yield row + '\n'
+
+
+# Versao para views async: o StreamingHttpResponse consome o iterador async sem
+# ocupar uma thread durante a transmissao. archived e o mesmo iterador sincrono de
+# stream_queryset, lido aos poucos por _aarchived.
+def astream_queryset(queryset, serializer_class, stream_format, chunk_size=STREAM_CHUNK_SIZE, archived=(), descending=False):
+    if stream_format not in STREAM_CONTENT_TYPES:
+        raise ValidationError({'stream': 'Formato inválido. Use json ou ndjson.'})
+
+    queryset = queryset.using(queryset.db)
+    rows = _aserialized_rows(arows(queryset, archived, descending, chunk_size), serializer_class, chunk_size)
+    content = _ajson_array(rows) if stream_format == 'json' else _andjson(rows)
+
+    return StreamingHttpResponse(content, content_type=STREAM_CONTENT_TYPES[stream_format])
@@ -0,0 +1,38 @@
+from decimal import Decimal
+
+from app.authentication import AccountTokenObtainPairSerializer
+from app.models import User, Account, Transaction
+
+
+# CPFs comecando em 9 com offset por grupo, para nao colidir com o seed (7...).
+def create_users(prefix, count, offset, role=User.Role.USER):
+    users = User.objects.bulk_create([
+        User(
+            email=f'{prefix}-{index}@tests.local',
+            full_name=f'{prefix} {index}',
+            cpf=f'9{offset + index:010d}',
+            role=role,
+            password='!',
+        )
+        for index in range(count)
+    ])
+    Account.objects.bulk_create([Account(user=user) for user in users])
+    return users
+
+
+def create_statement(owner, counterpart, rows):
+    Transaction.objects.bulk_create([
+        Transaction(
+            account=owner.account,
+            origin_account=owner.account if index % 2 else None,
+            destination_account=counterpart.account if index % 2 else None,
+            value=Decimal('1.00'),
+            balance_after=Decimal('1.00'),
+            type=Transaction.Type.ENVIO if index % 2 else Transaction.Type.DEPÓSITO,
+        )
+        for index in range(rows)
+    ], batch_size=1000)
+
+
+def access_token(user):
+    return str(AccountTokenObtainPairSerializer.get_token(user).access_token)
@@ -0,0 +1,89 @@
+import json
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from app.archive import archive_range, add_months, month_bound, month_start
+from app.models import Account, Transaction
+from app.streaming import arows
+from .factories import create_users, create_statement, access_token
+
+
+# Extrato com meses arquivados: as rotas async devolvem o mesmo que as sincronas
+class AsyncStatementTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner, counterpart = create_users('owner', 2, offset=0)
+        create_statement(cls.owner, counterpart, 90)
+        account = Account.objects.get(user=cls.owner)
+
+        # Um terco das linhas em cada um dos dois meses anteriores; esses vao para o arquivo
+        current = month_start(timezone.localdate())
+        ids = list(Transaction.objects.filter(account=account).order_by('id').values_list('id', flat=True))
+        for months, chunk in ((-2, ids[:30]), (-1, ids[30:60])):
+            moment = month_bound(add_months(current, months))
+            for offset, transaction_id in enumerate(chunk):
+                Transaction.objects.filter(id=transaction_id).update(created_at=moment + timedelta(hours=offset))
+        archive_range(account.id, account.id, current)
+        assert Transaction.objects.filter(account=account).count() == 30
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access_token(self.owner)}')
+
+    # As views async respondem com um iterador assincrono no stream
+    def get(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        if not response.streaming:
+            return response.content.decode()
+        if response.is_async:
+            async def consume(content):
+                return [chunk async for chunk in content]
+            return b''.join(async_to_sync(consume)(response.streaming_content)).decode()
+        return b''.join(response.streaming_content).decode()
+
+    def test_full_statement_matches(self):
+        sync = json.loads(self.get('/api/account/statement/'))
+        self.assertEqual(len(sync), 90)
+        self.assertEqual(json.loads(self.get('/api/async/account/statement/')), sync)
+
+    def test_stream_matches(self):
+        sync = self.get('/api/account/statement/?stream=ndjson')
+        self.assertEqual(len(sync.splitlines()), 90)
+        self.assertEqual(self.get('/api/async/account/statement/?stream=ndjson'), sync)
+
+    def test_pages_match(self):
+        cursor = ''
+        while True:
+            sync = json.loads(self.get(f'/api/account/statement/?page_size=40{cursor}'))
+            self.assertEqual(json.loads(self.get(f'/api/async/account/statement/?page_size=40{cursor}')), sync)
+            if not sync['next_cursor']:
+                break
+            cursor = f"&cursor={sync['next_cursor']}"
+
+
+class ArchivedRowsTests(TestCase):
+
+    # As linhas arquivadas sao lidas do iterador aos poucos, um chunk por vez
+    def test_archived_rows_are_read_lazily(self):
+        consumed = []
+
+        def archived():
+            for index in range(100):
+                consumed.append(index)
+                yield index
+
+        async def first_rows():
+            rows = arows(Transaction.objects.none(), archived(), descending=False, chunk_size=10)
+            first = [await anext(rows) for _ in range(5)]
+            await rows.aclose()
+            return first
+
+        self.assertEqual(async_to_sync(first_rows)(), [0, 1, 2, 3, 4])
+        self.assertEqual(len(consumed), 10)
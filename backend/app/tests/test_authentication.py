@@ -0,0 +1,86 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from app.authentication import AccountUser
+from app.models import User, Account
+from app.recipients import recipient_cache, resolve_recipient
+from app.services import DepositService, TransferService
+from .factories import create_users, access_token
+
+
+class TokenRevocationTests(TestCase):
+
+    def setUp(self):
+        self.user = create_users('user', 1, offset=0)[0]
+        self.token = access_token(self.user)
+
+    def balance_status(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        with self.captureOnCommitCallbacks(execute=True):
+            return client.get('/api/account/balance/').status_code
+
+    # Um save() posterior da mesma instancia nao pode regravar a versao antiga
+    def test_later_save_keeps_user_revocation(self):
+        self.user.role = User.Role.ADMIN
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.user.token_version, 1)
+
+        self.user.full_name = 'Outro nome'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        self.assertEqual(User.objects.get(pk=self.user.pk).token_version, 1)
+        self.assertEqual(self.balance_status(), 401)
+
+    def test_later_save_keeps_account_revocation(self):
+        account = Account.objects.select_related('user').get(user=self.user)
+        account.status = Account.Status.INATIVO
+        with self.captureOnCommitCallbacks(execute=True):
+            account.save()
+
+        account.user.full_name = 'Outro nome'
+        with self.captureOnCommitCallbacks(execute=True):
+            account.user.save()
+
+        self.assertEqual(User.objects.get(pk=self.user.pk).token_version, 1)
+        self.assertEqual(self.balance_status(), 401)
+
+
+# shard_count vai nas claims (account_shards): shard_account precisa revogar os tokens
+class ShardedAccountTokenTests(TestCase):
+
+    def setUp(self):
+        self.owner, self.payer = create_users('hot', 2, offset=300)
+        DepositService.execute_deposit(self.owner.account, Decimal('10.00'))
+        DepositService.execute_deposit(self.payer.account, Decimal('100.00'))
+        self.token = access_token(self.owner)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('shard_account', self.owner.account.id, shards=4, stdout=StringIO())
+
+        recipient_cache.clear()
+        TransferService.execute_transfer(self.payer.account, resolve_recipient(self.owner.email), Decimal('50.00'), '')
+
+    def test_token_issued_before_sharding_is_revoked(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(client.get('/api/account/balance/').status_code, 401)
+
+        self.assertEqual(AccessToken(access_token(self.owner))['account_shards'], 4)
+
+    # Enquanto a versao antiga ainda estiver em cache em outro processo, a conta
+    # montada pelas claims antigas (shard_count=0) debita varrendo os sub-saldos
+    def test_stale_claims_still_sweep_shards(self):
+        account = AccountUser(AccessToken(self.token)).account
+        self.assertEqual(account.shard_count, 0)
+
+        sent, _ = TransferService.execute_transfer(account, self.payer.account, Decimal('40.00'), '')
+
+        self.assertEqual(sent.balance_after, Decimal('20.00'))
+        self.assertEqual(Account.objects.get(pk=account.pk).total_balance, Decimal('20.00'))
@@ -0,0 +1,85 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from app.balance_cache import cached_account, remember_account
+from app.models import Account, AccountBalanceShard
+from app.services import DepositService
+from .factories import create_users, access_token
+
+
+class BalanceCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_users('user', 1, offset=0)[0]
+        self.account = Account.objects.get(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access_token(self.user)}')
+
+    def balance(self):
+        response = self.client.get('/api/account/balance/')
+        self.assertEqual(response.status_code, 200)
+        return Decimal(response.data['balance'])
+
+    def deposit(self, account, value):
+        with self.captureOnCommitCallbacks(execute=True):
+            DepositService.execute_deposit(account, Decimal(value))
+
+    def test_deposit_invalidates_cached_balance(self):
+        self.assertEqual(self.balance(), Decimal('0.00'))
+        self.deposit(self.account, '10.00')
+        self.assertEqual(self.balance(), Decimal('10.00'))
+
+    # Leitura do banco antes de um commit concorrente: a entrada gravada depois do
+    # commit tem a versao antiga e nao e servida
+    def test_read_before_commit_is_not_served(self):
+        data, version = cached_account(self.user.pk, self.account.id)
+        self.assertIsNone(data)
+        stale = {'id': self.account.id, 'balance': '0.00'}
+
+        self.deposit(self.account, '10.00')
+        remember_account(self.user.pk, self.account.id, version, stale)
+
+        self.assertEqual(cached_account(self.user.pk, self.account.id)[0], None)
+        self.assertEqual(self.balance(), Decimal('10.00'))
+
+    # Em contas com sub-saldos o balance_after pode nao incluir creditos concorrentes
+    def test_sharded_account_balance_comes_from_database(self):
+        AccountBalanceShard.objects.bulk_create([AccountBalanceShard(account=self.account, index=index) for index in range(2)])
+        Account.objects.filter(pk=self.account.pk).update(shard_count=2)
+        account = Account.objects.get(pk=self.account.pk)
+
+        self.deposit(account, '10.00')
+        AccountBalanceShard.objects.filter(account=account, index=0).update(balance=Decimal('5.00'))
+        self.deposit(account, '1.00')
+        # Credito concorrente (outro sub-saldo) depois do ultimo deposito: o saldo
+        # vem do banco, nao do balance_after
+        AccountBalanceShard.objects.filter(account=account, index=1).update(balance=Decimal('7.00'))
+
+        self.assertEqual(self.balance(), account.balance + Account.objects.with_balance().get(pk=account.pk).sharded_balance)
+
+
+class ETagTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        user = create_users('user', 1, offset=0)[0]
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access_token(user)}')
+        self.etag = self.client.get('/api/account/balance/')['ETag']
+
+    def status_for(self, if_none_match):
+        return self.client.get('/api/account/balance/', HTTP_IF_NONE_MATCH=if_none_match).status_code
+
+    def test_exact_match(self):
+        self.assertEqual(self.status_for(self.etag), 304)
+        self.assertEqual(self.status_for(f'"outro", {self.etag}'), 304)
+        self.assertEqual(self.status_for(f'W/{self.etag}'), 304)
+        self.assertEqual(self.status_for('*'), 304)
+
+    def test_substring_does_not_match(self):
+        self.assertEqual(self.status_for(f'"x{self.etag.strip(chr(34))}x"'), 200)
+        self.assertEqual(self.status_for(self.etag.strip('"')), 200)
+        self.assertEqual(self.status_for('"outro"'), 200)
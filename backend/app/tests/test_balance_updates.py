@@ -0,0 +1,95 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from rest_framework.exceptions import ValidationError
+from app.models import Account, Transaction
+from app.services import DepositService, ReverseService, TransferService
+from .factories import create_users
+
+
+# UPDATE ... SET balance = balance + delta WHERE balance >= -delta RETURNING balance
+class ConditionalBalanceUpdateTests(TestCase):
+
+    def setUp(self):
+        self.sender, self.receiver = create_users('update', 2, offset=700)
+        self.account = self.sender.account
+        DepositService.execute_deposit(self.account, Decimal('50.00'))
+
+    def balance(self, account):
+        return Account.objects.get(pk=account.pk).balance
+
+    def test_debit_beyond_balance_changes_nothing(self):
+        self.assertIsNone(Account.objects.adjust_balance(self.account, Decimal('-50.01'), require_funds=True))
+        self.assertEqual(self.balance(self.account), Decimal('50.00'))
+
+        with self.assertRaisesMessage(ValidationError, "Saldo insuficiente. Saldo atual: 50.00"):
+            TransferService.execute_transfer(self.account, self.receiver.account, Decimal('50.01'), '')
+        self.assertEqual(self.balance(self.account), Decimal('50.00'))
+        self.assertEqual(self.balance(self.receiver.account), Decimal('0.00'))
+        self.assertFalse(Transaction.objects.filter(type=Transaction.Type.ENVIO).exists())
+
+    def test_debit_of_exact_balance(self):
+        sent, received = TransferService.execute_transfer(self.account, self.receiver.account, Decimal('50.00'), '')
+
+        self.assertEqual((sent.balance_after, received.balance_after), (Decimal('0.00'), Decimal('50.00')))
+        self.assertEqual(self.balance(self.account), Decimal('0.00'))
+        self.assertIsNone(Account.objects.adjust_balance(self.account, Decimal('-0.01'), require_funds=True))
+
+    # Bancos sem RETURNING: UPDATE seguido de leitura, com o mesmo resultado
+    def test_fallback_without_returning(self):
+        with mock.patch.object(connection.features, 'can_return_columns_from_insert', False):
+            self.assertEqual(
+                Account.objects.adjust_balance(self.account, Decimal('-20.00'), require_funds=True), Decimal('30.00')
+            )
+            self.assertIsNone(Account.objects.adjust_balance(self.account, Decimal('-30.01'), require_funds=True))
+
+        self.assertEqual(self.balance(self.account), Decimal('30.00'))
+
+
+class ReverseTests(TestCase):
+
+    def setUp(self):
+        self.sender, self.receiver = create_users('reverse', 2, offset=800)
+        DepositService.execute_deposit(self.sender.account, Decimal('50.00'))
+        self.sent, _ = TransferService.execute_transfer(self.sender.account, self.receiver.account, Decimal('30.00'), '')
+
+    def balances(self):
+        return tuple(Account.objects.get(user=user).balance for user in (self.sender, self.receiver))
+
+    def test_reverse_moves_value_back(self):
+        reverse_sender, reverse_receiver = ReverseService.execute_reverse(self.sent.id)
+
+        self.assertEqual((reverse_sender.balance_after, reverse_receiver.balance_after), (Decimal('50.00'), Decimal('0.00')))
+        self.assertEqual(self.balances(), (Decimal('50.00'), Decimal('0.00')))
+
+    def test_receiver_without_funds(self):
+        TransferService.execute_transfer(self.receiver.account, self.sender.account, Decimal('10.00'), '')
+
+        with self.assertRaisesMessage(ValidationError, "Destinatário não possui saldo suficiente para o estorno."):
+            ReverseService.execute_reverse(self.sent.id)
+        self.assertEqual(self.balances(), (Decimal('30.00'), Decimal('20.00')))
+
+    # Estorno concorrente confirmado enquanto este esperava os locks das contas: a
+    # checagem inicial passa, a refeita depois dos UPDATEs desfaz tudo. O deposito
+    # garante que o segundo debito do destinatario passaria; aqui o estorno
+    # concorrente roda na mesma conexao e e desfeito junto.
+    def test_reverse_rechecks_after_locking(self):
+        DepositService.execute_deposit(self.receiver.account, Decimal('30.00'))
+        apply_deltas = TransferService._apply_deltas
+        calls = []
+
+        def concurrent_reverse(deltas, insufficient_message):
+            calls.append(deltas)
+            if len(calls) == 1:
+                ReverseService.execute_reverse(self.sent.id)
+            return apply_deltas(deltas, insufficient_message)
+
+        with mock.patch.object(TransferService, '_apply_deltas', side_effect=concurrent_reverse):
+            with self.assertRaisesMessage(ValidationError, "Transferência já estornada."):
+                ReverseService.execute_reverse(self.sent.id)
+
+        self.assertEqual(len(calls), 2)
+        self.assertFalse(Transaction.objects.filter(type=Transaction.Type.ESTORNO).exists())
+        self.assertEqual(self.balances(), (Decimal('20.00'), Decimal('60.00')))
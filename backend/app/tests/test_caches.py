@@ -0,0 +1,23 @@
+from django.test import TestCase
+from app.models import Account
+from app.recipients import resolve_recipient, recipient_cache
+from .factories import create_users
+
+
+class CacheInvalidationTests(TestCase):
+
+    def setUp(self):
+        recipient_cache.clear()
+        self.user = create_users('user', 1, offset=0)[0]
+
+    # Ate o commit o cache continua com a linha antiga; a invalidacao roda depois dele
+    def test_recipient_cache_is_invalidated_on_commit(self):
+        resolve_recipient(self.user.email)
+        key = ('email', self.user.email)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Account.objects.filter(user=self.user).get().save(update_fields=['status'])
+            self.assertIsNotNone(recipient_cache.get(key))
+
+        self.assertTrue(callbacks)
+        self.assertIsNone(recipient_cache.get(key))
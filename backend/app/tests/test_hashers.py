@@ -0,0 +1,94 @@
+import threading
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from app import hashers
+from app.hashers import hash_password, hash_passwords
+from app.models import User
+from .factories import create_users, access_token
+
+
+class RehashOnLoginTests(TestCase):
+
+    def setUp(self):
+        self.user = create_users('login', 1, offset=1100)[0]
+
+    def login(self, password):
+        with self.captureOnCommitCallbacks(execute=True):
+            return APIClient().post('/api/auth/login/', {'email': self.user.email, 'password': password}, format='json')
+
+    def stored_hash(self):
+        return User.objects.get(pk=self.user.pk).password
+
+    def assertRehashedOnLogin(self, legacy_hash):
+        User.objects.filter(pk=self.user.pk).update(password=legacy_hash)
+        token = access_token(self.user)
+
+        self.assertEqual(self.login('senha-antiga').status_code, 200)
+
+        self.assertTrue(self.stored_hash().startswith('scrypt$'))
+        self.assertNotEqual(self.stored_hash(), legacy_hash)
+        self.assertEqual(self.login('senha-antiga').status_code, 200)
+
+        # A senha e a mesma: o rehash nao derruba os tokens abertos
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(client.get('/api/account/balance/').status_code, 200)
+
+    def test_legacy_algorithm_is_rehashed(self):
+        self.assertRehashedOnLogin(make_password('senha-antiga', hasher='pbkdf2_sha1'))
+
+    def test_outdated_parameters_are_rehashed(self):
+        hasher = hashers.TunedScryptPasswordHasher()
+        hasher.work_factor = 2 ** 10
+        self.assertRehashedOnLogin(hasher.encode('senha-antiga', hasher.salt()))
+
+    def test_wrong_password_keeps_hash(self):
+        legacy_hash = make_password('senha-antiga', hasher='pbkdf2_sha1')
+        User.objects.filter(pk=self.user.pk).update(password=legacy_hash)
+
+        self.assertEqual(self.login('outra-senha').status_code, 401)
+        self.assertEqual(self.stored_hash(), legacy_hash)
+
+
+# Pool com uma unica vaga: uma chamada feita de dentro dele nao pode esperar pela
+# vaga que ela mesma ocupa
+@override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_QUEUE=0, PASSWORD_HASHING_TIMEOUT=1)
+class HashingPoolTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.multiple(hashers, _pool=None, _slots=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    # Em outra thread, para um travamento falhar o teste em vez de segura-lo
+    def run_in_pool(self, function):
+        outcome = {}
+
+        def target():
+            try:
+                outcome['result'] = hashers._run(function)
+            except Exception as exc:
+                outcome['error'] = exc
+
+        thread = threading.Thread(target=target)
+        thread.start()
+        thread.join(timeout=30)
+        self.assertFalse(thread.is_alive(), 'pool de hash travado')
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['result']
+
+    def test_nested_hash_runs_inside_worker(self):
+        encoded = self.run_in_pool(lambda: hash_password('senha'))
+        self.assertTrue(hashers.verify_password('senha', encoded)[0])
+
+    def test_nested_batch_runs_inside_worker(self):
+        encoded = self.run_in_pool(lambda: hash_passwords(['uma', 'outra']))
+        self.assertEqual([hashers.verify_password(raw, value)[0] for raw, value in zip(['uma', 'outra'], encoded)], [True, True])
+
+    def test_pool_slot_is_released(self):
+        for _ in range(3):
+            self.assertTrue(hash_password('senha').startswith('scrypt$'))
@@ -0,0 +1,99 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from app.models import Account, IdempotencyKey, Transaction
+from app.services import DepositService
+from .factories import create_users, access_token
+
+
+# Idempotency-Key nas rotas de movimentacao (transferencia)
+class IdempotencyTests(TestCase):
+
+    def setUp(self):
+        self.sender, self.receiver = create_users('idem', 2, offset=600)
+        DepositService.execute_deposit(self.sender.account, Decimal('100.00'))
+
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access_token(self.sender)}')
+
+    def transfer(self, key, value='10.00'):
+        return self.client.post(
+            '/api/account/transfer/', {'identifier': self.receiver.email, 'value': value},
+            format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def sent(self):
+        return Transaction.objects.filter(account=self.sender.account, type=Transaction.Type.ENVIO).count()
+
+    def balance(self):
+        return Account.objects.get(user=self.sender).balance
+
+    def test_replay_returns_stored_response(self):
+        first = self.transfer('chave-1')
+        replay = self.transfer('chave-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay.data, first.data)
+        self.assertEqual(replay.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.sent(), 1)
+        self.assertEqual(self.balance(), Decimal('90.00'))
+
+    def test_same_key_with_other_payload_conflicts(self):
+        self.transfer('chave-1')
+        response = self.transfer('chave-1', value='20.00')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.sent(), 1)
+        self.assertEqual(self.balance(), Decimal('90.00'))
+
+    # Erros nao sao gravados: a mesma chave pode ser usada de novo
+    def test_failed_request_releases_key(self):
+        self.assertEqual(self.transfer('chave-1', value='500.00').status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.transfer('chave-1', value='500.00').status_code, 400)
+
+    # Requisicao simultanea ainda em processamento (chave gravada, sem resposta)
+    def test_same_key_in_flight(self):
+        IdempotencyKey.objects.create(
+            user=self.sender, key='chave-1', endpoint='POST /api/account/transfer/',
+            request_hash='', expires_at=timezone.now() + timedelta(hours=1)
+        )
+        with mock.patch('app.idempotency._fingerprint', return_value=''):
+            response = self.transfer('chave-1')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.sent(), 0)
+
+    # Duas requisicoes passam pela consulta da chave antes de qualquer uma grava-la:
+    # a segunda esbarra na constraint unica e devolve a resposta da primeira
+    def test_concurrent_insert_replays_winner(self):
+        first = self.transfer('chave-1')
+
+        with mock.patch('app.idempotency._lookup', return_value=None):
+            second = self.transfer('chave-1')
+
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.sent(), 1)
+        self.assertEqual(self.balance(), Decimal('90.00'))
+
+    def test_expired_keys_are_purged(self):
+        self.transfer('chave-antiga')
+        self.transfer('chave-nova', value='5.00')
+        IdempotencyKey.objects.filter(key='chave-antiga').update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        call_command('purge_idempotency_keys', stdout=StringIO())
+
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['chave-nova'])
+
+        # Expirada, a chave volta a executar a operacao
+        self.assertEqual(self.transfer('chave-antiga').status_code, 201)
+        self.assertEqual(self.sent(), 3)
@@ -0,0 +1,96 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from app.integrity import verify_range
+from app.models import Account, LedgerCheckpoint, Transaction
+from app.services import DepositService, TransferService
+from .factories import create_users
+
+
+# Checkpoints de verify_ledger --seal e alteracoes em transacoes ja seladas
+class LedgerCheckpointTests(TestCase):
+
+    def setUp(self):
+        self.sender, self.receiver = create_users('ledger', 2, offset=1200)
+        DepositService.execute_deposit(self.sender.account, Decimal('100.00'))
+        TransferService.execute_transfer(self.sender.account, self.receiver.account, Decimal('40.00'), 'aluguel')
+
+        # So entram no selo as transacoes anteriores ao corte (LEDGER_SEAL_LAG)
+        Transaction.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        call_command('verify_ledger', workers=1, seal=True, stdout=StringIO())
+
+    def verify(self, **options):
+        output = StringIO()
+        call_command('verify_ledger', workers=1, stdout=output, **options)
+        return output.getvalue()
+
+    def full_issues(self):
+        accounts = Account.objects.order_by('id').values_list('id', flat=True)
+        return verify_range(accounts.first(), accounts.last(), timezone.now(), full=True)['issues']
+
+    def test_seal_records_chain_per_account(self):
+        checkpoints = {checkpoint.account_id: checkpoint for checkpoint in LedgerCheckpoint.objects.all()}
+        self.assertEqual(
+            {account_id: (checkpoint.entry_count, checkpoint.balance) for account_id, checkpoint in checkpoints.items()},
+            {self.sender.account.id: (2, Decimal('60.00')), self.receiver.account.id: (1, Decimal('40.00'))}
+        )
+
+        # Sem transacoes novas, a execucao incremental nao le nada alem do selo
+        self.assertIn('0 transacao(oes) verificada(s)', self.verify())
+
+    def test_tampered_sealed_row_breaks_chain(self):
+        sent = Transaction.objects.get(account=self.sender.account, type=Transaction.Type.ENVIO)
+        Transaction.objects.filter(pk=sent.pk).update(description='alterada')
+
+        # A incremental parte do checkpoint e nao rele o que ja foi selado
+        self.verify()
+
+        with self.assertRaisesMessage(CommandError, '1 inconsistencia(s)'):
+            self.verify(full=True)
+
+        checkpoint = LedgerCheckpoint.objects.get(account=self.sender.account)
+        self.assertEqual(self.full_issues(), [{
+            'account_id': self.sender.account.id, 'issue': 'checkpoint',
+            'checkpoint_id': checkpoint.id, 'transaction_id': sent.id,
+        }])
+
+    def test_tampered_value_breaks_chain_and_balances(self):
+        deposit = Transaction.objects.get(account=self.sender.account, type=Transaction.Type.DEPÓSITO)
+        Transaction.objects.filter(pk=deposit.pk).update(value=Decimal('90.00'))
+
+        issues = self.full_issues()
+        self.assertEqual(
+            {issue['issue'] for issue in issues if issue['account_id'] == self.sender.account.id},
+            {'checkpoint', 'balance_after', 'drift'}
+        )
+        self.assertFalse([issue for issue in issues if issue['account_id'] == self.receiver.account.id])
+
+    def test_moved_sealed_row_is_reported(self):
+        received = Transaction.objects.get(account=self.receiver.account)
+        Transaction.objects.filter(pk=received.pk).update(created_at=timezone.now())
+
+        issues = self.full_issues()
+        self.assertIn(
+            {'account_id': self.receiver.account.id, 'issue': 'checkpoint',
+             'checkpoint_id': LedgerCheckpoint.objects.get(account=self.receiver.account).id,
+             'transaction_id': received.id, 'detail': 'transacao selada ausente'},
+            issues
+        )
+
+    def test_new_rows_after_seal_extend_the_chain(self):
+        DepositService.execute_deposit(self.receiver.account, Decimal('5.00'))
+
+        # Mais nova que o corte: e verificada, mas ainda nao entra no selo
+        self.assertIn('1 transacao(oes) verificada(s)', self.verify(seal=True))
+        self.assertEqual(LedgerCheckpoint.objects.filter(account=self.receiver.account).count(), 1)
+
+        with override_settings(LEDGER_SEAL_LAG=timedelta(0)):
+            self.assertIn('1 checkpoint(s) gravado(s)', self.verify(seal=True))
+        latest = LedgerCheckpoint.objects.filter(account=self.receiver.account).latest('id')
+        self.assertEqual((latest.entry_count, latest.balance), (2, Decimal('45.00')))
+        self.verify(full=True)
@@ -0,0 +1,28 @@
+from django.test import TestCase, override_settings
+from app.models import User
+from .factories import create_users, access_token
+
+
+class MetricsAccessTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_users('user', 1, offset=0)[0]
+        cls.admin = create_users('admin', 1, offset=1, role=User.Role.ADMIN)[0]
+
+    def get(self, authorization=None):
+        headers = {'HTTP_AUTHORIZATION': authorization} if authorization else {}
+        return self.client.get('/api/metrics/', **headers)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_closed_without_token(self):
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(self.get(f'Bearer {access_token(self.user)}').status_code, 403)
+        self.assertEqual(self.get(f'Bearer {access_token(self.admin)}').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='segredo')
+    def test_metrics_token(self):
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(self.get('Bearer outro').status_code, 403)
+        self.assertEqual(self.get('Bearer segredo').status_code, 200)
+        self.assertEqual(self.get(f'Bearer {access_token(self.admin)}').status_code, 200)
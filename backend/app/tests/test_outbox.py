@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.test import TestCase
+from django.utils import timezone
+from app.models import OutboxEvent
+from app.outbox import CursorExpired, events_after, purge_published, relay_batch
+
+
+class MemorySink:
+
+    def __init__(self):
+        self.events = []
+
+    def publish(self, events):
+        self.events.extend(events)
+
+
+# Retencao do outbox: as posicoes continuam crescendo depois da limpeza
+class OutboxPurgeTests(TestCase):
+
+    def record(self, count):
+        OutboxEvent.objects.bulk_create([
+            OutboxEvent(topic=OutboxEvent.Topic.TRANSACAO, account_id=1, payload={}) for _ in range(count)
+        ])
+
+    def purge_all(self):
+        return purge_published(timezone.now() + settings.OUTBOX_RETENTION * 2)
+
+    def test_positions_continue_after_purge(self):
+        sink = MemorySink()
+        self.record(3)
+        relay_batch(sink)
+
+        self.assertEqual(self.purge_all(), 2)
+        self.assertEqual(list(OutboxEvent.objects.values_list('position', flat=True)), [3])
+
+        self.record(2)
+        relay_batch(sink)
+        self.assertEqual([event['position'] for event in sink.events], [1, 2, 3, 4, 5])
+
+        # Um consumidor no cursor 3 segue lendo; um no cursor 1 perdeu eventos
+        self.assertEqual([event.position for event in events_after(3, 10)], [4, 5])
+        with self.assertRaises(CursorExpired):
+            events_after(1, 10)
+
+    def test_repeated_purges_keep_newest(self):
+        sink = MemorySink()
+        self.record(2)
+        relay_batch(sink)
+        self.purge_all()
+        self.assertEqual(self.purge_all(), 0)
+
+        self.record(1)
+        relay_batch(sink)
+        self.assertEqual(sink.events[-1]['position'], 3)
+
+    def test_purge_without_published_events(self):
+        self.record(2)
+        self.assertEqual(self.purge_all(), 0)
+        self.assertEqual(OutboxEvent.objects.count(), 2)
@@ -0,0 +1,64 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from app.models import User
+from .factories import create_users, create_statement, access_token
+
+
+# Extrato e listagem admin executam o mesmo numero de consultas para qualquer
+# volume: sem N+1 na serializacao (nomes de origem/destino, usuario da conta).
+class QueryCountMixin:
+    rows = None
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner, counterpart = create_users('owner', 2, offset=0)
+        cls.admin = create_users('admin', 1, offset=2, role=User.Role.ADMIN)[0]
+        create_statement(cls.owner, counterpart, cls.rows)
+        create_users('user', cls.rows, offset=3)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertQueries(self, expected, user, path):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access_token(user)}')
+        # Versao do token ja em cache: so as consultas da view entram na contagem
+        client.get('/api/account/balance/')
+
+        with self.assertNumQueries(expected):
+            response = client.get(path)
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+
+        self.assertEqual(response.status_code, 200, content[:200])
+
+    def test_statement(self):
+        self.assertQueries(2, self.owner, '/api/account/statement/')
+
+    def test_statement_paginated(self):
+        self.assertQueries(2, self.owner, '/api/account/statement/?page_size=5')
+
+    def test_statement_stream(self):
+        self.assertQueries(2, self.owner, '/api/account/statement/?stream=ndjson')
+
+    def test_admin_statement(self):
+        self.assertQueries(3, self.admin, f'/api/admin/users/{self.owner.id}/statement')
+
+    # Pagina cheia na ordem decrescente: o arquivo morto (mais antigo) nao e consultado
+    def test_admin_statement_paginated(self):
+        self.assertQueries(2, self.admin, f'/api/admin/users/{self.owner.id}/statement?page_size=5')
+
+    def test_admin_users(self):
+        self.assertQueries(1, self.admin, '/api/admin/users/')
+
+
+class QueryCount10Tests(QueryCountMixin, TestCase):
+    rows = 10
+
+
+class QueryCount1000Tests(QueryCountMixin, TestCase):
+    rows = 1000
+
+
+class QueryCount10000Tests(QueryCountMixin, TestCase):
+    rows = 10000
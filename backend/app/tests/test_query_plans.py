@@ -0,0 +1,69 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from app.models import Account, Transaction
+from app.statements import statement_queryset
+
+PERIOD = {'date_start': '2026-01-01', 'date_end': '2026-01-31'}
+
+
+def plan_checks():
+    account = Account(id=0)
+
+    return [
+        (
+            'extrato do usuario por periodo',
+            statement_queryset(account, PERIOD),
+            'transaction_account_created',
+        ),
+        (
+            'extrato do usuario por periodo e tipo',
+            statement_queryset(account, {**PERIOD, 'type': Transaction.Type.ENVIO}),
+            'transaction_account_type',
+        ),
+        (
+            'extrato admin (ordem decrescente)',
+            statement_queryset(account, PERIOD, descending=True),
+            'transaction_account_created',
+        ),
+        (
+            'verificacao de estorno duplicado',
+            Transaction.objects.filter(related_transaction_id=0, type=Transaction.Type.ESTORNO),
+            'transaction_related_type',
+        ),
+    ]
+
+
+class StatementFilterTests(TestCase):
+
+    # Intervalo [inicio, fim) sobre created_at: nenhuma funcao aplicada a coluna
+    def test_date_filters_are_ranges_on_created_at(self):
+        sql = str(statement_queryset(Account(id=0), PERIOD).query)
+
+        self.assertIn('"created_at" >=', sql)
+        self.assertIn('"created_at" <', sql)
+        self.assertNotIn('cast_date', sql)
+        self.assertNotIn('::date', sql)
+
+
+class QueryPlanTests(TestCase):
+
+    def assertUsesIndexes(self):
+        for label, queryset, index_name in plan_checks():
+            with self.subTest(label):
+                plan = queryset.explain()
+                self.assertIn(index_name, plan, f"{label}: esperado {index_name}\n{plan}")
+
+    @skipUnless(connection.vendor == 'sqlite', 'Plano do SQLite')
+    def test_sqlite_uses_composite_indexes(self):
+        self.assertUsesIndexes()
+
+    @skipUnless(connection.vendor == 'postgresql', 'Plano do PostgreSQL')
+    def test_postgresql_uses_composite_indexes(self):
+        # Em tabelas pequenas o PostgreSQL prefere seq scan; desligado dentro da
+        # transacao do teste para avaliar apenas se o indice esperado e elegivel.
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+        self.assertUsesIndexes()
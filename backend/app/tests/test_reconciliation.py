@@ -0,0 +1,96 @@
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from app.models import Account, Transaction
+from app.reconciliation import reconcile_range
+from app.services import DepositService, ReconciliationService, TransferService
+from .factories import create_users
+
+
+# Saldos recalculados a partir do ledger (reconcile_balances) e correcao com ReconciliationService
+class ReconciliationTests(TestCase):
+
+    def setUp(self):
+        self.drifted, self.consistent = (user.account for user in create_users('reconcile', 2, offset=1300))
+        DepositService.execute_deposit(self.drifted, Decimal('100.00'))
+        TransferService.execute_transfer(self.drifted, self.consistent, Decimal('30.00'), '')
+        DepositService.execute_deposit(self.drifted, Decimal('5.00'))
+
+    def balance(self, account):
+        return Account.objects.get(pk=account.pk).balance
+
+    def reconcile(self, use_numpy=True):
+        return reconcile_range(self.drifted.id, self.consistent.id, chunk_size=2, use_numpy=use_numpy)
+
+    def test_consistent_ledger_has_no_discrepancies(self):
+        for use_numpy in (True, False):
+            result = self.reconcile(use_numpy)
+            self.assertEqual((result['accounts'], result['entries'], result['discrepancies']), (2, 4, []))
+
+        call_command('reconcile_balances', workers=1, stdout=StringIO())
+
+    def test_drift_is_reported_by_both_engines(self):
+        Account.objects.filter(pk=self.drifted.pk).update(balance=Decimal('80.00'))
+
+        expected = [{
+            'account_id': self.drifted.id, 'balance': '80.00', 'ledger': '75.00', 'drift': '5.00',
+            'balance_after_mismatches': 0, 'first_mismatch_transaction_id': None,
+        }]
+        self.assertEqual(self.reconcile()['discrepancies'], expected)
+        self.assertEqual(self.reconcile(use_numpy=False)['discrepancies'], expected)
+
+        with self.assertRaisesMessage(CommandError, '1 conta(s) com divergencia'):
+            call_command('reconcile_balances', workers=1, stdout=StringIO())
+
+    def test_balance_after_mismatch_points_to_first_row(self):
+        sent = Transaction.objects.get(account=self.drifted, type=Transaction.Type.ENVIO)
+        Transaction.objects.filter(pk=sent.pk).update(balance_after=Decimal('71.00'))
+
+        for use_numpy in (True, False):
+            [discrepancy] = self.reconcile(use_numpy)['discrepancies']
+            self.assertEqual(
+                (discrepancy['drift'], discrepancy['balance_after_mismatches'], discrepancy['first_mismatch_transaction_id']),
+                ('0.00', 1, sent.id)
+            )
+
+    def test_correct_balance_fixes_drifted_account(self):
+        Account.objects.filter(pk=self.drifted.pk).update(balance=Decimal('80.00'))
+
+        with mock.patch('app.services.invalidate_account') as invalidate, \
+                self.captureOnCommitCallbacks(execute=True):
+            previous, ledger = ReconciliationService.correct_balance(self.drifted.id)
+
+        self.assertEqual((previous, ledger), (Decimal('80.00'), Decimal('75.00')))
+        self.assertEqual(self.balance(self.drifted), Decimal('75.00'))
+        invalidate.assert_called_once_with(self.drifted.user_id, self.drifted.id)
+        self.assertEqual(self.reconcile()['discrepancies'], [])
+
+    def test_correct_balance_leaves_consistent_account_untouched(self):
+        with mock.patch('app.services.invalidate_account') as invalidate, \
+                self.captureOnCommitCallbacks(execute=True) as callbacks, \
+                CaptureQueriesContext(connection) as queries:
+            previous, ledger = ReconciliationService.correct_balance(self.consistent.id)
+
+        self.assertEqual((previous, ledger), (Decimal('30.00'), Decimal('30.00')))
+        self.assertEqual(self.balance(self.consistent), Decimal('30.00'))
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE')])
+        self.assertEqual(callbacks, [])
+        invalidate.assert_not_called()
+
+    def test_fix_option_corrects_only_drifted_accounts(self):
+        Account.objects.filter(pk=self.drifted.pk).update(balance=Decimal('80.00'))
+        output = StringIO()
+
+        with mock.patch.object(ReconciliationService, 'correct_balance', wraps=ReconciliationService.correct_balance) as correct:
+            call_command('reconcile_balances', workers=1, fix=True, stdout=output)
+
+        correct.assert_called_once_with(self.drifted.id)
+        self.assertIn(f'conta {self.drifted.id}: 80.00 -> 75.00', output.getvalue())
+        self.assertEqual((self.balance(self.drifted), self.balance(self.consistent)), (Decimal('75.00'), Decimal('30.00')))
+        call_command('reconcile_balances', workers=1, stdout=StringIO())
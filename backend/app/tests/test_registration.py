@@ -0,0 +1,79 @@
+from django.test import TestCase
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+from app.models import Account, User
+from app.services import RegistrationService
+from .factories import create_users, access_token
+
+
+def item(index, **fields):
+    return {
+        'email': f'novo-{index}@tests.local', 'full_name': f'Novo {index}', 'cpf': f'8{index:010d}',
+        'role': User.Role.USER, 'password': 'senha-forte-123', **fields
+    }
+
+
+class BulkRegistrationTests(TestCase):
+
+    def setUp(self):
+        self.existing = create_users('existente', 1, offset=1000)[0]
+
+    def test_duplicates_within_payload_and_against_database(self):
+        errors = RegistrationService._duplicate_errors([
+            item(1),
+            item(2, email=item(1)['email']),
+            item(3, cpf=item(1)['cpf']),
+            item(4, email=self.existing.email),
+            item(5, cpf=self.existing.cpf),
+            item(6, email='novo-6@TESTS.LOCAL'),
+            item(7, email='novo-6@tests.local'),
+        ])
+
+        self.assertEqual(errors, [
+            {},
+            {'email': ['E-mail já cadastrado']},
+            {'cpf': ['CPF já cadastrado']},
+            {'email': ['E-mail já cadastrado']},
+            {'cpf': ['CPF já cadastrado']},
+            {},
+            {'email': ['E-mail já cadastrado']},
+        ])
+
+    def test_all_or_nothing_creates_nobody(self):
+        with self.assertRaises(ValidationError) as raised:
+            RegistrationService.register_bulk([item(1), item(2, cpf=self.existing.cpf)], all_or_nothing=True)
+
+        self.assertEqual(raised.exception.detail['users'][1], {'cpf': ['CPF já cadastrado']})
+        self.assertFalse(User.objects.filter(email__startswith='novo-').exists())
+
+    def test_partial_mode_creates_valid_items(self):
+        results = RegistrationService.register_bulk(
+            [item(1), item(2, email=self.existing.email), item(3, password=None)], all_or_nothing=False
+        )
+
+        self.assertEqual([result['status'] for result in results], ['ok', 'erro', 'ok'])
+        self.assertEqual(results[1]['errors'], {'email': ['E-mail já cadastrado']})
+
+        created = User.objects.get(pk=results[0]['user_id'])
+        self.assertTrue(created.check_password('senha-forte-123'))
+        self.assertEqual(Account.objects.get(pk=results[0]['account_id']).user_id, created.pk)
+        self.assertFalse(User.objects.get(pk=results[2]['user_id']).has_usable_password())
+
+    def test_single_registration_reports_duplicates(self):
+        with self.assertRaises(ValidationError) as raised:
+            RegistrationService.register(item(1, email=self.existing.email, cpf=self.existing.cpf))
+
+        self.assertEqual(raised.exception.detail, {'email': ['E-mail já cadastrado'], 'cpf': ['CPF já cadastrado']})
+
+    def test_endpoint_modes(self):
+        admin = create_users('admin', 1, offset=1001, role=User.Role.ADMIN)[0]
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access_token(admin)}')
+        users = [item(1), item(2, cpf=self.existing.cpf)]
+
+        atomic = client.post('/api/admin/users/bulk/', {'users': users}, format='json')
+        self.assertEqual(atomic.status_code, 400)
+
+        partial = client.post('/api/admin/users/bulk/', {'users': users, 'mode': 'best_effort'}, format='json')
+        self.assertEqual(partial.status_code, 201)
+        self.assertEqual((partial.data['mode'], partial.data['succeeded'], partial.data['failed']), ('best_effort', 1, 1))
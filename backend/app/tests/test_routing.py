@@ -0,0 +1,124 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from app.balance_cache import invalidate_account
+from app.models import User, Account
+from app.routing import read_from
+from app.services import DepositService, TransferService
+from .factories import create_users, create_statement, access_token
+
+REPLICA = 'replica'
+
+
+# TransactionTestCase: dentro de uma transacao aberta (como a do TestCase) o
+# roteador mantem as leituras no primario. A replica espelha o banco de teste do
+# default, entao os dados criados aqui ja estao nela.
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {DEFAULT_DB_ALIAS, REPLICA}
+
+    def setUp(self):
+        cache.clear()
+        self.owner, self.counterpart, self.other = create_users('owner', 3, offset=0)
+        self.admin = create_users('admin', 1, offset=3, role=User.Role.ADMIN)[0]
+        create_statement(self.owner, self.counterpart, 20)
+        create_statement(self.other, self.counterpart, 20)
+        self.accounts = {account.user_id: account for account in Account.objects.all()}
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access_token(user)}')
+        # Versao do token em cache: a autenticacao nao consulta o primario
+        client.get('/api/account/balance/')
+        return client
+
+    def measure(self, call):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary, CaptureQueriesContext(connections[REPLICA]) as replica:
+            result = call()
+        return result, len(primary), len(replica)
+
+    def get(self, client, path):
+        response = client.get(path)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assertOnReplica(self, client, path):
+        _, primary, replica = self.measure(lambda: self.get(client, path))
+        self.assertEqual(primary, 0, path)
+        self.assertGreater(replica, 0, path)
+
+    def assertOnPrimary(self, call):
+        result, primary, replica = self.measure(call)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+        return result
+
+    def test_read_only_views_use_replica(self):
+        owner = self.client_for(self.owner)
+        admin = self.client_for(self.admin)
+        date_start = timezone.localdate() - timedelta(days=30)
+
+        for client, path in [
+            (owner, '/api/account/statement/'),
+            (owner, '/api/account/statement/?page_size=5'),
+            (owner, '/api/account/statement/?stream=ndjson'),
+            (owner, f'/api/account/statement/summary/?date_start={date_start}'),
+            (admin, f'/api/admin/users/{self.owner.id}/statement'),
+            (admin, '/api/admin/users/'),
+        ]:
+            with self.subTest(path):
+                self.assertOnReplica(client, path)
+
+    def test_async_statement_uses_replica(self):
+        self.assertOnReplica(self.client_for(self.owner), '/api/async/account/statement/')
+
+    def test_balance_view_without_opt_in_stays_on_primary(self):
+        client = self.client_for(self.owner)
+        invalidate_account(self.owner.id, self.accounts[self.owner.id].id)
+        self.assertOnPrimary(lambda: self.get(client, '/api/account/balance/'))
+
+    # Mesmo com uma replica ativa, servicos com lock e escritas vao para o primario
+    def test_services_use_primary(self):
+        owner, counterpart = self.accounts[self.owner.id], self.accounts[self.counterpart.id]
+
+        with read_from(REPLICA):
+            self.assertOnPrimary(lambda: DepositService.execute_deposit(owner, Decimal('50.00')))
+            self.assertOnPrimary(lambda: TransferService.execute_transfer(owner, counterpart, Decimal('10.00'), 'replica'))
+            self.assertOnPrimary(lambda: TransferService.execute_batch(owner, [
+                {'destination_account': counterpart, 'value': Decimal('1.00')},
+            ]))
+
+    def test_select_for_update_and_writes_use_primary(self):
+        account = self.accounts[self.owner.id]
+
+        def lock():
+            with transaction.atomic():
+                return Account.objects.select_for_update().get(pk=account.pk)
+
+        with read_from(REPLICA):
+            self.assertOnPrimary(lock)
+            self.assertOnPrimary(lambda: Account.objects.filter(pk=account.pk).update(status=Account.Status.ATIVO))
+            self.assertOnPrimary(lambda: create_users('novo', 1, offset=10))
+            # Fora de uma transacao, leituras comuns seguem para a replica
+            _, primary, replica = self.measure(lambda: Account.objects.get(pk=account.pk))
+            self.assertEqual((primary, replica), (0, 1))
+
+    # Leitura apos escrita: as contas envolvidas leem do primario, as demais da replica
+    def test_accounts_written_recently_read_from_primary(self):
+        owner_client = self.client_for(self.owner)
+        other_client = self.client_for(self.other)
+
+        deposit = DepositService.execute_deposit(self.accounts[self.owner.id], Decimal('50.00'))
+
+        response = self.assertOnPrimary(lambda: self.get(owner_client, '/api/account/statement/'))
+        self.assertIn(deposit.id, {row['id'] for row in response.data})
+        self.assertOnReplica(other_client, '/api/account/statement/')
@@ -0,0 +1,58 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from app.models import Account, DailyBalanceSnapshot, ScheduledTransfer, Transaction
+from app.scheduler import run_due
+from app.services import DepositService
+from .factories import create_users
+
+
+# Lote do scheduler com uma conta que recebe em um item e envia no seguinte (A -> B, B -> C)
+class ScheduledChainTests(TestCase):
+
+    def setUp(self):
+        self.a, self.b, self.c = (user.account for user in create_users('chain', 3, offset=100))
+        DepositService.execute_deposit(self.a, Decimal('100.00'))
+        DepositService.execute_deposit(self.b, Decimal('30.00'))
+
+        # Depositos no dia anterior: os snapshots de hoje saem inteiros do lote
+        yesterday = timezone.now() - timedelta(days=1)
+        Transaction.objects.update(created_at=yesterday)
+        DailyBalanceSnapshot.objects.update(date=timezone.localdate(yesterday))
+
+        due = timezone.now() - timedelta(minutes=1)
+        for position, (origin, destination, value) in enumerate([(self.a, self.b, '50.00'), (self.b, self.c, '80.00')]):
+            ScheduledTransfer.objects.create(
+                origin_account=origin, destination_account=destination, value=Decimal(value),
+                start_at=due, next_run_at=due + timedelta(seconds=position)
+            )
+
+    def test_chain_is_settled_in_plan_order(self):
+        run = run_due()
+        self.assertEqual(run.executed, 2)
+
+        rows = Transaction.objects.filter(account=self.b, created_at__date=timezone.localdate()).order_by('created_at', 'id')
+        self.assertEqual(
+            [(row.type, row.balance_after) for row in rows],
+            [(Transaction.Type.RECEBIMENTO, Decimal('80.00')), (Transaction.Type.ENVIO, Decimal('0.00'))]
+        )
+
+        received = rows[0]
+        self.assertEqual(received.related_transaction.account_id, self.a.id)
+
+        # Falha com CommandError se algum balance_after ou saldo divergir
+        call_command('verify_ledger', workers=1, full=True, stdout=StringIO())
+
+    def test_batch_snapshots(self):
+        run_due()
+        today = timezone.localdate()
+
+        expected = {self.a.id: ('100.00', '50.00'), self.b.id: ('30.00', '0.00'), self.c.id: ('0.00', '80.00')}
+        for account_id, (opening, closing) in expected.items():
+            snapshot = DailyBalanceSnapshot.objects.get(account_id=account_id, date=today)
+            self.assertEqual((snapshot.opening_balance, snapshot.closing_balance), (Decimal(opening), Decimal(closing)))
+            self.assertEqual(Account.objects.get(pk=account_id).balance, Decimal(closing))
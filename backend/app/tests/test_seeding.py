@@ -0,0 +1,67 @@
+from datetime import date, datetime, time
+
+from django.db.models import Sum
+from django.test import TestCase
+from django.utils import timezone
+from app.models import User, Account, Transaction
+from app.seeding import LedgerGenerator
+from .factories import create_users
+
+
+def progress(label, count):
+    pass
+
+
+class LedgerGeneratorTests(TestCase):
+
+    def generate(self, users, transactions, seed=42):
+        generator = LedgerGenerator(seed, users, transactions, date(2026, 1, 1), 30, ['!'], batch_size=7)
+        accounts = generator.create_accounts(progress)
+        return accounts, generator.create_ledger(accounts, progress)
+
+    def test_transaction_count_is_exact(self):
+        for transactions in (1, 2, 999, 5000):
+            with self.subTest(transactions=transactions):
+                _, written = self.generate(20, transactions, seed=transactions)
+                self.assertEqual(written, transactions)
+
+        self.assertEqual(Transaction.objects.count(), 1 + 2 + 999 + 5000)
+
+    # Segunda execucao no mesmo banco: continua a numeracao de e-mail e CPF
+    def test_second_run_appends_users(self):
+        first, _ = self.generate(25, 100)
+        second, _ = self.generate(25, 100)
+
+        self.assertEqual(User.objects.filter(email__endswith='@seed.local').count(), 50)
+        self.assertEqual(second[0].user.email, 'user25@seed.local')
+        self.assertEqual(second[0].user.cpf, '70000000025')
+        self.assertEqual(Transaction.objects.count(), 200)
+
+        for accounts in (first, second):
+            ids = [account.id for account in accounts]
+            self.assertEqual(
+                Account.objects.filter(id__in=ids).aggregate(total=Sum('balance'))['total'],
+                sum(account.balance for account in accounts)
+            )
+
+    # As contas geradas ficam com a data de inicio do periodo; contas criadas
+    # durante o seed (aqui, entre dois lotes) continuam com o horario atual.
+    def test_account_timestamps(self):
+        created_during_seed = []
+
+        def create_between_batches(label, count):
+            if count:
+                created_during_seed.extend(create_users(f'seed{count}', 1, offset=1400 + count))
+
+        generator = LedgerGenerator(1, 10, 0, date(2026, 1, 1), 30, ['!'], batch_size=4)
+        before = timezone.now()
+        accounts = generator.create_accounts(create_between_batches)
+
+        start = timezone.make_aware(datetime.combine(date(2026, 1, 1), time.min))
+        ids = [account.id for account in accounts]
+        self.assertEqual(list(Account.objects.filter(id__in=ids).values_list('created_at', flat=True).distinct()), [start])
+        self.assertEqual({account.created_at for account in accounts}, {start})
+
+        self.assertEqual(len(created_during_seed), 3)
+        for user in created_during_seed:
+            self.assertGreaterEqual(Account.objects.get(user=user).created_at, before)
@@ -0,0 +1,124 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection, OperationalError
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from rest_framework.exceptions import ValidationError
+from app.models import Account, AccountBalanceShard, Transaction
+from app.recipients import recipient_cache, resolve_recipient
+from app.services import DepositService, TransferService
+from .factories import create_users
+
+
+def shard(account, shards):
+    call_command('shard_account', account.id, shards=shards, stdout=StringIO())
+    return Account.objects.get(pk=account.pk)
+
+
+def shard_balances(account):
+    return list(AccountBalanceShard.objects.filter(account=account).order_by('index').values_list('balance', flat=True))
+
+
+class ShardedBalanceTests(TestCase):
+
+    def setUp(self):
+        recipient_cache.clear()
+        self.owner, self.payer = create_users('shard', 2, offset=400)
+        DepositService.execute_deposit(self.owner.account, Decimal('10.00'))
+        DepositService.execute_deposit(self.payer.account, Decimal('100.00'))
+        self.account = shard(self.owner.account, 4)
+
+    def test_credits_spread_across_shards(self):
+        random.seed(0)
+        for _ in range(20):
+            DepositService.execute_deposit(self.account, Decimal('2.00'))
+
+        balances = shard_balances(self.account)
+        self.assertEqual(sum(balances), Decimal('40.00'))
+        self.assertGreater(sum(1 for balance in balances if balance), 1)
+
+        account = Account.objects.get(pk=self.account.pk)
+        self.assertEqual(account.balance, Decimal('10.00'))
+        self.assertEqual(account.total_balance, Decimal('50.00'))
+
+    # A linha base (10) nao cobre o debito: os sub-saldos sao varridos para ela
+    def test_debit_sweeps_shards(self):
+        TransferService.execute_transfer(self.payer.account, self.account, Decimal('30.00'), '')
+        self.assertEqual(Account.objects.get(pk=self.account.pk).balance, Decimal('10.00'))
+
+        sent, _ = TransferService.execute_transfer(self.account, self.payer.account, Decimal('35.00'), '')
+
+        self.assertEqual(sent.balance_after, Decimal('5.00'))
+        self.assertEqual(shard_balances(self.account), [Decimal('0.00')] * 4)
+        self.assertEqual(Account.objects.get(pk=self.account.pk).balance, Decimal('5.00'))
+
+    def test_debit_beyond_total_is_rejected(self):
+        TransferService.execute_transfer(self.payer.account, self.account, Decimal('30.00'), '')
+
+        with self.assertRaises(ValidationError):
+            TransferService.execute_transfer(self.account, self.payer.account, Decimal('40.01'), '')
+
+        self.assertEqual(Account.objects.get(pk=self.account.pk).total_balance, Decimal('40.00'))
+
+    # shard_count fica no cache de destinatarios: shard_account o invalida no commit
+    def test_shard_account_invalidates_recipient_cache(self):
+        self.assertEqual(resolve_recipient(self.owner.email).shard_count, 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            shard(self.account, 0)
+
+        self.assertEqual(resolve_recipient(self.owner.email).shard_count, 0)
+        self.assertEqual(Account.objects.get(pk=self.account.pk).balance, Decimal('10.00'))
+
+
+# Creditos concorrentes (uma thread por remetente) na conta com sub-saldos. No
+# SQLite uma escrita bloqueada levanta OperationalError, inclusive no snapshot
+# gravado depois do commit: cada remetente repete ate ter TRANSFERS envios gravados.
+class ConcurrentShardCreditTests(TransactionTestCase):
+
+    SENDERS = 4
+    TRANSFERS = 10
+
+    def retry(self, call):
+        while True:
+            try:
+                return call()
+            except OperationalError:
+                time.sleep(0.001)
+
+    def send(self, origin, receiver):
+        sent = Transaction.objects.filter(account=origin, type=Transaction.Type.ENVIO)
+        try:
+            while self.retry(sent.count) < self.TRANSFERS:
+                try:
+                    TransferService.execute_transfer(origin, receiver, Decimal('1.00'), '')
+                except OperationalError:
+                    time.sleep(0.001)
+        finally:
+            connection.close()
+
+    def test_total_balance_after_concurrent_credits(self):
+        receiver, *senders = create_users('concurrent', self.SENDERS + 1, offset=500)
+        origins = [sender.account for sender in senders]
+        for origin in origins:
+            DepositService.execute_deposit(origin, Decimal(self.TRANSFERS))
+        receiver = shard(receiver.account, 4)
+
+        with ThreadPoolExecutor(max_workers=self.SENDERS) as pool:
+            list(pool.map(lambda origin: self.send(origin, receiver), origins))
+
+        expected = Decimal(self.SENDERS * self.TRANSFERS)
+        account = Account.objects.get(pk=receiver.pk)
+        self.assertEqual(account.balance, Decimal('0.00'))
+        self.assertEqual(sum(shard_balances(receiver)), expected)
+        self.assertEqual(account.total_balance, expected)
+        self.assertEqual(Account.objects.with_balance().get(pk=receiver.pk).total_balance, expected)
+        self.assertEqual(
+            Transaction.objects.filter(account=receiver, type=Transaction.Type.RECEBIMENTO).aggregate(total=Sum('value'))['total'],
+            expected
+        )
@@ -0,0 +1,103 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from app.models import DailyBalanceSnapshot, Transaction
+from app.services import DepositService, ReverseService, SnapshotService, TransferService
+from .factories import create_users
+
+
+def snapshot_values(account):
+    return list(DailyBalanceSnapshot.objects.filter(account=account).order_by('date').values_list(
+        'date', 'opening_balance', 'closing_balance', 'credits', 'debits', 'transaction_count'
+    ))
+
+
+class SnapshotTests(TestCase):
+
+    def setUp(self):
+        self.owner, self.other = create_users('snapshot', 2, offset=900)
+        self.account, self.other_account = self.owner.account, self.other.account
+        self.today = timezone.localdate()
+        self.yesterday = self.today - timedelta(days=1)
+
+    # Move tudo o que ja foi gravado para o dia anterior
+    def age_one_day(self):
+        Transaction.objects.update(created_at=timezone.now() - timedelta(days=1))
+        DailyBalanceSnapshot.objects.update(date=self.yesterday)
+
+    def test_several_transactions_on_the_same_day(self):
+        DepositService.execute_deposit(self.account, Decimal('100.00'))
+        DepositService.execute_deposit(self.other_account, Decimal('50.00'))
+        TransferService.execute_transfer(self.account, self.other_account, Decimal('30.00'), '')
+        TransferService.execute_transfer(self.other_account, self.account, Decimal('10.00'), '')
+
+        self.assertEqual(snapshot_values(self.account), [
+            (self.today, Decimal('0.00'), Decimal('80.00'), Decimal('110.00'), Decimal('30.00'), 3)
+        ])
+        self.assertEqual(snapshot_values(self.other_account), [
+            (self.today, Decimal('0.00'), Decimal('70.00'), Decimal('80.00'), Decimal('10.00'), 3)
+        ])
+
+    def test_opening_balance_carries_previous_day(self):
+        DepositService.execute_deposit(self.account, Decimal('100.00'))
+        self.age_one_day()
+        TransferService.execute_transfer(self.account, self.other_account, Decimal('40.00'), '')
+
+        self.assertEqual(snapshot_values(self.account), [
+            (self.yesterday, Decimal('0.00'), Decimal('100.00'), Decimal('100.00'), Decimal('0.00'), 1),
+            (self.today, Decimal('100.00'), Decimal('60.00'), Decimal('0.00'), Decimal('40.00'), 1),
+        ])
+        self.assertEqual(SnapshotService.balance_on(self.account, self.yesterday - timedelta(days=1)), Decimal('0.00'))
+        self.assertEqual(SnapshotService.balance_on(self.account, self.yesterday), Decimal('100.00'))
+        self.assertEqual(SnapshotService.balance_on(self.account, self.today + timedelta(days=3)), Decimal('60.00'))
+
+        opening, closing, days = SnapshotService.period(self.account, self.today, self.today)
+        self.assertEqual((opening, closing, len(days)), (Decimal('100.00'), Decimal('60.00'), 1))
+
+    # Lote liquidado sobre um snapshot do mesmo dia ja existente
+    def test_batch_adds_to_existing_snapshot(self):
+        DepositService.execute_deposit(self.account, Decimal('100.00'))
+        TransferService.execute_batch(self.account, [
+            {'destination_account': self.other_account, 'value': Decimal('25.00'), 'description': ''},
+            {'destination_account': self.other_account, 'value': Decimal('15.00'), 'description': ''},
+        ])
+
+        self.assertEqual(snapshot_values(self.account), [
+            (self.today, Decimal('0.00'), Decimal('60.00'), Decimal('100.00'), Decimal('40.00'), 3)
+        ])
+        self.assertEqual(snapshot_values(self.other_account), [
+            (self.today, Decimal('0.00'), Decimal('40.00'), Decimal('40.00'), Decimal('0.00'), 2)
+        ])
+
+    # O backfill refaz, a partir do ledger, os mesmos snapshots das gravacoes incrementais
+    def test_backfill_rebuilds_incremental_snapshots(self):
+        DepositService.execute_deposit(self.account, Decimal('100.00'))
+        DepositService.execute_deposit(self.other_account, Decimal('20.00'))
+        sent, _ = TransferService.execute_transfer(self.account, self.other_account, Decimal('30.00'), '')
+        self.age_one_day()
+        ReverseService.execute_reverse(sent.id)
+        TransferService.execute_transfer(self.other_account, self.account, Decimal('5.00'), '')
+
+        expected = {account.pk: snapshot_values(account) for account in (self.account, self.other_account)}
+        self.assertEqual(len(expected[self.account.pk]), 2)
+
+        DailyBalanceSnapshot.objects.all().delete()
+        call_command('backfill_snapshots', stdout=StringIO())
+
+        for account in (self.account, self.other_account):
+            self.assertEqual(snapshot_values(account), expected[account.pk])
+
+    def test_backfill_single_account(self):
+        DepositService.execute_deposit(self.account, Decimal('100.00'))
+        DepositService.execute_deposit(self.other_account, Decimal('10.00'))
+        expected = snapshot_values(self.account)
+        DailyBalanceSnapshot.objects.update(closing_balance=Decimal('0.00'))
+
+        call_command('backfill_snapshots', account=self.account.pk, stdout=StringIO())
+
+        self.assertEqual(snapshot_values(self.account), expected)
+        self.assertEqual(snapshot_values(self.other_account)[0][2], Decimal('0.00'))
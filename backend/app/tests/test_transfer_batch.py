@@ -0,0 +1,120 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from app.models import Account, DailyBalanceSnapshot, Transaction
+from app.recipients import recipient_cache
+from app.services import DepositService
+from .factories import create_users, access_token
+
+
+# POST /api/account/transfer/batch/ com a conta do remetente bloqueada uma vez e
+# os saldos acumulados em memoria
+class TransferBatchTests(TestCase):
+
+    def setUp(self):
+        recipient_cache.clear()
+        self.sender, self.first, self.second, self.inactive = create_users('batch', 4, offset=200)
+        Account.objects.filter(user=self.inactive).update(status=Account.Status.INATIVO)
+        DepositService.execute_deposit(self.sender.account, Decimal('100.00'))
+
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access_token(self.sender)}')
+
+    def post(self, items, mode='best_effort'):
+        return self.client.post('/api/account/transfer/batch/', {'items': items, 'mode': mode}, format='json')
+
+    def balance(self, user):
+        return Account.objects.get(user=user).balance
+
+    def test_best_effort_reports_each_item(self):
+        response = self.post([
+            {'identifier': self.first.email, 'value': '10.00'},
+            {'identifier': 'ninguem@tests.local', 'value': '10.00'},
+            {'identifier': self.sender.cpf, 'value': '10.00'},
+            {'identifier': self.inactive.email, 'value': '10.00'},
+            {'identifier': self.second.cpf, 'value': '500.00'},
+            {'identifier': self.second.cpf, 'value': '20.00'},
+        ])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['succeeded'], response.data['failed']), (2, 4))
+        self.assertEqual(
+            [result.get('detail') for result in response.data['results']],
+            [
+                None,
+                "Destinatário não encontrado.",
+                "Não é possível transferir para a mesma conta.",
+                "Ambas as contas precisam estar ativas.",
+                "Saldo insuficiente. Saldo atual: 90.00",
+                None,
+            ]
+        )
+        self.assertIn('transfer_id', response.data['results'][0])
+        self.assertEqual(
+            (self.balance(self.sender), self.balance(self.first), self.balance(self.second), self.balance(self.inactive)),
+            (Decimal('70.00'), Decimal('10.00'), Decimal('20.00'), Decimal('0.00'))
+        )
+
+    def test_atomic_rejects_whole_batch(self):
+        response = self.post([
+            {'identifier': self.first.email, 'value': '10.00'},
+            {'identifier': self.inactive.email, 'value': '10.00'},
+        ], mode='atomic')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['items'][0], {})
+        self.assertEqual(str(response.data['items'][1]['detail']), "Ambas as contas precisam estar ativas.")
+        self.assertEqual(self.balance(self.sender), Decimal('100.00'))
+        self.assertEqual(Transaction.objects.filter(type=Transaction.Type.ENVIO).count(), 0)
+
+    # O saldo acaba no meio do lote: os itens seguintes que cabem no que sobrou passam
+    def test_sender_runs_out_partway(self):
+        response = self.post([
+            {'identifier': self.first.email, 'value': '40.00'},
+            {'identifier': self.second.email, 'value': '40.00'},
+            {'identifier': self.first.email, 'value': '40.00'},
+            {'identifier': self.second.email, 'value': '20.00'},
+        ])
+
+        self.assertEqual([result['status'] for result in response.data['results']], ['ok', 'ok', 'erro', 'ok'])
+        self.assertEqual(response.data['results'][2]['detail'], "Saldo insuficiente. Saldo atual: 20.00")
+        self.assertEqual(self.balance(self.sender), Decimal('0.00'))
+
+    def test_balance_after_and_snapshots(self):
+        self.post([
+            {'identifier': self.first.email, 'value': '40.00'},
+            {'identifier': self.second.email, 'value': '25.00'},
+            {'identifier': self.first.email, 'value': '5.00'},
+        ])
+
+        sent = Transaction.objects.filter(account=self.sender.account, type=Transaction.Type.ENVIO).order_by('id')
+        self.assertEqual([row.balance_after for row in sent], [Decimal('60.00'), Decimal('35.00'), Decimal('30.00')])
+        received = Transaction.objects.filter(account=self.first.account, type=Transaction.Type.RECEBIMENTO).order_by('id')
+        self.assertEqual([row.balance_after for row in received], [Decimal('40.00'), Decimal('45.00')])
+        self.assertEqual([row.related_transaction_id for row in received], [sent[0].id, sent[2].id])
+
+        today = timezone.localdate()
+        for user, opening, closing, count in [
+            (self.sender, '0.00', '30.00', 4), (self.first, '0.00', '45.00', 2), (self.second, '0.00', '25.00', 1)
+        ]:
+            snapshot = DailyBalanceSnapshot.objects.get(account=user.account, date=today)
+            self.assertEqual(
+                (snapshot.opening_balance, snapshot.closing_balance, snapshot.transaction_count),
+                (Decimal(opening), Decimal(closing), count)
+            )
+            self.assertEqual(snapshot.closing_balance, self.balance(user))
+
+        call_command('verify_ledger', workers=1, full=True, stdout=StringIO())
+
+    # A transferencia avulsa usa as mesmas regras dos itens do lote
+    def test_single_transfer_shares_item_rules(self):
+        response = self.client.post(
+            '/api/account/transfer/', {'identifier': self.inactive.email, 'value': '10.00'}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(str(response.data[0]), "Ambas as contas precisam estar ativas.")
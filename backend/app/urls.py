@@ -1,5 +1,6 @@
 from django.urls import path, include
-from .views import UserRegistrationView, BalanceAPIView, AdminUsersAPIView, DepositView, TransferView, StatementView, AdminStatementView, ReverseTransferView
+from .views import UserRegistrationView, BalanceAPIView, BalanceHistoryView, AdminUsersAPIView, AdminBulkRegistrationView, DepositView, TransferView, TransferBatchView, ScheduledTransferListView, ScheduledTransferDetailView, StatementView, StatementBalancesView, StatementSummaryView, AdminStatementView, AdminStatementExportView, AdminStatementExportStatusView, AdminStatementExportDownloadView, ReverseTransferView, EventsView, EventStreamView, metrics_view
+from .async_views import AsyncBalanceView, AsyncStatementView, AsyncAdminUsersView, AsyncAdminStatementView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from drf_spectacular.utils import extend_schema_view, extend_schema
@@ -21,18 +22,41 @@ urlpatterns = [
 
     # Conta e Saldo
     path('account/balance/', BalanceAPIView.as_view(), name='my_balance'),
+    path('account/balance/history/', BalanceHistoryView.as_view(), name='my_balance_history'),
     path('admin/users/', AdminUsersAPIView.as_view(), name='admin_users_balances'),
+    path('admin/users/bulk/', AdminBulkRegistrationView.as_view(), name='admin_users_bulk_registration'),
 
     # Operações Financeiras
     path('account/deposit/', DepositView.as_view(), name='deposit'),
     path('account/transfer/', TransferView.as_view(), name='transfer'),
+    path('account/transfer/batch/', TransferBatchView.as_view(), name='transfer_batch'),
+    path('account/scheduled-transfers/', ScheduledTransferListView.as_view(), name='scheduled_transfers'),
+    path('account/scheduled-transfers/<int:id>/', ScheduledTransferDetailView.as_view(), name='scheduled_transfer'),
     path('admin/reverse/<int:id>', ReverseTransferView.as_view(), name='reverse'),
 
     # Extrato
     path('account/statement/', StatementView.as_view(), name='my_statement'),
+    path('account/statement/balances/', StatementBalancesView.as_view(), name='my_statement_balances'),
+    path('account/statement/summary/', StatementSummaryView.as_view(), name='my_statement_summary'),
     path('admin/users/<int:id>/statement', AdminStatementView.as_view(), name='admin_users_statement'),
+    path('admin/users/<int:id>/statement/exports/', AdminStatementExportView.as_view(), name='admin_statement_export'),
+    path('admin/exports/<int:id>/', AdminStatementExportStatusView.as_view(), name='admin_statement_export_status'),
+    path('admin/exports/<int:id>/download/', AdminStatementExportDownloadView.as_view(), name='admin_statement_export_download'),
 
 
+    # Leitura async (deploy ASGI)
+    path('async/account/balance/', AsyncBalanceView.as_view(), name='async_my_balance'),
+    path('async/account/statement/', AsyncStatementView.as_view(), name='async_my_statement'),
+    path('async/admin/users/', AsyncAdminUsersView.as_view(), name='async_admin_users_balances'),
+    path('async/admin/users/<int:id>/statement', AsyncAdminStatementView.as_view(), name='async_admin_users_statement'),
+
+    # Eventos (outbox)
+    path('events/', EventsView.as_view(), name='events'),
+    path('events/stream/', EventStreamView.as_view(), name='events_stream'),
+
+    # Observabilidade
+    path('metrics/', metrics_view, name='metrics'),
+
     # Documentação da API
     path('schema/', SpectacularAPIView.as_view(), name='schema'),
     path('docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
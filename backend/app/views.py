@@ -4,14 +4,65 @@ from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from .permissions import IsAdminRole
 from rest_framework.exceptions import PermissionDenied
-from .serializers import UserSerializer, AccountSerializer, DepositSerializer, TransferSerializer, TransactionStatementSerializer
-from .models import Account, Transaction
-from .services import DepositService, TransferService, ReverseService
-from rest_framework.exceptions import ValidationError
-from drf_spectacular.utils import extend_schema, OpenApiParameter
+from .serializers import UserSerializer, BulkRegistrationSerializer, AccountSerializer, DepositSerializer, TransferSerializer, TransferBatchSerializer, ScheduledTransferRequestSerializer, ScheduledTransferSerializer, TransactionStatementSerializer, BalanceAtDateSerializer, StatementBalancesSerializer, StatementSummarySerializer, StatementExportRequestSerializer, StatementExportSerializer
+from .models import User, Account, Transaction, StatementExport, ScheduledTransfer
+from .authentication import AccountJWTAuthentication
+from .services import RegistrationService, DepositService, TransferService, ReverseService, SnapshotService
+from .pagination import TransactionKeysetPagination
+from .streaming import stream_queryset
+from .idempotency import idempotent, IDEMPOTENCY_PARAMETER
+from .statements import statement_queryset, archived_statement, parse_statement_date, statement_summary, is_closed_period, cached_statement_summary, remember_statement_summary, SUMMARY_BUCKETS
+from .recipients import resolve_recipient, resolve_recipients
+from .balance_cache import cached_account, remember_account, etag_for, etag_matches
+from .instrumentation import registry, serializer_timer, render_gauges
+from .exports import enqueue_export, export_filename, parquet_available, EXPORT_CONTENT_TYPES
+from .routing import ReplicaReadMixin
+from .scheduler import backlog
+from .outbox import wait_for_events, sse_stream, event_data, pending as pending_events, CursorExpired
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, FileResponse, StreamingHttpResponse
+from datetime import timedelta
+from itertools import chain
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from rest_framework.exceptions import ValidationError, NotFound, APIException, AuthenticationFailed
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
 
 
+STATEMENT_PAGINATION_PARAMETERS = [
+    OpenApiParameter(name='cursor', description='Cursor retornado em next_cursor para buscar a proxima pagina', required=False, type=str),
+    OpenApiParameter(name='page_size', description='Quantidade de transacoes por pagina (ativa a paginacao, maximo 500)', required=False, type=int),
+    OpenApiParameter(name='stream', description='Transmite o extrato completo sem paginar (json ou ndjson)', required=False, type=str),
+]
+
+
+# transactions e a parte do extrato na tabela quente; meses arquivados da conta que
+# cruzam o periodo entram antes dela (ou depois, na ordem decrescente).
+def statement_response(request, account, transactions, descending=False):
+    def archived(after=None):
+        return archived_statement(account, request.query_params, descending, after, using=transactions.db)
+
+    stream_format = request.query_params.get('stream')
+    if stream_format:
+        return stream_queryset(
+            transactions, TransactionStatementSerializer, stream_format, archived=archived(), descending=descending
+        )
+
+    paginator = TransactionKeysetPagination(descending=descending)
+    if paginator.is_requested(request):
+        page = paginator.paginate_queryset(transactions, request, archived=archived)
+        with serializer_timer():
+            data = TransactionStatementSerializer(page, many=True).data
+        return paginator.get_paginated_response(data)
+
+    rows = chain(transactions, archived()) if descending else chain(archived(), transactions)
+    with serializer_timer():
+        data = TransactionStatementSerializer(list(rows), many=True).data
+
+    return Response(data, status=status.HTTP_200_OK)
+
+
 @extend_schema(
     tags=['Autenticação'],
     summary="Cadastro de usuario",
@@ -25,9 +76,9 @@ class UserRegistrationView(APIView):
         serializer = UserSerializer(data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
+            user = RegistrationService.register(serializer.validated_data)
             
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return Response(UserSerializer(user).data, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -35,19 +86,62 @@ class UserRegistrationView(APIView):
 @extend_schema(
     tags=['Conta e Saldo'],
     summary="Consultar saldo do usuario logado",
-    description="Retorna os dados da conta e o saldo atual do usuario autenticado."
+    description="Retorna os dados da conta e o saldo atual do usuario autenticado. A resposta traz um ETag; reenvie-o em If-None-Match para receber 304 enquanto o saldo nao mudar.",
+    parameters=[
+        OpenApiParameter(name='If-None-Match', location=OpenApiParameter.HEADER, description='ETag de uma resposta anterior', required=False, type=str),
+    ],
+    responses={200: AccountSerializer, 304: None}
 )
 class BalanceAPIView(APIView):
     serializer_class = AccountSerializer
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        try:
-            account = Account.objects.get(user=request.user)
-            serializer = AccountSerializer(account)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except Account.DoesNotExist:
-            return Response({"detail": "Conta não encontrada."}, status=status.HTTP_404_NOT_FOUND)
+        account_id = request.user.account.id
+        data, version = cached_account(request.user.pk, account_id)
+
+        if data is None:
+            try:
+                account = Account.objects.with_balance().select_related('user').get(pk=account_id)
+            except Account.DoesNotExist:
+                return Response({"detail": "Conta não encontrada."}, status=status.HTTP_404_NOT_FOUND)
+
+            with serializer_timer():
+                data = AccountSerializer(account).data
+            remember_account(request.user.pk, account_id, version, data)
+
+        etag = etag_for(data)
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        return Response(data, status=status.HTTP_200_OK, headers=headers)
+
+
+@extend_schema(
+    tags=['Conta e Saldo'],
+    summary="Saldo em uma data",
+    description="Retorna o saldo da conta do usuario autenticado ao final da data informada, a partir dos snapshots diarios de saldo.",
+    parameters=[
+        OpenApiParameter(name='date', description='Data de referencia (YYYY-MM-DD)', required=True, type=str),
+    ]
+)
+class BalanceHistoryView(APIView):
+    serializer_class = BalanceAtDateSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        raw_date = request.query_params.get('date')
+
+        if not raw_date:
+            raise ValidationError({'date': 'Informe a data (YYYY-MM-DD).'})
+
+        day = parse_statement_date(raw_date, 'date')
+        balance = SnapshotService.balance_on(request.user.account, day)
+        serializer = BalanceAtDateSerializer({'date': day, 'balance': balance})
+
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 @extend_schema(
@@ -55,29 +149,70 @@ class BalanceAPIView(APIView):
     summary="Listar todos os usuarios e saldos",
     description="Rota exclusiva para administradores. Lista todas as contas de usuarios do tipo 'user'."
 )
-class AdminUsersAPIView(APIView):
+class AdminUsersAPIView(ReplicaReadMixin, APIView):
     serializer_class = AccountSerializer
     permission_classes = [IsAuthenticated, IsAdminRole]
 
     def get(self, request):
-        accounts = Account.objects.filter(user__role='user')
-        serializer = AccountSerializer(accounts, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        accounts = Account.objects.filter(user__role='user').select_related('user').with_balance()
+        with serializer_timer():
+            data = AccountSerializer(accounts, many=True).data
+        return Response(data, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    tags=['Autenticação'],
+    summary="Cadastro de usuarios em lote",
+    description="Rota exclusiva para administradores, para integracao de parceiros: cadastra ate 5000 usuarios (com suas contas) por requisicao. A senha e opcional; sem ela o usuario e criado sem senha utilizavel. No modo 'atomic' qualquer item invalido cancela o lote inteiro; no modo 'best_effort' os itens validos sao cadastrados e os invalidos sao reportados individualmente.",
+    responses={201: OpenApiTypes.OBJECT},
+    parameters=[IDEMPOTENCY_PARAMETER]
+)
+class AdminBulkRegistrationView(APIView):
+    serializer_class = BulkRegistrationSerializer
+    permission_classes = [IsAuthenticated, IsAdminRole]
+
+    @idempotent
+    def post(self, request):
+
+        serializer = BulkRegistrationSerializer(data=request.data)
+        with serializer_timer():
+            serializer.is_valid(raise_exception=True)
+
+        mode = serializer.validated_data["mode"]
+        results = RegistrationService.register_bulk(
+            serializer.validated_data["users"],
+            all_or_nothing=mode == BulkRegistrationSerializer.Mode.ATOMIC
+        )
+
+        succeeded = sum(1 for result in results if result["status"] == "ok")
+
+        return Response(
+            {
+                "mode": mode,
+                "succeeded": succeeded,
+                "failed": len(results) - succeeded,
+                "results": results
+            },
+            status=status.HTTP_201_CREATED
+        )
 
 
 @extend_schema(
     tags=['Operações Financeiras'],
     summary="Depositar valor na propria conta",
-    description="Permite que o usuario logado realize um deposito em sua propria conta informando o valor."
+    description="Permite que o usuario logado realize um deposito em sua propria conta informando o valor.",
+    parameters=[IDEMPOTENCY_PARAMETER]
 )
 class DepositView(APIView):
     serializer_class = DepositSerializer
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def post(self, request):
 
         serializer = DepositSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        with serializer_timer():
+            serializer.is_valid(raise_exception=True)
 
         account = request.user.account
         value = serializer.validated_data["value"]
@@ -103,16 +238,19 @@ class DepositView(APIView):
 @extend_schema(
     tags=['Operações Financeiras'],
     summary="Transferir valor para outro usuario",
-    description="Realiza a transferencia de valores entre contas. O destinatario pode ser identificado por E-mail ou CPF."
+    description="Realiza a transferencia de valores entre contas. O destinatario pode ser identificado por E-mail ou CPF.",
+    parameters=[IDEMPOTENCY_PARAMETER]
 )
 class TransferView(APIView):
     serializer_class = TransferSerializer 
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def post(self, request):
 
         serializer = TransferSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        with serializer_timer():
+            serializer.is_valid(raise_exception=True)
 
         user = request.user
         origin_account = user.account
@@ -121,14 +259,7 @@ class TransferView(APIView):
         value = serializer.validated_data["value"]
         description = serializer.validated_data.get("description", "")
 
-        destination_account = Account.objects.filter(
-            user__email=identifier
-        ).first()
-
-        if not destination_account:
-            destination_account = Account.objects.filter(
-                user__cpf=identifier
-            ).first()
+        destination_account = resolve_recipient(identifier)
 
         if not destination_account:
             raise ValidationError("Destinatário não encontrado.")
@@ -150,6 +281,152 @@ class TransferView(APIView):
         )
 
 
+@extend_schema(
+    tags=['Operações Financeiras'],
+    summary="Transferir em lote",
+    description="Realiza varias transferencias a partir da conta do usuario logado em uma unica transacao de banco. No modo 'atomic' qualquer item invalido cancela o lote inteiro; no modo 'best_effort' os itens validos sao liquidados e os invalidos sao reportados individualmente.",
+    responses={201: OpenApiTypes.OBJECT},
+    parameters=[IDEMPOTENCY_PARAMETER]
+)
+class TransferBatchView(APIView):
+    serializer_class = TransferBatchSerializer
+    permission_classes = [IsAuthenticated]
+
+    @idempotent
+    def post(self, request):
+
+        serializer = TransferBatchSerializer(data=request.data)
+        with serializer_timer():
+            serializer.is_valid(raise_exception=True)
+
+        items = serializer.validated_data["items"]
+        mode = serializer.validated_data["mode"]
+        destinations = resolve_recipients({item["identifier"] for item in items})
+
+        results = TransferService.execute_batch(
+            origin_account=request.user.account,
+            items=[
+                {
+                    "destination_account": destinations[item["identifier"]],
+                    "value": item["value"],
+                    "description": item.get("description") or "",
+                }
+                for item in items
+            ],
+            all_or_nothing=mode == TransferBatchSerializer.Mode.ATOMIC
+        )
+
+        succeeded = sum(1 for result in results if result["status"] == "ok")
+
+        return Response(
+            {
+                "mode": mode,
+                "succeeded": succeeded,
+                "failed": len(results) - succeeded,
+                "results": results
+            },
+            status=status.HTTP_201_CREATED
+        )
+
+
+@extend_schema_view(
+    get=extend_schema(
+        tags=['Operações Financeiras'],
+        summary="Listar transferencias agendadas",
+        description="Lista as transferencias agendadas e recorrentes do usuario logado, das mais recentes para as mais antigas.",
+        responses={200: ScheduledTransferSerializer(many=True)}
+    ),
+    post=extend_schema(
+        tags=['Operações Financeiras'],
+        summary="Agendar transferencia",
+        description="Agenda uma transferencia unica ou recorrente (diaria, semanal ou mensal) a partir da conta do usuario logado. O destinatario pode ser identificado por E-mail ou CPF. Sem start_at, a primeira execucao acontece em instantes. Em caso de falha (ex.: saldo insuficiente) a execucao e tentada novamente mais tarde.",
+        request=ScheduledTransferRequestSerializer,
+        responses={201: ScheduledTransferSerializer},
+        parameters=[IDEMPOTENCY_PARAMETER]
+    )
+)
+class ScheduledTransferListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        schedules = ScheduledTransfer.objects.filter(origin_account_id=request.user.account.id).order_by('-id')
+        with serializer_timer():
+            data = ScheduledTransferSerializer(schedules, many=True).data
+        return Response(data, status=status.HTTP_200_OK)
+
+    @idempotent
+    def post(self, request):
+        serializer = ScheduledTransferRequestSerializer(data=request.data)
+        with serializer_timer():
+            serializer.is_valid(raise_exception=True)
+
+        data = serializer.validated_data
+        destination_account = resolve_recipient(data["identifier"])
+
+        if not destination_account:
+            raise ValidationError("Destinatário não encontrado.")
+
+        if destination_account.id == request.user.account.id:
+            raise ValidationError("Não é possível transferir para a mesma conta.")
+
+        schedule = ScheduledTransfer.objects.create(
+            origin_account_id=request.user.account.id,
+            destination_account_id=destination_account.id,
+            value=data["value"],
+            description=data.get("description") or "",
+            frequency=data["frequency"],
+            start_at=data["start_at"],
+            ends_at=data.get("ends_at"),
+            next_run_at=data["start_at"]
+        )
+
+        return Response(ScheduledTransferSerializer(schedule).data, status=status.HTTP_201_CREATED)
+
+
+@extend_schema_view(
+    get=extend_schema(
+        tags=['Operações Financeiras'],
+        summary="Consultar transferencia agendada",
+        description="Retorna a transferencia agendada com o status, a proxima execucao e o resultado da ultima."
+    ),
+    delete=extend_schema(
+        tags=['Operações Financeiras'],
+        summary="Cancelar transferencia agendada",
+        description="Cancela as proximas execucoes da transferencia agendada. Transferencias ja realizadas nao sao afetadas."
+    )
+)
+class ScheduledTransferDetailView(APIView):
+    serializer_class = ScheduledTransferSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, id):
+        schedule = ScheduledTransfer.objects.filter(pk=id, origin_account_id=request.user.account.id).first()
+
+        if not schedule:
+            raise NotFound("Agendamento não encontrado.")
+
+        return Response(ScheduledTransferSerializer(schedule).data, status=status.HTTP_200_OK)
+
+    def delete(self, request, id):
+        # UPDATE condicional: um agendamento em execucao pelo scheduler termina o lote
+        # atual antes de ser cancelado
+        cancelled = ScheduledTransfer.objects.filter(
+            pk=id, origin_account_id=request.user.account.id, status=ScheduledTransfer.Status.ATIVO
+        ).update(status=ScheduledTransfer.Status.CANCELADO)
+        schedule = ScheduledTransfer.objects.filter(pk=id, origin_account_id=request.user.account.id).first()
+
+        if not schedule:
+            raise NotFound("Agendamento não encontrado.")
+
+        if not cancelled:
+            return Response(
+                {"detail": "Agendamento já encerrado.", "status": schedule.status},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        return Response(ScheduledTransferSerializer(schedule).data, status=status.HTTP_200_OK)
+
+
 @extend_schema(
     tags=['Extrato'],
     summary="Extrato do usuario logado",
@@ -158,9 +435,10 @@ class TransferView(APIView):
         OpenApiParameter(name='date_start', description='Data inicial (YYYY-MM-DD)', required=False, type=str),
         OpenApiParameter(name='date_end', description='Data final (YYYY-MM-DD)', required=False, type=str),
         OpenApiParameter(name='type', description='Tipo de transacao (deposito, recebimento, envio, estorno)', required=False, type=str),
+        *STATEMENT_PAGINATION_PARAMETERS,
     ]
 )
-class StatementView(APIView):
+class StatementView(ReplicaReadMixin, APIView):
     serializer_class = TransactionStatementSerializer
     permission_classes = [IsAuthenticated]
 
@@ -168,23 +446,106 @@ class StatementView(APIView):
         user = request.user
         account = user.account
 
-        transactions = Transaction.objects.filter(account=account).order_by('created_at')
-        date_start = request.query_params.get('date_start')
-        date_end = request.query_params.get('date_end')
-        transaction_type = request.query_params.get('type')
+        transactions = statement_queryset(account, request.query_params)
+
+        return statement_response(request, account, transactions)
+
+@extend_schema(
+    tags=['Extrato'],
+    summary="Saldos de abertura, fechamento e totais diarios",
+    description="Retorna o saldo de abertura em date_start, o saldo de fechamento em date_end e os totais de creditos e debitos por dia, sem percorrer o historico de transacoes.",
+    parameters=[
+        OpenApiParameter(name='date_start', description='Data inicial (YYYY-MM-DD)', required=True, type=str),
+        OpenApiParameter(name='date_end', description='Data final (YYYY-MM-DD). Padrao: hoje', required=False, type=str),
+    ]
+)
+class StatementBalancesView(ReplicaReadMixin, APIView):
+    serializer_class = StatementBalancesSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        raw_start = request.query_params.get('date_start')
 
-        if date_start:
-            transactions = transactions.filter(created_at__date__gte=date_start)
+        if not raw_start:
+            raise ValidationError({'date_start': 'Informe a data inicial (YYYY-MM-DD).'})
 
-        if date_end:
-            transactions = transactions.filter(created_at__date__gte=date_end)
+        date_start = parse_statement_date(raw_start, 'date_start')
+        raw_end = request.query_params.get('date_end')
+        date_end = parse_statement_date(raw_end, 'date_end') if raw_end else timezone.localdate()
 
-        if transaction_type:
-            transactions = transactions.filter(type=transaction_type)
+        if date_end < date_start:
+            raise ValidationError({'date_end': 'A data final deve ser posterior à data inicial.'})
 
-        serializer = TransactionStatementSerializer(transactions, many=True)
+        opening_balance, closing_balance, days = SnapshotService.period(request.user.account, date_start, date_end)
+        serializer = StatementBalancesSerializer({
+            'date_start': date_start,
+            'date_end': date_end,
+            'opening_balance': opening_balance,
+            'closing_balance': closing_balance,
+            'days': days,
+        })
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        with serializer_timer():
+            data = serializer.data
+
+        return Response(data, status=status.HTTP_200_OK)
+
+@extend_schema(
+    tags=['Extrato'],
+    summary="Resumo do extrato por tipo e periodo",
+    description="Retorna totais e quantidades por tipo de transacao, creditos, debitos e saldo liquido no intervalo, agrupados por dia, semana ou mes, calculados no banco. Periodos encerrados podem ser mantidos em cache pelo cliente.",
+    parameters=[
+        OpenApiParameter(name='date_start', description='Data inicial (YYYY-MM-DD)', required=True, type=str),
+        OpenApiParameter(name='date_end', description='Data final (YYYY-MM-DD). Padrao: hoje', required=False, type=str),
+        OpenApiParameter(name='bucket', description='Agrupamento: day, week ou month. Padrao: day', required=False, type=str),
+    ]
+)
+class StatementSummaryView(ReplicaReadMixin, APIView):
+    serializer_class = StatementSummarySerializer
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        raw_start = request.query_params.get('date_start')
+
+        if not raw_start:
+            raise ValidationError({'date_start': 'Informe a data inicial (YYYY-MM-DD).'})
+
+        date_start = parse_statement_date(raw_start, 'date_start')
+        raw_end = request.query_params.get('date_end')
+        date_end = parse_statement_date(raw_end, 'date_end') if raw_end else timezone.localdate()
+
+        if date_end < date_start:
+            raise ValidationError({'date_end': 'A data final deve ser posterior à data inicial.'})
+
+        bucket = request.query_params.get('bucket', 'day')
+
+        if bucket not in SUMMARY_BUCKETS:
+            raise ValidationError({'bucket': 'Agrupamento inválido. Use day, week ou month.'})
+
+        account = request.user.account
+        closed = is_closed_period(date_end)
+        data = cached_statement_summary(account.id, date_start, date_end, bucket) if closed else None
+
+        if data is None:
+            summary = statement_summary(account, date_start, date_end, bucket)
+            summary['opening_balance'] = SnapshotService.balance_on(account, date_start - timedelta(days=1))
+            summary['closing_balance'] = SnapshotService.balance_on(account, date_end)
+
+            with serializer_timer():
+                data = StatementSummarySerializer(summary).data
+            if closed:
+                remember_statement_summary(account.id, date_start, date_end, bucket, data)
+
+        etag = etag_for(data)
+        headers = {
+            'ETag': etag,
+            'Cache-Control': f'private, max-age={settings.STATEMENT_SUMMARY_CACHE_TTL}' if closed else 'private, no-cache',
+        }
+
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        return Response(data, status=status.HTTP_200_OK, headers=headers)
 
 # Extrato de Terceiros (Admin)
 @extend_schema(
@@ -195,9 +556,10 @@ class StatementView(APIView):
         OpenApiParameter(name='date_start', description='Data inicial (YYYY-MM-DD)', required=False, type=str),
         OpenApiParameter(name='date_end', description='Data final (YYYY-MM-DD)', required=False, type=str),
         OpenApiParameter(name='type', description='Tipo de transacao', required=False, type=str),
+        *STATEMENT_PAGINATION_PARAMETERS,
     ]
 )
-class AdminStatementView(APIView):
+class AdminStatementView(ReplicaReadMixin, APIView):
     serializer_class = TransactionStatementSerializer
     permission_classes = [IsAuthenticated, IsAdminRole]
 
@@ -208,25 +570,97 @@ class AdminStatementView(APIView):
         if not account:
             raise ValidationError("Usuário não encontrado.")
 
-        transactions = Transaction.objects.filter(
-            account=account
-        ).order_by("-created_at")
-        date_start = request.query_params.get("date_start")
-        date_end = request.query_params.get("date_end")
-        transaction_type = request.query_params.get("type")
+        transactions = statement_queryset(account, request.query_params, descending=True)
 
-        if date_start:
-            transactions = transactions.filter(created_at__date__gte=date_start)
+        return statement_response(request, account, transactions, descending=True)
 
-        if date_end:
-            transactions = transactions.filter(created_at__date__lte=date_end)
 
-        if transaction_type:
-            transactions = transactions.filter(type=transaction_type)
+# Exportacao de extrato (Admin): o arquivo e gerado por um processo do pool de
+# exportacao (app/exports.py); a requisicao so cria o job e devolve o id.
+@extend_schema(
+    tags=['Extrato'],
+    summary="Solicitar exportacao do extrato de um usuario",
+    description="Rota exclusiva para administradores. Cria uma exportacao em segundo plano do extrato do usuario em CSV, OFX ou Parquet, com os mesmos filtros do extrato. Consulte o status e baixe o arquivo quando concluido.",
+    request=StatementExportRequestSerializer,
+    responses={202: StatementExportSerializer}
+)
+class AdminStatementExportView(APIView):
+    serializer_class = StatementExportRequestSerializer
+    permission_classes = [IsAuthenticated, IsAdminRole]
+
+    def post(self, request, id):
+        serializer = StatementExportRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-        serializer = TransactionStatementSerializer(transactions, many=True)
+        if serializer.validated_data['format'] == StatementExport.Format.PARQUET and not parquet_available():
+            raise ValidationError({'format': 'Exportação em Parquet indisponível neste servidor.'})
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        account = Account.objects.filter(user__id=id).first()
+
+        if not account:
+            raise ValidationError("Usuário não encontrado.")
+
+        export = StatementExport.objects.create(
+            requested_by_id=request.user.pk,
+            account=account,
+            format=serializer.validated_data['format'],
+            filters=serializer.filters()
+        )
+        enqueue_export(export)
+
+        return Response(StatementExportSerializer(export).data, status=status.HTTP_202_ACCEPTED)
+
+
+@extend_schema(
+    tags=['Extrato'],
+    summary="Status de uma exportacao de extrato",
+    description="Rota exclusiva para administradores. Retorna o status da exportacao e, quando concluida, o link para download."
+)
+class AdminStatementExportStatusView(APIView):
+    serializer_class = StatementExportSerializer
+    permission_classes = [IsAuthenticated, IsAdminRole]
+
+    def get(self, request, id):
+        export = StatementExport.objects.filter(pk=id, requested_by_id=request.user.pk).first()
+
+        if not export:
+            raise NotFound("Exportação não encontrada.")
+
+        return Response(StatementExportSerializer(export).data, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    tags=['Extrato'],
+    summary="Download de uma exportacao de extrato",
+    description="Rota exclusiva para administradores. Retorna o arquivo gerado pela exportacao.",
+    responses={(200, 'application/octet-stream'): OpenApiTypes.BINARY}
+)
+class AdminStatementExportDownloadView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminRole]
+
+    def get(self, request, id):
+        export = StatementExport.objects.filter(pk=id, requested_by_id=request.user.pk).first()
+
+        if not export:
+            raise NotFound("Exportação não encontrada.")
+
+        if export.status != StatementExport.Status.CONCLUIDO:
+            return Response(
+                {"detail": "Exportação ainda não concluída.", "status": export.status},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        try:
+            handle = open(export.file_path, 'rb')
+        except FileNotFoundError:
+            raise NotFound("Arquivo da exportação não encontrado.")
+
+        # FileResponse entrega o arquivo aberto ao servidor (wsgi.file_wrapper/sendfile),
+        # sem passar o conteudo pelo Python.
+        return FileResponse(
+            handle, as_attachment=True, filename=export_filename(export),
+            content_type=EXPORT_CONTENT_TYPES[export.format]
+        )
 
 
 @extend_schema(
@@ -234,11 +668,13 @@ class AdminStatementView(APIView):
     summary="Estornar uma transferencia especifica",
     description="Rota exclusiva para administradores. Realiza o estorno de uma transacao de envio atraves do ID da transacao.",
     request=None,
-    responses={201: OpenApiTypes.OBJECT}
+    responses={201: OpenApiTypes.OBJECT},
+    parameters=[IDEMPOTENCY_PARAMETER]
 )
 class ReverseTransferView(APIView):
     permission_classes = [IsAuthenticated, IsAdminRole]
 
+    @idempotent
     def post(self, request, id):
 
         try:
@@ -253,3 +689,120 @@ class ReverseTransferView(APIView):
             },
             status=status.HTTP_201_CREATED
         )
+
+
+class CursorExpiredError(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'Cursor expirado. Reinicie a leitura sem cursor.'
+    default_code = 'cursor_expired'
+
+
+def _event_params(request, cursor_header=None):
+    try:
+        cursor = int(cursor_header or request.query_params.get('cursor', 0))
+        limit = int(request.query_params.get('limit', 500))
+        timeout = float(request.query_params.get('timeout', settings.OUTBOX_LONG_POLL_TIMEOUT))
+    except ValueError:
+        raise ValidationError("Parâmetros inválidos: cursor, limit e timeout devem ser números.")
+
+    if cursor < 0 or not 1 <= limit <= 1000 or not 0 <= timeout <= settings.OUTBOX_LONG_POLL_TIMEOUT:
+        raise ValidationError(
+            f"Use cursor >= 0, limit entre 1 e 1000 e timeout entre 0 e {settings.OUTBOX_LONG_POLL_TIMEOUT} segundos."
+        )
+
+    return cursor, limit, timeout
+
+
+EVENT_PARAMETERS = [
+    OpenApiParameter(name='cursor', description='position do ultimo evento recebido (0 ou ausente: desde o mais antigo retido)', required=False, type=int),
+    OpenApiParameter(name='limit', description='Maximo de eventos por resposta (1 a 1000, padrao 500)', required=False, type=int),
+]
+
+
+# Eventos de transacoes para sistemas internos (notificacoes, analytics, fraude),
+# no lugar de consultar extratos: um indice por position em vez de um extrato por conta.
+@extend_schema(
+    tags=['Eventos'],
+    summary="Eventos de transacoes (long-poll)",
+    description="Rota exclusiva para administradores. Retorna os eventos publicados depois do cursor, em ordem. Sem eventos novos, a requisicao espera ate timeout segundos antes de responder com a lista vazia. Use o cursor da resposta na proxima chamada. Um cursor mais antigo que a retencao retorna 410.",
+    parameters=[
+        *EVENT_PARAMETERS,
+        OpenApiParameter(name='timeout', description='Espera maxima por eventos novos, em segundos (padrao e maximo: 25)', required=False, type=float),
+    ],
+    responses={200: OpenApiTypes.OBJECT, 410: OpenApiTypes.OBJECT}
+)
+class EventsView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminRole]
+
+    def get(self, request):
+        cursor, limit, timeout = _event_params(request)
+
+        try:
+            events = wait_for_events(cursor, limit, timeout)
+        except CursorExpired:
+            raise CursorExpiredError()
+
+        with serializer_timer():
+            data = [event_data(event) for event in events]
+
+        return Response(
+            {"events": data, "cursor": events[-1].position if events else cursor},
+            status=status.HTTP_200_OK
+        )
+
+
+@extend_schema(
+    tags=['Eventos'],
+    summary="Eventos de transacoes (Server-Sent Events)",
+    description="Rota exclusiva para administradores. Transmite os eventos publicados depois do cursor (ou do header Last-Event-ID, enviado automaticamente pelo EventSource ao reconectar). O id de cada evento SSE e a position do evento. A conexao e encerrada periodicamente; o cliente reconecta de onde parou.",
+    parameters=[
+        *EVENT_PARAMETERS,
+        OpenApiParameter(name='Last-Event-ID', location=OpenApiParameter.HEADER, description='position do ultimo evento recebido', required=False, type=int),
+    ],
+    responses={(200, 'text/event-stream'): OpenApiTypes.STR}
+)
+class EventStreamView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminRole]
+
+    def get(self, request):
+        cursor, limit, _ = _event_params(request, request.headers.get('Last-Event-ID'))
+
+        response = StreamingHttpResponse(sse_stream(cursor, limit), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Desliga o buffer de proxies (nginx) para os eventos sairem na hora
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+# O Prometheus envia METRICS_TOKEN; fora dele, so o JWT de um administrador. Sem
+# token configurado o endpoint continua fechado para todos os outros.
+def _metrics_allowed(request):
+    header = request.headers.get('Authorization', '')
+    token = settings.METRICS_TOKEN
+    if token and constant_time_compare(header, f'Bearer {token}'):
+        return True
+
+    try:
+        authenticated = AccountJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+
+    return authenticated is not None and authenticated[0].role == User.Role.ADMIN
+
+
+# View Django simples (fora do DRF), para o Prometheus nao depender de JWT
+def metrics_view(request):
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+
+    # Filas do run_scheduler e do relay_outbox, lidas do banco: rodam em outros processos
+    due, due_lag = backlog()
+    unpublished, outbox_lag = pending_events()
+    gauges = render_gauges([
+        ('app_scheduled_transfers_due', 'Transferencias agendadas vencidas aguardando execucao', due),
+        ('app_scheduled_transfers_lag_seconds', 'Atraso do agendamento vencido mais antigo', due_lag),
+        ('app_outbox_pending_events', 'Eventos do outbox aguardando o relay', unpublished),
+        ('app_outbox_lag_seconds', 'Tempo de espera do evento pendente mais antigo do outbox', outbox_lag),
+    ])
+
+    return HttpResponse(registry.render() + gauges, content_type='text/plain; version=0.0.4; charset=utf-8')
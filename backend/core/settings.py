@@ -1,3 +1,5 @@
+import os
+import sys
 from pathlib import Path
 from datetime import timedelta
 
@@ -33,7 +35,7 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'app.authentication.AccountJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -43,13 +45,14 @@ REST_FRAMEWORK = {
 
 SPECTACULAR_SETTINGS = {
     'TITLE': 'API da aplicação Conta Digital',
-    'DESCRIPTION': 'Documentação das rotas de autenticação, conta/saldo, operações financeiras e extrato.',
+    'DESCRIPTION': 'Documentação das rotas de autenticação, conta/saldo, operações financeiras, extrato e eventos.',
     'VERSION': '1.0.0',
     'TAGS': [
         {'name': 'Autenticação'},
         {'name': 'Conta e Saldo'},
         {'name': 'Operações Financeiras'},
         {'name': 'Extrato'},
+        {'name': 'Eventos'},
     ],
     'SERVE_INCLUDE_SCHEMA': False,
     'POSTPROCESSING_HOOKS': [
@@ -61,9 +64,15 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_OBTAIN_SERIALIZER': 'app.authentication.AccountTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'app.authentication.AccountTokenRefreshSerializer',
 }
 
+# Por quanto tempo a versao dos tokens de um usuario fica em cache (segundos)
+AUTH_TOKEN_VERSION_CACHE_TTL = 30
+
 MIDDLEWARE = [
+    'app.middleware.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -105,10 +114,66 @@ WSGI_APPLICATION = 'core.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # SQLITE_PATH permite apontar servidores externos (ex.: bench_asgi) para outro arquivo
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+    }
+}
+
+# PostgreSQL opcional (requer psycopg), usado nos benchmarks e em producao
+if os.environ.get('POSTGRES_DB'):
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ['POSTGRES_DB'],
+        'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+    }
+
+# Replicas de leitura (app/routing.py): caminhos SQLite ou hosts PostgreSQL
+# separados por virgula, com as mesmas credenciais do primario. Cada um vira um
+# alias replica_<n>; so as views somente leitura que optam por replica os usam.
+DATABASE_REPLICAS = []
+_replica_targets = os.environ.get('POSTGRES_REPLICA_HOSTS' if os.environ.get('POSTGRES_DB') else 'SQLITE_REPLICA_PATHS', '')
+for _index, _target in enumerate(filter(None, _replica_targets.split(',')), start=1):
+    DATABASES[f'replica_{_index}'] = {
+        **DATABASES['default'],
+        'HOST' if os.environ.get('POSTGRES_DB') else 'NAME': _target.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{_index}')
+
+# Replica dos testes de roteamento (app/tests/test_routing.py), so em
+# `manage.py test`: no banco de teste e um espelho do default. Fora de
+# DATABASE_REPLICAS, nenhuma view le dela.
+if sys.argv[1:2] == ['test']:
+    DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['app.routing.ReplicaRouter']
+
+# Apos um deposito ou transferencia, as leituras das contas envolvidas ficam no
+# primario por esse tempo (segundos), cobrindo o atraso de replicacao. A marca
+# fica no cache: com o LocMemCache padrao ela so vale no processo que fez a
+# escrita, e outros workers podem ler da replica antes da replicacao. Com
+# replicas e varios workers, defina REDIS_URL (CACHES abaixo).
+REPLICA_STICKY_SECONDS = 5
+REPLICA_STICKY_CACHE_ALIAS = 'default'
+
+# Cache padrao: LocMemCache (por processo). Redis opcional (requer redis), usado
+# pelos caches compartilhados entre workers: versao dos tokens, saldo e a marca
+# de leitura no primario das replicas.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
 AUTH_USER_MODEL = 'app.User'
 
 # Password validation
@@ -128,6 +193,33 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Hash de senhas (app/hashers.py). PASSWORD_HASHER escolhe o algoritmo das senhas
+# novas: scrypt (padrao, so biblioteca padrao), argon2 (pip install argon2-cffi) ou
+# pbkdf2. Hashes dos outros algoritmos, ou com outros parametros, continuam validos
+# e sao refeitos no proximo login. Padroes: scrypt do Django e argon2id da OWASP.
+_PASSWORD_HASHERS = {
+    'scrypt': 'app.hashers.TunedScryptPasswordHasher',
+    'argon2': 'app.hashers.TunedArgon2PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'scrypt')
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    path for name, path in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+SCRYPT_WORK_FACTOR = int(os.environ.get('SCRYPT_WORK_FACTOR', 2 ** 14))
+SCRYPT_BLOCK_SIZE = 8
+SCRYPT_PARALLELISM = int(os.environ.get('SCRYPT_PARALLELISM', 5))
+ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', 2))
+# Em KiB
+ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', 19 * 1024))
+ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', 1))
+
+# Pool de threads do hash de senhas: com 0, o hash roda na propria thread da requisicao
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', os.cpu_count()))
+PASSWORD_HASHING_QUEUE = int(os.environ.get('PASSWORD_HASHING_QUEUE', 64))
+PASSWORD_HASHING_TIMEOUT = 5
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
@@ -145,3 +237,66 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+
+# Idempotency-Key: por quanto tempo uma resposta fica disponivel para replay
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+# Cache em memoria da resolucao de destinatarios (e-mail/CPF -> conta)
+RECIPIENT_CACHE_SIZE = 10000
+RECIPIENT_CACHE_TTL = 60
+
+# Cache de leitura do saldo (BalanceAPIView). Em producao com varios workers,
+# aponte para um backend compartilhado em CACHES (Redis/Memcached).
+BALANCE_CACHE_ALIAS = 'default'
+BALANCE_CACHE_TTL = 300
+
+# Integridade do ledger (verify_ledger): transacoes mais novas que LEDGER_SEAL_LAG
+# sao verificadas, mas so entram em checkpoints na execucao seguinte.
+LEDGER_SEAL_LAG = timedelta(minutes=5)
+LEDGER_VERIFY_CHUNK_SIZE = 10000
+# Linhas por chunk no reconcile_balances (soma acumulada vetorizada com NumPy, se instalado)
+RECONCILE_CHUNK_SIZE = 50000
+
+# Arquivo morto (archive_transactions): meses encerrados ha mais de
+# TRANSACTION_HOT_MONTHS saem da tabela Transaction para segmentos compactados por
+# conta e mes. ARCHIVE_BATCH_SIZE e o tamanho dos bulk_create de segmentos.
+TRANSACTION_HOT_MONTHS = int(os.environ.get('TRANSACTION_HOT_MONTHS', 12))
+ARCHIVE_BATCH_SIZE = 1000
+
+# Resumo do extrato (StatementSummaryView): periodos encerrados ficam em cache
+STATEMENT_SUMMARY_CACHE_TTL = 60 * 60 * 24
+
+# Exportacao de extratos (app/exports.py): arquivos gerados em EXPORT_ROOT por um
+# pool local de EXPORT_WORKERS processos. Com 0, os jobs ficam para o comando run_exports.
+EXPORT_ROOT = os.environ.get('EXPORT_ROOT', BASE_DIR / 'exports')
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 2))
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_TTL = timedelta(days=7)
+
+# Transferencias agendadas (run_scheduler): cada transacao executa ate
+# SCHEDULER_BATCH_SIZE agendamentos vencidos. Falhas (ex.: saldo insuficiente) sao
+# tentadas ate SCHEDULER_MAX_ATTEMPTS vezes, com espera dobrando a partir de
+# SCHEDULER_RETRY_DELAY.
+SCHEDULER_BATCH_SIZE = int(os.environ.get('SCHEDULER_BATCH_SIZE', 500))
+SCHEDULER_MAX_ATTEMPTS = 3
+SCHEDULER_RETRY_DELAY = timedelta(minutes=30)
+SCHEDULER_POLL_INTERVAL = 1
+
+# Outbox transacional (app/outbox.py): cada transacao gravada gera um evento na
+# mesma transacao de banco. O comando relay_outbox publica os eventos em lotes de
+# OUTBOX_BATCH_SIZE no OUTBOX_SINK (padrao: NDJSON em OUTBOX_FILE); consumidores
+# leem os publicados em /api/events/ (long-poll) e /api/events/stream/ (SSE).
+OUTBOX_SINK = os.environ.get('OUTBOX_SINK', 'app.outbox.FileSink')
+OUTBOX_FILE = os.environ.get('OUTBOX_FILE', BASE_DIR / 'outbox' / 'events.ndjson')
+OUTBOX_BATCH_SIZE = 1000
+OUTBOX_RETENTION = timedelta(days=7)
+OUTBOX_POLL_INTERVAL = 0.5
+OUTBOX_LONG_POLL_TIMEOUT = 25
+OUTBOX_STREAM_MAX_SECONDS = 300
+
+# Metricas por requisicao expostas em /api/metrics/ (formato Prometheus).
+# Acesso com "Authorization: Bearer <METRICS_TOKEN>" ou com o JWT de um
+# administrador; sem METRICS_TOKEN, so administradores.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_SLOW_REQUEST_MS = 500
+METRICS_SLOW_SAMPLE_RATE = 0.1